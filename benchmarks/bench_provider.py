@@ -0,0 +1,180 @@
+"""Benchmarks of the token providers.
+
+Usage:
+    hatch run bench:run      # Runs the suite and stores the results.
+    hatch run bench:compare  # Compares the stored results.
+"""
+
+import asyncio
+import concurrent.futures
+import threading
+import tracemalloc
+
+import h2o_authn
+from h2o_authn import issuer
+
+CACHED_CALLS = 1000
+STAMPEDE_THREADS = 64
+STAMPEDE_COROUTINES = 256
+MEMORY_PROVIDERS = 1000
+ENCODED_REQUESTS = 1000
+
+
+def create_provider(server, provider_cls=h2o_authn.TokenProvider, **kwargs):
+    kwargs.setdefault("token_endpoint_url", f"{server.url}/token")
+    return provider_cls(refresh_token="refresh-token", client_id="client-id", **kwargs)
+
+
+def expire(provider):
+    provider._token_container._refresh_at = 0.0
+    provider._token_container._valid_until = 0.0
+
+
+def test_cached_token_sync(benchmark, issuer_server):
+    provider = create_provider(issuer_server)
+    provider.token()
+
+    def run():
+        for _ in range(CACHED_CALLS):
+            provider.token()
+
+    benchmark.extra_info["calls_per_round"] = CACHED_CALLS
+    benchmark(run)
+
+
+def test_cached_token_async(benchmark, issuer_server):
+    provider = create_provider(issuer_server, h2o_authn.AsyncTokenProvider)
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(provider.token())
+
+    async def run():
+        for _ in range(CACHED_CALLS):
+            await provider.token()
+
+    benchmark.extra_info["calls_per_round"] = CACHED_CALLS
+    benchmark(lambda: loop.run_until_complete(run()))
+    loop.close()
+
+
+def test_cold_start_with_discovery(benchmark, issuer_server):
+    def run():
+        provider = create_provider(
+            issuer_server,
+            token_endpoint_url=None,
+            issuer_url=issuer_server.url,
+            issuer_metadata_cache=issuer.MetadataCache(),
+        )
+        provider.token()
+
+    benchmark(run)
+
+
+def test_refresh_round_trip(benchmark, issuer_server):
+    provider = create_provider(issuer_server, http_keep_alive=True)
+    provider.token()
+
+    benchmark(lambda: provider._refresh(force=True))
+    provider.close()
+
+
+def test_refresh_round_trip_async(benchmark, issuer_server):
+    provider = create_provider(
+        issuer_server, h2o_authn.AsyncTokenProvider, http_keep_alive=True
+    )
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(provider.token())
+
+    benchmark(lambda: loop.run_until_complete(provider._refresh(force=True)))
+    loop.run_until_complete(provider.aclose())
+    loop.close()
+
+
+def test_thread_stampede(benchmark, issuer_server):
+    provider = create_provider(issuer_server, http_keep_alive=True)
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=STAMPEDE_THREADS)
+
+    def setup():
+        expire(provider)
+        return (), {}
+
+    def run():
+        barrier = threading.Barrier(STAMPEDE_THREADS)
+
+        def call():
+            barrier.wait()
+            return provider.token()
+
+        futures = [executor.submit(call) for _ in range(STAMPEDE_THREADS)]
+        for f in futures:
+            f.result()
+
+    before = issuer_server.token_requests
+    benchmark.pedantic(run, setup=setup, rounds=20)
+    executor.shutdown()
+    provider.close()
+
+    benchmark.extra_info["token_requests_per_round"] = (
+        issuer_server.token_requests - before
+    ) / 20
+    assert issuer_server.token_requests - before == 20
+
+
+def test_coroutine_stampede(benchmark, issuer_server):
+    provider = create_provider(
+        issuer_server, h2o_authn.AsyncTokenProvider, http_keep_alive=True
+    )
+    loop = asyncio.new_event_loop()
+
+    def setup():
+        expire(provider)
+        return (), {}
+
+    async def stampede():
+        await asyncio.gather(*(provider.token() for _ in range(STAMPEDE_COROUTINES)))
+
+    before = issuer_server.token_requests
+    benchmark.pedantic(
+        lambda: loop.run_until_complete(stampede()), setup=setup, rounds=20
+    )
+    loop.run_until_complete(provider.aclose())
+    loop.close()
+
+    benchmark.extra_info["token_requests_per_round"] = (
+        issuer_server.token_requests - before
+    ) / 20
+    assert issuer_server.token_requests - before == 20
+
+
+def test_provider_memory(benchmark, issuer_server):
+    def create():
+        return [create_provider(issuer_server) for _ in range(MEMORY_PROVIDERS)]
+
+    create()  # Warms up the lazily created shared state.
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    providers = create()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(s.size_diff for s in after.compare_to(before, "filename"))
+    del providers
+
+    benchmark.extra_info["bytes_per_provider"] = size / MEMORY_PROVIDERS
+    benchmark.pedantic(create, rounds=5)
+
+
+def test_token_request_encoding(benchmark, issuer_server):
+    # Refresh token rotates with every exchange, so only the cached static part of
+    # the body is reused.
+    provider = create_provider(
+        issuer_server, client_secret="client-secret", scope="openid offline_access"
+    )
+    refresh_tokens = [f"{i:0>64}" for i in range(ENCODED_REQUESTS)]
+    container = provider._token_container
+
+    def run():
+        for refresh_token in refresh_tokens:
+            container._refresh_token = refresh_token
+            provider._token_request()
+
+    benchmark.extra_info["requests_per_round"] = ENCODED_REQUESTS
+    benchmark(run)
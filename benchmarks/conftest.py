@@ -0,0 +1,77 @@
+"""Fixtures of the benchmark suite (run with `hatch run bench:run`).
+
+Token endpoint and the discovery document are served by an in-process HTTP server
+on the loopback interface, so the benchmarks include the real HTTP round trip
+without depending on the network.
+"""
+
+import http.server
+import json
+import threading
+
+import pytest
+
+from h2o_authn import cache
+from h2o_authn import issuer
+
+
+class IssuerHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, which would otherwise wait for the
+    # delayed ACK on the keep-alive connections.
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        if self.path != "/.well-known/openid-configuration":
+            self._respond(404, {})
+            return
+        host, port = self.server.server_address[:2]
+        self._respond(200, {"token_endpoint": f"http://{host}:{port}/token"})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        with self.server.lock:
+            self.server.token_requests += 1
+        self._respond(200, {"access_token": "a" * 1024, "expires_in": 3600})
+
+    def _respond(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class IssuerServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), IssuerHandler)
+        self.lock = threading.Lock()
+        self.token_requests = 0
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+@pytest.fixture(scope="session")
+def issuer_server():
+    server = IssuerServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    thread.join()
+
+
+@pytest.fixture(autouse=True)
+def clear_shared_caches():
+    yield
+    cache.shared_cache().clear()
+    issuer.shared_cache().clear()
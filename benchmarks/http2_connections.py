@@ -0,0 +1,221 @@
+"""Compares the connections opened and the latency of the concurrent token exchanges
+over HTTP/1.1 and HTTP/2 against a local TLS token endpoint.
+
+Usage: python benchmarks/http2_connections.py [EXCHANGES] [CONCURRENCY]
+
+Requires the h2o-authn[http2] extra and the cryptography package.
+"""
+
+import asyncio
+import datetime
+import ipaddress
+import json
+import os
+import ssl
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from typing import List
+from typing import Optional
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+import h2.config
+import h2.connection
+import h2.events
+
+from h2o_authn import metrics
+import h2o_authn.bulk
+
+# Time the token endpoint spends on each request.
+SERVER_DELAY = 0.005
+
+BODY = json.dumps({"access_token": "access-token", "expires_in": 3600}).encode()
+
+
+def certificate(directory):
+    """Returns paths of the self-signed certificate of 127.0.0.1 and its key."""
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "127.0.0.1")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=1))
+        .not_valid_after(now + datetime.timedelta(hours=1))
+        .add_extension(
+            x509.SubjectAlternativeName(
+                [x509.IPAddress(ipaddress.ip_address("127.0.0.1"))]
+            ),
+            critical=False,
+        )
+        .sign(key, hashes.SHA256())
+    )
+    cert_path = os.path.join(directory, "cert.pem")
+    key_path = os.path.join(directory, "key.pem")
+    with open(cert_path, "wb") as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, "wb") as f:
+        f.write(
+            key.private_bytes(
+                serialization.Encoding.PEM,
+                serialization.PrivateFormat.PKCS8,
+                serialization.NoEncryption(),
+            )
+        )
+    return cert_path, key_path
+
+
+class TokenEndpoint:
+    """Token endpoint speaking HTTP/2 or HTTP/1.1, as negotiated with ALPN."""
+
+    def __init__(self):
+        self.connections = 0
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        ssl_object = writer.get_extra_info("ssl_object")
+        try:
+            if ssl_object.selected_alpn_protocol() == "h2":
+                await self._handle_h2(reader, writer)
+            else:
+                await self._handle_http11(reader, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_http11(self, reader, writer):
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in head.split(b"\r\n"):
+                name, _, value = line.partition(b":")
+                if name.strip().lower() == b"content-length":
+                    length = int(value)
+            await reader.readexactly(length)
+            await asyncio.sleep(SERVER_DELAY)
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                b"Content-Length: %d\r\n\r\n%s" % (len(BODY), BODY)
+            )
+            await writer.drain()
+
+    async def _handle_h2(self, reader, writer):
+        conn = h2.connection.H2Connection(
+            h2.config.H2Configuration(client_side=False, header_encoding="utf-8")
+        )
+        conn.initiate_connection()
+        writer.write(conn.data_to_send())
+        lock = asyncio.Lock()
+        tasks = set()
+
+        async def respond(stream_id):
+            await asyncio.sleep(SERVER_DELAY)
+            async with lock:
+                conn.send_headers(
+                    stream_id,
+                    [
+                        (":status", "200"),
+                        ("content-type", "application/json"),
+                        ("content-length", str(len(BODY))),
+                    ],
+                )
+                conn.send_data(stream_id, BODY, end_stream=True)
+                writer.write(conn.data_to_send())
+                await writer.drain()
+
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                return
+            async with lock:
+                for event in conn.receive_data(data):
+                    if isinstance(event, h2.events.DataReceived):
+                        conn.acknowledge_received_data(
+                            event.flow_controlled_length, event.stream_id
+                        )
+                    elif isinstance(event, h2.events.StreamEnded):
+                        task = asyncio.ensure_future(respond(event.stream_id))
+                        tasks.add(task)
+                        task.add_done_callback(tasks.discard)
+                writer.write(conn.data_to_send())
+                await writer.drain()
+
+
+def serve(cert_path, key_path):
+    """Starts the token endpoint in a separate thread. Returns it with its URL."""
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(cert_path, key_path)
+    context.set_alpn_protocols(["h2", "http/1.1"])
+    endpoint = TokenEndpoint()
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(
+        asyncio.start_server(endpoint.handle, "127.0.0.1", 0, ssl=context)
+    )
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    port = server.sockets[0].getsockname()[1]
+    return endpoint, f"https://127.0.0.1:{port}/token"
+
+
+class LatencyObserver(metrics.Observer):
+    def __init__(self):
+        self.durations: List[float] = []
+
+    def refresh_finished(
+        self, *, duration: float, error: Optional[BaseException]
+    ) -> None:
+        self.durations.append(duration)
+
+
+async def run(url, context, exchanges, concurrency, http2):
+    observer = LatencyObserver()
+    start = time.perf_counter()
+    async for result in h2o_authn.bulk.exchange_many(
+        [f"refresh-token-{i}" for i in range(exchanges)],
+        client_id="client-id",
+        token_endpoint_url=url,
+        concurrency=concurrency,
+        http_ssl_context=context,
+        http2=http2,
+        observer=observer,
+    ):
+        if result.error is not None:
+            raise result.error
+    return time.perf_counter() - start, observer.durations
+
+
+def main():
+    exchanges = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+
+    with tempfile.TemporaryDirectory() as directory:
+        cert_path, key_path = certificate(directory)
+        endpoint, url = serve(cert_path, key_path)
+        context = ssl.create_default_context(cafile=cert_path)
+
+    print(f"exchanges: {exchanges}, concurrency: {concurrency}")
+    for name, http2 in (("HTTP/1.1", False), ("HTTP/2", True)):
+        endpoint.connections = 0
+        elapsed, durations = asyncio.run(
+            run(url, context, exchanges, concurrency, http2)
+        )
+        quantiles = statistics.quantiles(durations, n=100)
+        print(
+            f"{name:<8}  connections: {endpoint.connections:>3}  "
+            f"throughput: {exchanges / elapsed:>7.0f}/s  "
+            f"p50: {quantiles[49] * 1000:>6.2f} ms  "
+            f"p99: {quantiles[98] * 1000:>6.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
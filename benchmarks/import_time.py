@@ -0,0 +1,66 @@
+"""Measures the time it takes to import the package and to create a provider in a
+fresh interpreter, and lists the heavy modules loaded by it.
+
+Usage: python benchmarks/import_time.py [RUNS]
+"""
+
+import subprocess
+import sys
+
+CODE = """
+import sys, time
+start = time.perf_counter()
+import h2o_authn
+imported = time.perf_counter()
+h2o_authn.TokenProvider(
+    refresh_token="refresh-token",
+    client_id="client-id",
+    token_endpoint_url="http://127.0.0.1/token",
+)
+created = time.perf_counter()
+for _ in range(10):
+    h2o_authn.TokenProvider(
+        refresh_token="refresh-token",
+        client_id="client-id",
+        token_endpoint_url="http://127.0.0.1/token",
+    )
+created_more = time.perf_counter()
+heavy = [m for m in ("httpx", "httpcore", "anyio") if m in sys.modules]
+print(imported - start, created - imported, (created_more - created) / 10, ",".join(heavy))
+"""
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", CODE], check=True, capture_output=True, text=True
+        ).stdout.split()
+        samples.append(
+            (
+                float(out[0]),
+                float(out[1]),
+                float(out[2]),
+                out[3] if len(out) > 3 else "",
+            )
+        )
+
+    print(f"import h2o_authn      {min(s[0] for s in samples) * 1e3:8.2f} ms")
+    print(f"first TokenProvider   {min(s[1] for s in samples) * 1e3:8.2f} ms")
+    print(f"next TokenProvider    {min(s[2] for s in samples) * 1e3:8.2f} ms")
+    print(f"heavy modules loaded  {samples[0][3] or '-'}")
+
+    # Detailed breakdown, see the -X importtime documentation.
+    importtime = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import h2o_authn"],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stderr
+    print(importtime.splitlines()[-1])
+
+
+if __name__ == "__main__":
+    main()
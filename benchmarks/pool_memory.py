@@ -0,0 +1,45 @@
+"""Measures the memory held by the provider pool per user.
+
+Usage: python benchmarks/pool_memory.py [ENTRIES]
+"""
+
+import gc
+import sys
+import tracemalloc
+
+import h2o_authn
+import h2o_authn.pool
+
+
+def main():
+    entries = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    # Refresh tokens of the typical size, created upfront as the application has them
+    # anyway.
+    refresh_tokens = [f"{i:0>64}" for i in range(entries)]
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    pool = h2o_authn.pool.ProviderPool(
+        h2o_authn.TokenProvider,
+        max_size=entries,
+        client_id="client-id",
+        client_secret="client-secret",
+        token_endpoint_url="http://127.0.0.1/token",
+        scope="openid offline_access",
+        http_keep_alive=True,
+    )
+    for refresh_token in refresh_tokens:
+        pool.get(refresh_token)
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    assert len(pool) == entries
+    print(f"entries: {entries}")
+    print(f"total: {used / 2**20:.1f} MiB")
+    print(f"per entry: {used / entries:.0f} B")
+
+
+if __name__ == "__main__":
+    main()
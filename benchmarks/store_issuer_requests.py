@@ -0,0 +1,80 @@
+"""Compares number of the token endpoint requests made by the worker processes with
+and without the shared token store.
+
+Usage: python benchmarks/store_issuer_requests.py [WORKERS]
+"""
+
+import http.server
+import json
+import multiprocessing
+import sys
+import tempfile
+import threading
+
+import h2o_authn
+from h2o_authn import store
+
+
+class TokenEndpoint(http.server.BaseHTTPRequestHandler):
+    requests = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        with TokenEndpoint.lock:
+            TokenEndpoint.requests += 1
+        self.rfile.read(int(self.headers["Content-Length"]))
+        body = json.dumps({"access_token": "access-token", "expires_in": 3600})
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, *args):
+        pass
+
+
+def worker(token_endpoint_url, directory, calls):
+    token_store = store.FileStore(directory) if directory else None
+    provider = h2o_authn.TokenProvider(
+        refresh_token="refresh-token",
+        client_id="client-id",
+        token_endpoint_url=token_endpoint_url,
+        token_store=token_store,
+    )
+    for _ in range(calls):
+        provider()
+
+
+def run(token_endpoint_url, workers, directory):
+    TokenEndpoint.requests = 0
+    ctx = multiprocessing.get_context("fork")
+    processes = [
+        ctx.Process(target=worker, args=(token_endpoint_url, directory, 10))
+        for _ in range(workers)
+    ]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+    return TokenEndpoint.requests
+
+
+def main():
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), TokenEndpoint)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/token"
+
+    without_store = run(url, workers, None)
+    with tempfile.TemporaryDirectory() as directory:
+        with_store = run(url, workers, directory)
+    server.shutdown()
+
+    print(f"workers: {workers}")
+    print(f"token requests without store: {without_store}")
+    print(f"token requests with store:    {with_store}")
+
+
+if __name__ == "__main__":
+    main()
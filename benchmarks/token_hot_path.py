@@ -0,0 +1,38 @@
+"""Measures the cost of obtaining the cached access token from the provider.
+
+Usage: python benchmarks/token_hot_path.py [CALLS]
+"""
+
+import sys
+import timeit
+
+import h2o_authn
+from h2o_authn import token
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+
+    provider = h2o_authn.TokenProvider(
+        refresh_token="refresh-token",
+        client_id="client-id",
+        token_endpoint_url="http://127.0.0.1/token",
+    )
+    # Token is set directly, so no request is made.
+    provider._token_container.update_token(access_token="a" * 1024, expires_in=3600)
+    container = provider._token_container
+
+    cases = {
+        "provider()": provider,
+        "provider.token()": provider.token,
+        "container.refresh_required()": container.refresh_required,
+        "str(token)": lambda t=container.access_token: str(t),
+        "Token()": lambda: token.Token("a" * 16, exp=None, scope=None),
+    }
+    for name, func in cases.items():
+        seconds = min(timeit.repeat(func, number=calls, repeat=5))
+        print(f"{name:30} {seconds / calls * 1e9:8.1f} ns/call")
+
+
+if __name__ == "__main__":
+    main()
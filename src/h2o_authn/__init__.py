@@ -1,3 +1,54 @@
+import importlib
+from typing import Any
+from typing import List
+from typing import TYPE_CHECKING
+
 from h2o_authn._version import __version__  # noqa: F401
-from h2o_authn.provider import AsyncTokenProvider  # noqa: F401
-from h2o_authn.provider import TokenProvider  # noqa: F401
+
+if TYPE_CHECKING:
+    from h2o_authn.multiscope import AsyncMultiScopeTokenProvider  # noqa: F401
+    from h2o_authn.multiscope import MultiScopeTokenProvider  # noqa: F401
+    from h2o_authn.provider import AsyncTokenProvider  # noqa: F401
+    from h2o_authn.provider import TokenProvider  # noqa: F401
+
+# Attributes are imported on the first access (PEP 562), so that importing the
+# package does not import httpx and the rest of its dependencies.
+_LAZY_ATTRIBUTES = {
+    "AsyncMultiScopeTokenProvider": "h2o_authn.multiscope",
+    "MultiScopeTokenProvider": "h2o_authn.multiscope",
+    "AsyncTokenProvider": "h2o_authn.provider",
+    "TokenProvider": "h2o_authn.provider",
+}
+_LAZY_SUBMODULES = frozenset(
+    {
+        "auth",
+        "bulk",
+        "cache",
+        "error",
+        "grant",
+        "issuer",
+        "jwt",
+        "metrics",
+        "multiscope",
+        "pool",
+        "provider",
+        "retry",
+        "store",
+        "token",
+    }
+)
+
+
+def __getattr__(name: str) -> Any:
+    if name in _LAZY_ATTRIBUTES:
+        value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name]), name)
+    elif name in _LAZY_SUBMODULES:
+        value = importlib.import_module(f"{__name__}.{name}")
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted({*globals(), *_LAZY_ATTRIBUTES, *_LAZY_SUBMODULES})
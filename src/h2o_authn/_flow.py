@@ -0,0 +1,79 @@
+"""Sans-I/O flows of the requests made to the issuer.
+
+Flows are generators holding the protocol logic of the token exchange and the
+discovery. They yield the Request to send and receive the response to it (or the
+exception raised while sending it). Drivers, run() and arun(), only send the
+requests, so that the logic is shared by the sync and async providers.
+"""
+
+from typing import Awaitable
+from typing import Callable
+from typing import Generator
+from typing import Mapping
+from typing import NamedTuple
+from typing import Optional
+from typing import TYPE_CHECKING
+from typing import TypeVar
+
+if TYPE_CHECKING:
+    import httpx
+
+_T = TypeVar("_T")
+
+
+class Request(NamedTuple):
+    """Description of the HTTP request."""
+
+    method: str
+    url: str
+    content: Optional[bytes] = None
+    headers: Optional[Mapping[str, str]] = None
+
+
+Flow = Generator[Request, "httpx.Response", _T]
+
+
+def run(flow: Flow[_T], send: Callable[[Request], "httpx.Response"]) -> _T:
+    """Runs the flow sending its requests with the given function."""
+    try:
+        request = next(flow)
+        while True:
+            try:
+                resp = send(request)
+            except Exception as e:
+                request = flow.throw(e)
+            else:
+                request = flow.send(resp)
+    except StopIteration as stop:
+        return stop.value
+
+
+async def arun(
+    flow: Flow[_T], send: Callable[[Request], Awaitable["httpx.Response"]]
+) -> _T:
+    """Runs the flow sending its requests with the given coroutine function."""
+    try:
+        request = next(flow)
+        while True:
+            try:
+                resp = await send(request)
+            except Exception as e:
+                request = flow.throw(e)
+            else:
+                request = flow.send(resp)
+    except StopIteration as stop:
+        return stop.value
+
+
+def send(client: "httpx.Client", request: Request) -> "httpx.Response":
+    """Sends the request with the sync client."""
+    return client.request(
+        request.method, request.url, content=request.content, headers=request.headers
+    )
+
+
+async def asend(client: "httpx.AsyncClient", request: Request) -> "httpx.Response":
+    """Sends the request with the async client."""
+    return await client.request(
+        request.method, request.url, content=request.content, headers=request.headers
+    )
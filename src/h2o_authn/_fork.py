@@ -0,0 +1,47 @@
+"""Reset of the state inherited by the child process after fork.
+
+Child process created by fork (e.g. Celery prefork or gunicorn --preload workers)
+inherits the providers created by the parent, but only the thread that forked.
+Locks held by the other threads at the time of fork would never be released,
+background refresh threads do not exist and the open HTTP connections are shared
+with the parent. Objects holding such state register here and reset it in the child
+right after fork, before any other code runs there.
+
+Tokens themselves are kept, so the child does not need to refresh the token the
+parent obtained until it requires refresh.
+"""
+
+import os
+import threading
+from typing import Callable
+from typing import List
+import weakref
+
+_objects: "weakref.WeakSet" = weakref.WeakSet()
+_callbacks: List[Callable[[], None]] = []
+_lock = threading.Lock()
+
+
+def register(obj) -> None:
+    """Registers the object which _after_fork() method is called in the child."""
+    with _lock:
+        _objects.add(obj)
+
+
+def register_callback(callback: Callable[[], None]) -> None:
+    """Registers the function called in the child, e.g. to reset the module state."""
+    _callbacks.append(callback)
+
+
+def _after_fork_in_child() -> None:
+    global _lock
+    # The lock itself might have been held by another thread of the parent.
+    _lock = threading.Lock()
+    for callback in _callbacks:
+        callback()
+    for obj in list(_objects):
+        obj._after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
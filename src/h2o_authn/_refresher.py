@@ -0,0 +1,142 @@
+"""Background refresh of the access tokens managed by the token providers.
+
+Refresh is skipped when the token was already refreshed since it was scheduled,
+e.g. by another provider sharing the container through the token cache, so that
+equivalent providers do not each refresh the shared token.
+
+Refreshers hold only a weak reference to the provider so they never keep it alive
+and stop on their own once the provider is garbage collected.
+"""
+
+import asyncio
+import random
+import threading
+import time
+from typing import Optional
+import weakref
+
+# Refresh moment is randomly shifted by up to this fraction of the token lifetime to
+# spread refreshes of the providers created at the same time.
+JITTER = 0.1
+
+# Minimal delay between the background refreshes, so that tokens with the lifetime
+# shorter than the expiry threshold are not refreshed in a tight loop.
+MIN_REFRESH_DELAY = 1.0
+
+# Bounds for the delay of the next attempt after the failed background refresh.
+MIN_RETRY_DELAY = 1.0
+MAX_RETRY_DELAY = 30.0
+
+
+def next_delay(provider, failures: int) -> float:
+    """Returns number of seconds to wait before the next background refresh."""
+    if failures:
+        cap = min(MAX_RETRY_DELAY, MIN_RETRY_DELAY * 2**failures)
+        return random.uniform(MIN_RETRY_DELAY, cap)
+
+    ratio = provider._background_refresh_ratio
+    jitter = random.uniform(-JITTER, JITTER)
+    ratio = min(max(ratio + jitter, 0.0), 1.0)
+    delay = provider._token_container.refresh_after(ratio).total_seconds()
+    return max(delay, MIN_REFRESH_DELAY)
+
+
+class ThreadRefresher:
+    """Refreshes token of the sync provider from the daemon thread."""
+
+    def __init__(self, provider) -> None:
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run,
+            args=(weakref.ref(provider), self._stopped),
+            name="h2o-authn-refresher",
+            daemon=True,
+        )
+        weakref.finalize(provider, self._stopped.set)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    @staticmethod
+    def _run(provider_ref: weakref.ref, stopped: threading.Event) -> None:
+        failures = 0
+        while True:
+            provider = provider_ref()
+            if provider is None:
+                return
+            scheduled_at = time.time()
+            delay = next_delay(provider, failures)
+            del provider
+
+            if stopped.wait(delay):
+                return
+
+            provider = provider_ref()
+            if provider is None:
+                return
+            try:
+                provider._refresh(force=True, scheduled_at=scheduled_at)
+                failures = 0
+            except Exception:
+                # Callers fall back to the inline refresh when the token expires.
+                failures += 1
+            del provider
+
+
+class TaskRefresher:
+    """Refreshes token of the async provider from the asyncio task."""
+
+    def __init__(self, provider) -> None:
+        self._provider_ref = weakref.ref(provider)
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.ensure_future(self._run(self._provider_ref))
+
+    def running(self) -> bool:
+        """Returns True when the refresher runs in the current event loop."""
+        return (
+            self._task is not None
+            and not self._task.done()
+            and self._task.get_loop() is asyncio.get_running_loop()
+        )
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is None or task.done():
+            return
+        task.cancel()
+        if task.get_loop() is asyncio.get_running_loop():
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    @staticmethod
+    async def _run(provider_ref: weakref.ref) -> None:
+        failures = 0
+        while True:
+            provider = provider_ref()
+            if provider is None:
+                return
+            scheduled_at = time.time()
+            delay = next_delay(provider, failures)
+            del provider
+
+            await asyncio.sleep(delay)
+
+            provider = provider_ref()
+            if provider is None:
+                return
+            try:
+                await provider._refresh(force=True, scheduled_at=scheduled_at)
+                failures = 0
+            except Exception:
+                # Callers fall back to the inline refresh when the token expires.
+                failures += 1
+            del provider
@@ -0,0 +1,33 @@
+"""Wrappers of the transports passed to the providers by the caller."""
+
+import httpx
+
+
+class BorrowedTransport(httpx.BaseTransport):
+    """Sync transport owned by the caller. Closing the client using it leaves the
+    transport open.
+    """
+
+    def __init__(self, transport: httpx.BaseTransport) -> None:
+        self._transport = transport
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        return self._transport.handle_request(request)
+
+    def close(self) -> None:
+        pass
+
+
+class AsyncBorrowedTransport(httpx.AsyncBaseTransport):
+    """Async transport owned by the caller. Closing the client using it leaves the
+    transport open.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport) -> None:
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._transport.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        pass
@@ -0,0 +1,110 @@
+"""Authentication of the httpx requests with the access tokens of the providers."""
+
+from typing import AsyncGenerator
+from typing import Generator
+from typing import Optional
+from typing import Tuple
+
+import httpx
+
+from h2o_authn import provider
+from h2o_authn import token
+
+
+class _BaseTokenAuth(httpx.Auth):
+    def __init__(self) -> None:
+        # Token and the value of the Authorization header built from it.
+        self._header: Optional[Tuple[token.Token, str]] = None
+
+    def _authorize(self, request: httpx.Request, access_token: token.Token):
+        header = self._header
+        if header is None or header[0] is not access_token:
+            header = (access_token, "Bearer " + str(access_token))
+            self._header = header
+        request.headers["Authorization"] = header[1]
+
+
+class TokenAuth(_BaseTokenAuth):
+    """httpx authentication that sends the access token of the sync provider as the
+    bearer token.
+
+    Authorization header is built only once per access token. When the request is
+    rejected with 401, the token is refreshed once and the request is retried.
+    Requests rejected with the same token share a single refresh.
+
+    Example:
+        ```python
+        client = httpx.Client(auth=h2o_authn.auth.TokenAuth(provider))
+        ```
+    """
+
+    def __init__(self, token_provider: provider.TokenProvider) -> None:
+        super().__init__()
+        self._provider = token_provider
+
+    def sync_auth_flow(
+        self, request: httpx.Request
+    ) -> Generator[httpx.Request, httpx.Response, None]:
+        access_token = self._provider.token()
+        self._authorize(request, access_token)
+        response = yield request
+        if response.status_code != 401:
+            return
+
+        # Only the first request rejected with the token refreshes it, the others
+        # use the new one.
+        if self._provider.token() is access_token:
+            self._provider._refresh(force=True)
+        self._authorize(request, self._provider.token())
+        yield request
+
+    async def async_auth_flow(
+        self, request: httpx.Request
+    ) -> AsyncGenerator[httpx.Request, httpx.Response]:
+        raise RuntimeError(
+            "TokenAuth can be used only with the sync client, use AsyncTokenAuth."
+        )
+        yield request  # pragma: no cover
+
+
+class AsyncTokenAuth(_BaseTokenAuth):
+    """httpx authentication that sends the access token of the async provider as the
+    bearer token.
+
+    Authorization header is built only once per access token. When the request is
+    rejected with 401, the token is refreshed once and the request is retried.
+    Requests rejected with the same token share a single refresh.
+
+    Example:
+        ```python
+        client = httpx.AsyncClient(auth=h2o_authn.auth.AsyncTokenAuth(aprovider))
+        ```
+    """
+
+    def __init__(self, token_provider: provider.AsyncTokenProvider) -> None:
+        super().__init__()
+        self._provider = token_provider
+
+    def sync_auth_flow(
+        self, request: httpx.Request
+    ) -> Generator[httpx.Request, httpx.Response, None]:
+        raise RuntimeError(
+            "AsyncTokenAuth can be used only with the async client, use TokenAuth."
+        )
+        yield request  # pragma: no cover
+
+    async def async_auth_flow(
+        self, request: httpx.Request
+    ) -> AsyncGenerator[httpx.Request, httpx.Response]:
+        access_token = await self._provider.token()
+        self._authorize(request, access_token)
+        response = yield request
+        if response.status_code != 401:
+            return
+
+        # Only the first request rejected with the token refreshes it, the others
+        # use the new one.
+        if await self._provider.token() is access_token:
+            await self._provider._refresh(force=True)
+        self._authorize(request, await self._provider.token())
+        yield request
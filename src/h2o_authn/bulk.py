@@ -0,0 +1,132 @@
+"""Exchange of many refresh tokens of the same client at once."""
+
+import asyncio
+from typing import Any
+from typing import AsyncIterator
+from typing import Iterable
+from typing import NamedTuple
+from typing import Optional
+
+from h2o_authn import provider
+from h2o_authn import token
+
+DEFAULT_CONCURRENCY = 32
+
+
+class Result(NamedTuple):
+    """Outcome of the exchange of a single refresh token."""
+
+    #: Position of the refresh token in the input.
+    position: int
+    #: Refresh token that was exchanged.
+    refresh_token: str
+    #: Obtained access token, None when the exchange failed.
+    access_token: Optional[token.Token]
+    #: Refresh token to use for the next exchange. Differs from the exchanged one
+    #: when the issuer rotated it. None when the exchange failed.
+    next_refresh_token: Optional[str]
+    #: Exception the exchange failed with (e.g. h2o_authn.error.TokenEndpointError),
+    #: None when it succeeded.
+    error: Optional[Exception]
+
+
+async def exchange_many(
+    refresh_tokens: Iterable[str],
+    *,
+    client_id: str,
+    issuer_url: Optional[str] = None,
+    token_endpoint_url: Optional[str] = None,
+    client_secret: Optional[str] = None,
+    scope: Optional[str] = None,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    **kwargs: Any,
+) -> AsyncIterator[Result]:
+    """Exchanges each of the refresh tokens for the access token and yields the
+    results as they complete.
+
+    All of the exchanges share a single pool of HTTP connections and the issuer
+    discovery is performed only once, before the first exchange. At most
+    concurrency exchanges are in progress at a time. Refresh tokens are consumed
+    from the iterable only as the exchanges start, so it may be a lazy one.
+
+    Failure of a single exchange is reported in its result and does not abort the
+    others. Failed discovery of the token endpoint is raised.
+
+    Example:
+        ```python
+        async for result in h2o_authn.bulk.exchange_many(
+            refresh_tokens, client_id="client", issuer_url="https://issuer"
+        ):
+            if result.error is None:
+                ...
+        ```
+
+    Args:
+        refresh_tokens: Refresh tokens to exchange.
+        client_id: OAuth 2.0 client id used for the exchanges.
+        issuer_url: Base URL of the issuer used for the discovery of the token
+            endpoint. Mutually exclusive with the token_endpoint_url argument.
+        token_endpoint_url: URL of the token endpoint. Mutually exclusive with the
+            issuer_url argument.
+        client_secret: Optional OAuth 2.0 client secret for the confidential
+            clients.
+        scope: Optional scope of the requested access tokens.
+        concurrency: Maximal number of the exchanges in progress at a time.
+        kwargs: Other arguments of the h2o_authn.AsyncTokenProvider (e.g.
+            http_timeout or retry_policy). http_keep_alive is always enabled.
+    """
+    if concurrency < 1:
+        raise ValueError("'concurrency' must be positive.")
+
+    iterator = iter(enumerate(refresh_tokens))
+    first = next(iterator, None)
+    if first is None:
+        return
+
+    kwargs["http_keep_alive"] = True
+    template = provider.AsyncTokenProvider(
+        refresh_token=first[1],
+        client_id=client_id,
+        issuer_url=issuer_url,
+        token_endpoint_url=token_endpoint_url,
+        client_secret=client_secret,
+        scope=scope,
+        **kwargs,
+    )
+    async with template:
+        await template._ensure_token_endpoint_url()
+
+        pending = {asyncio.ensure_future(_exchange(template, *first))}
+        try:
+            while True:
+                while len(pending) < concurrency:
+                    item = next(iterator, None)
+                    if item is None:
+                        break
+                    pending.add(asyncio.ensure_future(_exchange(template, *item)))
+                if not pending:
+                    break
+
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for fut in done:
+                    yield fut.result()
+        finally:
+            # Stops the exchanges when the caller stops the iteration early.
+            for fut in pending:
+                fut.cancel()
+
+
+async def _exchange(
+    template: provider.AsyncTokenProvider, position: int, refresh_token: str
+) -> Result:
+    try:
+        token_provider = template._clone(
+            provider.AsyncTokenProvider, refresh_token=refresh_token
+        )
+        access_token = await token_provider.token()
+    except Exception as e:
+        return Result(position, refresh_token, None, None, e)
+    next_refresh_token = token_provider._token_container.refresh_token
+    return Result(position, refresh_token, access_token, next_refresh_token, None)
@@ -0,0 +1,127 @@
+import collections
+import datetime
+import hashlib
+import threading
+from typing import Callable
+from typing import Hashable
+from typing import Optional
+from typing import Tuple
+
+from h2o_authn import _fork
+from h2o_authn import token
+
+DEFAULT_MAX_SIZE = 1024
+DEFAULT_TTL = datetime.timedelta(minutes=30)
+
+_Entry = Tuple[token.Container, datetime.datetime]
+
+
+class TokenCache:
+    """Process-level cache of the token containers that allows equivalent token
+    providers to share the access token and the refresh in progress.
+
+    Providers are equivalent when they are of the same kind (sync or async), use the
+    same token endpoint (or issuer), client credentials, scope, refresh token and
+    token expiry settings.
+
+    The cache is bounded. Least recently used entries are evicted when the size limit
+    is reached. Entries are also evicted when they were not used for longer than the
+    TTL or when the refresh token they hold expires (if the token endpoint tells
+    when).
+    """
+
+    def __init__(
+        self,
+        *,
+        max_size: int = DEFAULT_MAX_SIZE,
+        ttl: Optional[datetime.timedelta] = DEFAULT_TTL,
+    ) -> None:
+        """Returns a new instance of the token cache.
+
+        Args:
+            max_size: Maximal number of containers kept in the cache.
+            ttl: How long an unused container is kept in the cache. When None, the
+                containers are evicted only when the cache is full or their refresh
+                token expires.
+        """
+        if max_size < 1:
+            raise ValueError("'max_size' must be positive.")
+
+        self._max_size = max_size
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: collections.OrderedDict[
+            Hashable, _Entry
+        ] = collections.OrderedDict()
+        _fork.register(self)
+
+    def _after_fork(self) -> None:
+        self._lock = threading.Lock()
+        for container, _ in self._entries.values():
+            container._after_fork()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def container(
+        self, key: Hashable, factory: Callable[[], token.Container]
+    ) -> token.Container:
+        """Returns the container stored under the key. New container is created by
+        calling the factory when there's no usable container stored.
+        """
+        now = datetime.datetime.now(datetime.timezone.utc)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not self._expired(entry, now):
+                self._entries.move_to_end(key)
+                self._entries[key] = (entry[0], now)
+                return entry[0]
+
+            container = factory()
+            self._entries[key] = (container, now)
+            self._entries.move_to_end(key)
+            self._evict(now)
+            return container
+
+    def clear(self) -> None:
+        """Removes all the entries from the cache."""
+        with self._lock:
+            self._entries.clear()
+
+    def _expired(self, entry: _Entry, now: datetime.datetime) -> bool:
+        container, last_used = entry
+        if self._ttl is not None and last_used + self._ttl <= now:
+            return True
+
+        refresh_token_exp = container.refresh_token_exp
+        return refresh_token_exp is not None and refresh_token_exp <= now
+
+    def _evict(self, now: datetime.datetime) -> None:
+        # Entries are ordered by the last use, so the idle ones are at the front.
+        # Entries with the expired refresh token are dropped when looked up.
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if not self._expired(entry, now):
+                break
+            del self._entries[key]
+
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+
+_SHARED_CACHE = TokenCache()
+
+
+def shared_cache() -> TokenCache:
+    """Returns the token cache shared by the whole process."""
+    return _SHARED_CACHE
+
+
+def secret_digest(*values: Optional[str]) -> str:
+    """Returns digest of the secret values, so they can be used in the cache keys
+    without being stored there.
+    """
+    h = hashlib.sha256()
+    for v in values:
+        h.update(b"\x00" if v is None else b"\x01" + v.encode() + b"\x00")
+    return h.hexdigest()
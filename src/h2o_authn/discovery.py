@@ -1,10 +1,21 @@
 import datetime
 import ssl
 from typing import Optional
+from typing import TYPE_CHECKING
 
 import h2o_discovery
 
+from h2o_authn import cache
+from h2o_authn import issuer
+from h2o_authn import metrics
 from h2o_authn import provider
+from h2o_authn import retry
+from h2o_authn import store
+
+if TYPE_CHECKING:
+    import httpx
+
+    from h2o_authn import grant
 
 DEFAULT_CLIENT = "platform"
 
@@ -20,10 +31,28 @@ def create(
     http_timeout: datetime.timedelta = provider.DEFAULT_HTTP_TIMEOUT,
     minimal_refresh_period: Optional[datetime.timedelta] = None,
     http_ssl_context: Optional[ssl.SSLContext] = None,
+    http_keep_alive: bool = False,
+    background_refresh: bool = False,
+    background_refresh_ratio: float = provider.DEFAULT_BACKGROUND_REFRESH_RATIO,
+    stale_while_revalidate: Optional[datetime.timedelta] = None,
+    token_cache: Optional[cache.TokenCache] = None,
+    token_store: Optional[store.TokenStore] = None,
+    issuer_metadata_cache: Optional[issuer.MetadataCache] = None,
+    retry_policy: Optional[retry.RetryPolicy] = None,
+    circuit_breaker: Optional[retry.CircuitBreaker] = None,
+    observer: Optional[metrics.Observer] = None,
+    parse_jwt: bool = False,
+    http2: bool = False,
+    client_assertion: Optional["grant.PrivateKeyJWT"] = None,
+    client_secret_basic: bool = False,
+    http_client: Optional["httpx.Client"] = None,
+    http_transport: Optional["httpx.BaseTransport"] = None,
 ):
     """Returns a new TokenProvider instance configured from the given Discovery object.
 
-    By default the provider will be configured to use the "platform".
+    By default the provider will be configured to use the "platform". The provider
+    always uses the refresh token of the discovered credentials, so the grant
+    argument of the TokenProvider is not supported.
 
     Args:
         discovery: The Discovery object to use for configuration.
@@ -42,6 +71,39 @@ def create(
             timeouts (connect, read, write).
         http_ssl_context: The SSL context to use for HTTPS requests.
             If not specified default SSL context is used.
+        http_keep_alive: When enabled, the provider keeps a pool of open HTTP
+            connections to the issuer and reuses it for all of the requests.
+        background_refresh: When enabled, the access token is refreshed in the
+            background before it expires.
+        background_refresh_ratio: Fraction of the access token lifetime after
+            which the background refresh occurs. (default: 0.75)
+        stale_while_revalidate: Optionally sets the period before the refresh
+            becomes required, during which the current access token is returned
+            right away while it's refreshed in the background.
+        token_cache: Optional cache that allows equivalent providers to share the
+            access token and the refresh in progress.
+        token_store: Optional persistent store that allows equivalent providers in
+            different processes to share the access token and the refresh token.
+        issuer_metadata_cache: Cache of the issuer discovery documents. If not
+            specified, the cache shared by the whole process is used.
+        retry_policy: Optional policy for retrying the failed requests to the issuer.
+        circuit_breaker: Optional circuit breaker that suspends the requests to the
+            issuer after repeated failures.
+        observer: Optional observer that receives the events of the provider.
+        parse_jwt: When enabled, lifetime and scope of the JWT access tokens are read
+            from their claims when the response does not contain them.
+        http2: When enabled, the requests to the issuer are multiplexed over a
+            single HTTP/2 connection. Requires the h2o-authn[http2] extra.
+        client_assertion: Optional h2o_authn.grant.PrivateKeyJWT the client
+            authenticates with instead of the client_secret.
+        client_secret_basic: When enabled, the client authenticates with the
+            client_secret sent in the Authorization header instead of the request
+            body. Requires the client_secret.
+        http_client: Optional httpx.Client used for the requests instead of
+            creating one. The client is owned by the caller and is never closed.
+        http_transport: Optional httpx transport (e.g. httpx.WSGITransport) used
+            by the clients the provider creates. Mutually exclusive with the
+            http_client.
     """
 
     client_id = discovery.clients[client].oauth2_client_id
@@ -59,6 +121,22 @@ def create(
         http_timeout=http_timeout,
         minimal_refresh_period=minimal_refresh_period,
         http_ssl_context=http_ssl_context,
+        http_keep_alive=http_keep_alive,
+        background_refresh=background_refresh,
+        background_refresh_ratio=background_refresh_ratio,
+        stale_while_revalidate=stale_while_revalidate,
+        token_cache=token_cache,
+        token_store=token_store,
+        issuer_metadata_cache=issuer_metadata_cache,
+        retry_policy=retry_policy,
+        circuit_breaker=circuit_breaker,
+        observer=observer,
+        parse_jwt=parse_jwt,
+        http2=http2,
+        client_assertion=client_assertion,
+        client_secret_basic=client_secret_basic,
+        http_client=http_client,
+        http_transport=http_transport,
     )
 
 
@@ -73,11 +151,29 @@ def create_async(
     http_timeout: datetime.timedelta = provider.DEFAULT_HTTP_TIMEOUT,
     minimal_refresh_period: Optional[datetime.timedelta] = None,
     http_ssl_context: Optional[ssl.SSLContext] = None,
+    http_keep_alive: bool = False,
+    background_refresh: bool = False,
+    background_refresh_ratio: float = provider.DEFAULT_BACKGROUND_REFRESH_RATIO,
+    stale_while_revalidate: Optional[datetime.timedelta] = None,
+    token_cache: Optional[cache.TokenCache] = None,
+    token_store: Optional[store.TokenStore] = None,
+    issuer_metadata_cache: Optional[issuer.MetadataCache] = None,
+    retry_policy: Optional[retry.RetryPolicy] = None,
+    circuit_breaker: Optional[retry.CircuitBreaker] = None,
+    observer: Optional[metrics.Observer] = None,
+    parse_jwt: bool = False,
+    http2: bool = False,
+    client_assertion: Optional["grant.PrivateKeyJWT"] = None,
+    client_secret_basic: bool = False,
+    http_async_client: Optional["httpx.AsyncClient"] = None,
+    http_transport: Optional["httpx.AsyncBaseTransport"] = None,
 ):
     """Returns a new AsyncTokenProvider instance configured from the given Discovery
     object.
 
-    By default the provider will be configured to use the "platform".
+    By default the provider will be configured to use the "platform". The provider
+    always uses the refresh token of the discovered credentials, so the grant
+    argument of the AsyncTokenProvider is not supported.
 
     Args:
         discovery: The Discovery object to use for configuration.
@@ -96,6 +192,39 @@ def create_async(
             timeouts (connect, read, write).
         http_ssl_context: The SSL context to use for HTTPS requests.
             If not specified default SSL context is used.
+        http_keep_alive: When enabled, the provider keeps a pool of open HTTP
+            connections to the issuer and reuses it for all of the requests.
+        background_refresh: When enabled, the access token is refreshed in the
+            background before it expires.
+        background_refresh_ratio: Fraction of the access token lifetime after
+            which the background refresh occurs. (default: 0.75)
+        stale_while_revalidate: Optionally sets the period before the refresh
+            becomes required, during which the current access token is returned
+            right away while it's refreshed in the background.
+        token_cache: Optional cache that allows equivalent providers to share the
+            access token and the refresh in progress.
+        token_store: Optional persistent store that allows equivalent providers in
+            different processes to share the access token and the refresh token.
+        issuer_metadata_cache: Cache of the issuer discovery documents. If not
+            specified, the cache shared by the whole process is used.
+        retry_policy: Optional policy for retrying the failed requests to the issuer.
+        circuit_breaker: Optional circuit breaker that suspends the requests to the
+            issuer after repeated failures.
+        observer: Optional observer that receives the events of the provider.
+        parse_jwt: When enabled, lifetime and scope of the JWT access tokens are read
+            from their claims when the response does not contain them.
+        http2: When enabled, the requests to the issuer are multiplexed over a
+            single HTTP/2 connection. Requires the h2o-authn[http2] extra.
+        client_assertion: Optional h2o_authn.grant.PrivateKeyJWT the client
+            authenticates with instead of the client_secret.
+        client_secret_basic: When enabled, the client authenticates with the
+            client_secret sent in the Authorization header instead of the request
+            body. Requires the client_secret.
+        http_async_client: Optional httpx.AsyncClient used for the requests instead of
+            creating one. The client is owned by the caller and is never closed.
+        http_transport: Optional httpx transport (e.g. httpx.ASGITransport) used
+            by the clients the provider creates. Mutually exclusive with the
+            http_async_client.
     """
 
     client_id = discovery.clients[client].oauth2_client_id
@@ -113,4 +242,20 @@ def create_async(
         minimal_refresh_period=minimal_refresh_period,
         http_timeout=http_timeout,
         http_ssl_context=http_ssl_context,
+        http_keep_alive=http_keep_alive,
+        background_refresh=background_refresh,
+        background_refresh_ratio=background_refresh_ratio,
+        stale_while_revalidate=stale_while_revalidate,
+        token_cache=token_cache,
+        token_store=token_store,
+        issuer_metadata_cache=issuer_metadata_cache,
+        retry_policy=retry_policy,
+        circuit_breaker=circuit_breaker,
+        observer=observer,
+        parse_jwt=parse_jwt,
+        http2=http2,
+        client_assertion=client_assertion,
+        client_secret_basic=client_secret_basic,
+        http_async_client=http_async_client,
+        http_transport=http_transport,
     )
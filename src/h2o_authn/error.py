@@ -39,3 +39,10 @@ class TokenEndpointError(BaseError):
         if self.error_uri:
             parts.append(f" ({self.error_uri})")
         return "".join(parts)
+
+
+class CircuitOpenError(BaseError):
+    """Thrown when the request to the issuer is rejected by the open circuit breaker."""
+
+    def __str__(self) -> str:
+        return "requests to the issuer are suspended after repeated failures"
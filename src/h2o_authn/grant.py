@@ -0,0 +1,197 @@
+"""Grants used to obtain the access tokens and the client authentication methods.
+
+Providers use the refresh token grant unless another grant is passed with the grant
+argument. All of the grants share the same caching, coalescing and expiry handling.
+"""
+
+import datetime
+import inspect
+import time
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Optional
+from typing import Union
+import uuid
+
+from h2o_authn import cache
+
+TOKEN_EXCHANGE_GRANT_TYPE = "urn:ietf:params:oauth:grant-type:token-exchange"
+ACCESS_TOKEN_TYPE = "urn:ietf:params:oauth:token-type:access_token"
+JWT_BEARER_ASSERTION_TYPE = "urn:ietf:params:oauth:client-assertion-type:jwt-bearer"
+
+DEFAULT_ASSERTION_LIFETIME = datetime.timedelta(minutes=1)
+
+
+class Grant:
+    """Describes how the access token is requested from the token endpoint.
+
+    Subclasses set the grant_type and return the parameters of the grant.
+    """
+
+    grant_type: str
+
+    def parameters(self) -> Dict[str, str]:
+        """Returns the parameters of the token request specific to the grant."""
+        return {}
+
+    def key(self) -> Optional[str]:
+        """Returns the string identifying the tokens obtained with the grant, used
+        in the keys of the token cache and the token store.
+
+        None means the tokens must not be shared, the providers using the grant
+        then ignore the token cache and the token store.
+        """
+        return self.grant_type
+
+
+class ClientCredentials(Grant):
+    """Client credentials grant (RFC 6749, section 4.4) for the service accounts.
+
+    Access token is requested on behalf of the client itself, which must
+    authenticate with the client_secret or the client_assertion.
+    """
+
+    grant_type = "client_credentials"
+
+
+class TokenExchange(Grant):
+    """Token exchange grant (RFC 8693) obtaining the access token for the subject
+    token, e.g. the token of the user the service acts on behalf of.
+
+    Subject token may be a function returning it, such as another sync token
+    provider, so that the current token is used for every exchange. Tokens obtained
+    for the subject token given by a function are never shared through the token
+    cache or the token store, as it's not known whose token the function returns.
+    """
+
+    grant_type = TOKEN_EXCHANGE_GRANT_TYPE
+
+    def __init__(
+        self,
+        subject_token: Union[str, Callable[[], str]],
+        *,
+        subject_token_type: str = ACCESS_TOKEN_TYPE,
+        actor_token: Optional[Union[str, Callable[[], str]]] = None,
+        actor_token_type: Optional[str] = None,
+        requested_token_type: Optional[str] = None,
+        audience: Optional[str] = None,
+        resource: Optional[str] = None,
+    ) -> None:
+        """Returns a new instance of the grant.
+
+        Args:
+            subject_token: Token representing the subject or the function returning
+                it. Function must not be a coroutine, use the sync provider.
+            subject_token_type: Type of the subject token. (default: access token)
+            actor_token: Optional token representing the acting party or the
+                function returning it.
+            actor_token_type: Type of the actor token. Required with actor_token.
+            requested_token_type: Optional type of the requested token.
+            audience: Optional logical name of the target service.
+            resource: Optional URI of the target service.
+        """
+        if actor_token is not None and not actor_token_type:
+            raise ValueError("'actor_token_type' is required with 'actor_token'.")
+        if _is_async(subject_token) or _is_async(actor_token):
+            raise TypeError(
+                "'subject_token' and 'actor_token' functions must not be coroutine "
+                "functions."
+            )
+
+        self._subject_token = subject_token
+        self._actor_token = actor_token
+        self._static = {
+            "subject_token_type": subject_token_type,
+            "actor_token_type": actor_token_type,
+            "requested_token_type": requested_token_type,
+            "audience": audience,
+            "resource": resource,
+        }
+
+    def parameters(self) -> Dict[str, str]:
+        params = {"subject_token": _value(self._subject_token)}
+        if self._actor_token is not None:
+            params["actor_token"] = _value(self._actor_token)
+        for name, value in self._static.items():
+            if value:
+                params[name] = value
+        return params
+
+    def key(self) -> Optional[str]:
+        if callable(self._subject_token) or callable(self._actor_token):
+            return None
+        return self.grant_type + cache.secret_digest(
+            self._subject_token, self._actor_token, *self._static.values()
+        )
+
+
+def _is_async(token: Union[str, Callable[[], str], None]) -> bool:
+    if not callable(token):
+        return False
+    return inspect.iscoroutinefunction(token) or inspect.iscoroutinefunction(
+        type(token).__call__
+    )
+
+
+def _value(token: Union[str, Callable[[], str]]) -> str:
+    if not callable(token):
+        return token
+    value = token()
+    if inspect.isawaitable(value):
+        if inspect.iscoroutine(value):
+            value.close()
+        raise TypeError("subject and actor token functions must not be async.")
+    return str(value)
+
+
+class PrivateKeyJWT:
+    """private_key_jwt client authentication (RFC 7523, OpenID Connect Core 9).
+
+    Client authenticates with the short-lived JWT signed by its private key instead
+    of the client secret. A new assertion is created for every request. Requires the
+    PyJWT package with the cryptography (h2o-authn[private-key-jwt] extra).
+    """
+
+    def __init__(
+        self,
+        private_key: Any,
+        *,
+        algorithm: str = "RS256",
+        key_id: Optional[str] = None,
+        lifetime: datetime.timedelta = DEFAULT_ASSERTION_LIFETIME,
+    ) -> None:
+        """Returns a new instance of the client authentication.
+
+        Args:
+            private_key: Private key in PEM format or the key object accepted by the
+                PyJWT.
+            algorithm: Signing algorithm, e.g. RS256 or ES256.
+            key_id: Optional key ID sent in the kid header.
+            lifetime: Lifetime of the assertions.
+        """
+        self._private_key = private_key
+        self._algorithm = algorithm
+        self._headers = {"kid": key_id} if key_id else None
+        self._lifetime = lifetime.total_seconds()
+
+    def parameters(self, client_id: str, token_endpoint_url: str) -> Dict[str, str]:
+        """Returns the parameters authenticating the token request."""
+        import jwt
+
+        now = int(time.time())
+        claims = {
+            "iss": client_id,
+            "sub": client_id,
+            "aud": token_endpoint_url,
+            "jti": uuid.uuid4().hex,
+            "iat": now,
+            "exp": now + int(self._lifetime),
+        }
+        assertion = jwt.encode(
+            claims, self._private_key, algorithm=self._algorithm, headers=self._headers
+        )
+        return {
+            "client_assertion_type": JWT_BEARER_ASSERTION_TYPE,
+            "client_assertion": assertion,
+        }
@@ -0,0 +1,265 @@
+import asyncio
+import collections
+import datetime
+import functools
+import threading
+from typing import Any
+from typing import Dict
+from typing import Iterator
+from typing import Mapping
+from typing import Optional
+from typing import Tuple
+from typing import TYPE_CHECKING
+
+from h2o_authn import _flow
+from h2o_authn import _fork
+
+if TYPE_CHECKING:
+    import httpx
+
+DEFAULT_MAX_SIZE = 128
+# Used for the documents served without explicit freshness information.
+DEFAULT_TTL = datetime.timedelta(minutes=10)
+
+WELL_KNOWN_PATH = "/.well-known/openid-configuration"
+
+
+class Metadata(Mapping[str, Any]):
+    """Parsed OpenID Connect discovery document (provider metadata) of the issuer."""
+
+    def __init__(self, document: Dict[str, Any]) -> None:
+        self._document = document
+
+    def __getitem__(self, key: str) -> Any:
+        return self._document[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._document)
+
+    def __len__(self) -> int:
+        return len(self._document)
+
+    def __repr__(self) -> str:
+        return f"Metadata({self._document!r})"
+
+    @property
+    def issuer(self) -> Optional[str]:
+        """Issuer identifier."""
+        return self._document.get("issuer")
+
+    @property
+    def token_endpoint(self) -> str:
+        """URL of the token endpoint."""
+        return self._document["token_endpoint"]
+
+    @property
+    def revocation_endpoint(self) -> Optional[str]:
+        """URL of the token revocation endpoint if supported."""
+        return self._document.get("revocation_endpoint")
+
+    @property
+    def introspection_endpoint(self) -> Optional[str]:
+        """URL of the token introspection endpoint if supported."""
+        return self._document.get("introspection_endpoint")
+
+    @property
+    def jwks_uri(self) -> Optional[str]:
+        """URL of the issuer's JSON Web Key Set."""
+        return self._document.get("jwks_uri")
+
+
+class _Entry:
+    __slots__ = ("metadata", "expires_at", "etag", "last_modified")
+
+    def __init__(
+        self,
+        metadata: Metadata,
+        expires_at: datetime.datetime,
+        etag: Optional[str],
+        last_modified: Optional[str],
+    ) -> None:
+        self.metadata = metadata
+        self.expires_at = expires_at
+        self.etag = etag
+        self.last_modified = last_modified
+
+
+def discovery_url(issuer_url: str) -> str:
+    """Returns URL of the discovery document of the issuer."""
+    return issuer_url.rstrip("/") + WELL_KNOWN_PATH
+
+
+class MetadataCache:
+    """Cache of the issuer discovery documents shared by the token providers.
+
+    Freshness of the documents follows the Cache-Control header of the response
+    (max-age, no-cache and no-store directives) and falls back to the default TTL.
+    Stale documents are revalidated with the conditional request when the response
+    contained ETag or Last-Modified header. Concurrent lookups of the same issuer are
+    deduplicated.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_size: int = DEFAULT_MAX_SIZE,
+        default_ttl: datetime.timedelta = DEFAULT_TTL,
+    ) -> None:
+        """Returns a new instance of the cache.
+
+        Args:
+            max_size: Maximal number of the issuers kept in the cache.
+            default_ttl: How long the document is considered fresh when the response
+                does not say otherwise.
+        """
+        if max_size < 1:
+            raise ValueError("'max_size' must be positive.")
+
+        self._max_size = max_size
+        self._default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self._entries: collections.OrderedDict[str, _Entry] = collections.OrderedDict()
+        self._issuer_locks: Dict[str, threading.Lock] = {}
+        self._pending: Dict[
+            Tuple[asyncio.AbstractEventLoop, str], "asyncio.Future[Metadata]"
+        ] = {}
+        _fork.register(self)
+
+    def _after_fork(self) -> None:
+        self._lock = threading.Lock()
+        self._issuer_locks = {}
+        self._pending = {}
+
+    def get(self, issuer_url: str) -> Optional[Metadata]:
+        """Returns the fresh cached metadata of the issuer or None."""
+        now = datetime.datetime.now(datetime.timezone.utc)
+        with self._lock:
+            entry = self._entries.get(issuer_url)
+            if entry is None or entry.expires_at <= now:
+                return None
+            self._entries.move_to_end(issuer_url)
+            return entry.metadata
+
+    def fetch(self, issuer_url: str, client: "httpx.Client") -> Metadata:
+        """Returns metadata of the issuer, fetching it with the given client when the
+        cached one is missing or stale.
+        """
+        metadata = self.get(issuer_url)
+        if metadata is not None:
+            return metadata
+
+        with self._lock:
+            issuer_lock = self._issuer_locks.setdefault(issuer_url, threading.Lock())
+
+        with issuer_lock:
+            # Another thread may have fetched it in the meantime.
+            metadata = self.get(issuer_url)
+            if metadata is not None:
+                return metadata
+
+            return _flow.run(
+                self._fetch_flow(issuer_url), functools.partial(_flow.send, client)
+            )
+
+    async def afetch(self, issuer_url: str, client: "httpx.AsyncClient") -> Metadata:
+        """Async variant of the fetch()."""
+        metadata = self.get(issuer_url)
+        if metadata is not None:
+            return metadata
+
+        key = (asyncio.get_running_loop(), issuer_url)
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(self._afetch(issuer_url, client))
+            pending.add_done_callback(lambda _: self._pending.pop(key, None))
+            self._pending[key] = pending
+        return await asyncio.shield(pending)
+
+    async def _afetch(self, issuer_url: str, client: "httpx.AsyncClient") -> Metadata:
+        return await _flow.arun(
+            self._fetch_flow(issuer_url), functools.partial(_flow.asend, client)
+        )
+
+    def _fetch_flow(self, issuer_url: str) -> _flow.Flow[Metadata]:
+        resp = yield _flow.Request(
+            "GET",
+            discovery_url(issuer_url),
+            headers=self._conditional_headers(issuer_url),
+        )
+        return self._update(issuer_url, resp)
+
+    def clear(self) -> None:
+        """Removes all the documents from the cache."""
+        with self._lock:
+            self._entries.clear()
+
+    def _conditional_headers(self, issuer_url: str) -> Dict[str, str]:
+        with self._lock:
+            entry = self._entries.get(issuer_url)
+        headers = {}
+        if entry is not None and entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry is not None and entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def _update(self, issuer_url: str, resp: "httpx.Response") -> Metadata:
+        now = datetime.datetime.now(datetime.timezone.utc)
+        with self._lock:
+            entry = self._entries.get(issuer_url)
+
+        if resp.status_code == 304 and entry is not None:
+            metadata = entry.metadata
+        else:
+            resp.raise_for_status()
+            metadata = Metadata(resp.json())
+
+        ttl, store = self._freshness(resp.headers.get("Cache-Control"))
+        if not store:
+            with self._lock:
+                self._entries.pop(issuer_url, None)
+            return metadata
+
+        entry = _Entry(
+            metadata,
+            expires_at=now + ttl,
+            etag=resp.headers.get("ETag") or (entry.etag if entry else None),
+            last_modified=resp.headers.get("Last-Modified")
+            or (entry.last_modified if entry else None),
+        )
+        with self._lock:
+            self._entries[issuer_url] = entry
+            self._entries.move_to_end(issuer_url)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+        return metadata
+
+    def _freshness(
+        self, cache_control: Optional[str]
+    ) -> Tuple[datetime.timedelta, bool]:
+        """Returns how long the response is fresh and whether it may be stored."""
+        if not cache_control:
+            return self._default_ttl, True
+
+        ttl = self._default_ttl
+        for directive in cache_control.lower().split(","):
+            name, _, value = directive.strip().partition("=")
+            if name == "no-store":
+                return datetime.timedelta(0), False
+            if name == "no-cache":
+                # Stored only for the conditional revalidation.
+                return datetime.timedelta(0), True
+            if name == "max-age":
+                try:
+                    ttl = datetime.timedelta(seconds=max(int(value.strip('"')), 0))
+                except ValueError:
+                    pass
+        return ttl, True
+
+
+_SHARED_CACHE = MetadataCache()
+
+
+def shared_cache() -> MetadataCache:
+    """Returns the issuer metadata cache shared by the whole process."""
+    return _SHARED_CACHE
@@ -0,0 +1,73 @@
+"""Offline reading of the claims of the JWT access tokens.
+
+Signature of the token is not verified. Claims are used only to estimate the
+lifetime and scope of the tokens the provider obtained from the token endpoint
+itself.
+"""
+
+import base64
+import binascii
+import functools
+import json
+from typing import Any
+from typing import Dict
+from typing import Optional
+
+# Tokens are parsed once per update, but the same token may be parsed by many
+# containers (e.g. providers not sharing the cache).
+CLAIMS_CACHE_SIZE = 256
+
+
+@functools.lru_cache(maxsize=CLAIMS_CACHE_SIZE)
+def _claims(value: str) -> Optional[Dict[str, Any]]:
+    parts = value.split(".")
+    if len(parts) != 3:
+        return None
+    payload = parts[1]
+    try:
+        decoded = base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4))
+        claims = json.loads(decoded)
+    except (binascii.Error, ValueError):
+        return None
+    return claims if isinstance(claims, dict) else None
+
+
+def claims(value: str) -> Optional[Dict[str, Any]]:
+    """Returns the claims of the JWT payload or None when the value is not a JWT.
+
+    Results are memoized per token value. Returned dict must not be modified.
+    """
+    return _claims(str(value))
+
+
+def lifetime(claims: Dict[str, Any]) -> Optional[float]:
+    """Returns the lifetime of the token in seconds as intended by the issuer.
+
+    That is the difference of the exp and iat claims, which does not depend on the
+    local clock. None when either of them is missing or not a number.
+    """
+    exp, iat = expires_at(claims), _number(claims.get("iat"))
+    if exp is None or iat is None:
+        return None
+    return exp - iat
+
+
+def expires_at(claims: Dict[str, Any]) -> Optional[float]:
+    """Returns the exp claim as a Unix timestamp or None when it's not a number."""
+    return _number(claims.get("exp"))
+
+
+def scope(claims: Dict[str, Any]) -> Optional[str]:
+    """Returns the space-delimited scope of the token from the scope or scp claim."""
+    value = claims.get("scope", claims.get("scp"))
+    if isinstance(value, str):
+        return value
+    if isinstance(value, list) and all(isinstance(v, str) for v in value):
+        return " ".join(value)
+    return None
+
+
+def _number(value: Any) -> Optional[float]:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return None
@@ -0,0 +1,243 @@
+"""Instrumentation of the token providers.
+
+Providers report their activity to the Observer passed as the observer argument.
+Nothing is measured or reported when no observer is set.
+"""
+
+import time
+from typing import Any
+from typing import Optional
+from typing import Sequence
+
+# Buckets (in seconds) of the request duration histograms.
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Buckets (in seconds) of the histograms of the access token lifetime left at use.
+EXPIRES_IN_BUCKETS = (0.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+
+
+class Observer:
+    """Receives the events of the token providers.
+
+    Subclasses override the methods of the events they are interested in. Methods
+    are called synchronously on the caller's path (or from the background refresh),
+    so they should return quickly and must be thread-safe.
+    """
+
+    def token_used(self, *, cached: bool, expires_in: Optional[float]) -> None:
+        """Called when the provider returns the access token.
+
+        Args:
+            cached: True when the token was served without a refresh.
+            expires_in: Seconds until the returned token expires if known.
+        """
+
+    def refresh_finished(
+        self, *, duration: float, error: Optional[BaseException]
+    ) -> None:
+        """Called when the token endpoint exchange finishes.
+
+        Args:
+            duration: Seconds the exchange took.
+            error: Exception the exchange failed with, None when it succeeded.
+        """
+
+    def discovery_finished(
+        self, *, duration: float, error: Optional[BaseException]
+    ) -> None:
+        """Called when the discovery of the token endpoint finishes.
+
+        Args:
+            duration: Seconds the discovery took.
+            error: Exception the discovery failed with, None when it succeeded.
+        """
+
+
+def error_label(error: Optional[BaseException]) -> str:
+    """Returns low-cardinality label of the error.
+
+    That is the OAuth 2.0 error code for the h2o_authn.error.TokenEndpointError,
+    the exception class name for the other errors and an empty string for None.
+    """
+    if error is None:
+        return ""
+    return getattr(error, "error", None) or type(error).__name__
+
+
+class PrometheusObserver(Observer):
+    """Observer recording the events as Prometheus metrics.
+
+    Requires the prometheus-client package (h2o-authn[prometheus] extra).
+
+    Metrics (prefixed with the namespace):
+        token_requests_total{cached}: Number of the served access tokens.
+        token_expires_in_seconds: Lifetime left of the served access tokens.
+        refreshes_total{error}: Number of the token endpoint exchanges.
+        refresh_duration_seconds: Duration of the token endpoint exchanges.
+        discoveries_total{error}: Number of the token endpoint discoveries.
+        discovery_duration_seconds: Duration of the token endpoint discoveries.
+    """
+
+    def __init__(
+        self,
+        *,
+        registry: Any = None,
+        namespace: str = "h2o_authn",
+        duration_buckets: Sequence[float] = DURATION_BUCKETS,
+        expires_in_buckets: Sequence[float] = EXPIRES_IN_BUCKETS,
+    ) -> None:
+        """Returns a new instance of the observer.
+
+        Args:
+            registry: Registry the metrics are registered to. Default registry of
+                the prometheus-client is used if not specified.
+            namespace: Prefix of the metric names.
+            duration_buckets: Buckets of the duration histograms.
+            expires_in_buckets: Buckets of the token lifetime histogram.
+        """
+        import prometheus_client
+
+        options: dict = {"namespace": namespace}
+        if registry is not None:
+            options["registry"] = registry
+
+        self._token_requests = prometheus_client.Counter(
+            "token_requests_total",
+            "Number of the access tokens returned by the providers.",
+            ["cached"],
+            **options,
+        )
+        self._token_requests_cached = self._token_requests.labels(cached="true")
+        self._token_requests_refreshed = self._token_requests.labels(cached="false")
+        self._token_expires_in = prometheus_client.Histogram(
+            "token_expires_in_seconds",
+            "Lifetime left of the access tokens returned by the providers.",
+            buckets=expires_in_buckets,
+            **options,
+        )
+        self._refreshes = prometheus_client.Counter(
+            "refreshes_total",
+            "Number of the token endpoint exchanges by the error.",
+            ["error"],
+            **options,
+        )
+        self._refresh_duration = prometheus_client.Histogram(
+            "refresh_duration_seconds",
+            "Duration of the token endpoint exchanges.",
+            buckets=duration_buckets,
+            **options,
+        )
+        self._discoveries = prometheus_client.Counter(
+            "discoveries_total",
+            "Number of the token endpoint discoveries by the error.",
+            ["error"],
+            **options,
+        )
+        self._discovery_duration = prometheus_client.Histogram(
+            "discovery_duration_seconds",
+            "Duration of the token endpoint discoveries.",
+            buckets=duration_buckets,
+            **options,
+        )
+
+    def token_used(self, *, cached: bool, expires_in: Optional[float]) -> None:
+        if cached:
+            self._token_requests_cached.inc()
+        else:
+            self._token_requests_refreshed.inc()
+        if expires_in is not None:
+            self._token_expires_in.observe(expires_in)
+
+    def refresh_finished(
+        self, *, duration: float, error: Optional[BaseException]
+    ) -> None:
+        self._refreshes.labels(error=error_label(error)).inc()
+        self._refresh_duration.observe(duration)
+
+    def discovery_finished(
+        self, *, duration: float, error: Optional[BaseException]
+    ) -> None:
+        self._discoveries.labels(error=error_label(error)).inc()
+        self._discovery_duration.observe(duration)
+
+
+class OpenTelemetryObserver(Observer):
+    """Observer recording the events as OpenTelemetry metrics and spans.
+
+    Requires the opentelemetry-api package (h2o-authn[opentelemetry] extra).
+    Records the same metrics as the PrometheusObserver (named h2o_authn.*) and
+    the h2o_authn.refresh and h2o_authn.discovery spans.
+    """
+
+    def __init__(self, *, meter: Any = None, tracer: Any = None) -> None:
+        """Returns a new instance of the observer.
+
+        Args:
+            meter: Meter used for the metrics. Meter of the global meter provider is
+                used if not specified.
+            tracer: Tracer used for the spans. Tracer of the global tracer provider
+                is used if not specified.
+        """
+        from opentelemetry import metrics
+        from opentelemetry import trace
+
+        from h2o_authn import _version
+
+        meter = meter or metrics.get_meter("h2o_authn", _version.__version__)
+        self._tracer = tracer or trace.get_tracer("h2o_authn", _version.__version__)
+        self._status_error = trace.StatusCode.ERROR
+
+        self._token_requests = meter.create_counter(
+            "h2o_authn.token.requests",
+            description="Number of the access tokens returned by the providers.",
+        )
+        self._token_expires_in = meter.create_histogram(
+            "h2o_authn.token.expires_in",
+            unit="s",
+            description="Lifetime left of the access tokens returned by the providers.",
+        )
+        self._refreshes = meter.create_counter(
+            "h2o_authn.refreshes",
+            description="Number of the token endpoint exchanges by the error.",
+        )
+        self._refresh_duration = meter.create_histogram(
+            "h2o_authn.refresh.duration",
+            unit="s",
+            description="Duration of the token endpoint exchanges.",
+        )
+        self._discoveries = meter.create_counter(
+            "h2o_authn.discoveries",
+            description="Number of the token endpoint discoveries by the error.",
+        )
+        self._discovery_duration = meter.create_histogram(
+            "h2o_authn.discovery.duration",
+            unit="s",
+            description="Duration of the token endpoint discoveries.",
+        )
+
+    def token_used(self, *, cached: bool, expires_in: Optional[float]) -> None:
+        self._token_requests.add(1, {"cached": cached})
+        if expires_in is not None:
+            self._token_expires_in.record(expires_in)
+
+    def refresh_finished(
+        self, *, duration: float, error: Optional[BaseException]
+    ) -> None:
+        self._refreshes.add(1, {"error": error_label(error)})
+        self._refresh_duration.record(duration)
+        self._span("h2o_authn.refresh", duration, error)
+
+    def discovery_finished(
+        self, *, duration: float, error: Optional[BaseException]
+    ) -> None:
+        self._discoveries.add(1, {"error": error_label(error)})
+        self._discovery_duration.record(duration)
+        self._span("h2o_authn.discovery", duration, error)
+
+    def _span(self, name: str, duration: float, error: Optional[BaseException]):
+        # Span is recorded once the operation finished, so it's backdated.
+        end = time.time_ns()
+        span = self._tracer.start_span(name, start_time=end - int(duration * 1e9))
+        if error is not None:
+            span.record_exception(error)
+            span.set_status(self._status_error, error_label(error))
+        span.end(end_time=end)
@@ -0,0 +1,255 @@
+import asyncio
+import contextlib
+import functools
+import threading
+import time
+from typing import AsyncIterator
+from typing import Dict
+from typing import Optional
+from typing import Tuple
+import urllib.parse
+import weakref
+
+from h2o_authn import _flow
+from h2o_authn import provider
+from h2o_authn import token
+
+
+def normalize_scope(scope: str) -> str:
+    """Returns the scope with the space-delimited values sorted and deduplicated,
+    so that the equivalent scopes are represented the same way.
+    """
+    return " ".join(sorted(set(scope.split())))
+
+
+def covers(granted: str, requested: str) -> bool:
+    """Returns True when the granted scope includes all the values of the requested
+    one.
+    """
+    return set(requested.split()) <= set(granted.split())
+
+
+class _BaseMultiScopeTokenProvider(provider._BaseTokenProvider):
+    def __init__(self, **kwargs) -> None:
+        """Returns a new instance of the token provider.
+
+        Accepts the same arguments as the single-scope provider. The scope argument
+        sets the default scope, used when no scope is requested explicitly.
+        """
+        super().__init__(**kwargs)
+
+    def _init_state(self) -> None:
+        super()._init_state()
+        self._default_scope = normalize_scope(self._scope) if self._scope else None
+        self._scoped_lock = threading.Lock()
+        self._scoped_containers: Dict[str, token.Container] = {}
+
+    def _after_fork(self) -> None:
+        super()._after_fork()
+        self._scoped_lock = threading.Lock()
+        for container in self._scoped_containers.values():
+            container._after_fork()
+
+    def _is_default_scope(self, scope: Optional[str]) -> bool:
+        return scope is None or normalize_scope(scope) == self._default_scope
+
+    def _scoped_container(self, scope: str) -> token.Container:
+        with self._scoped_lock:
+            container = self._scoped_containers.get(scope)
+            if container is None:
+                # Only the access token is kept there. The refresh token is always
+                # taken from the container of the default scope.
+                container = token.Container(
+                    refresh_token=self._original_refresh_token or "",
+                    expiry_threshold=self._expiry_threshold,
+                    expires_in_fallback=self._expires_in_fallback,
+                    minimal_expires_in=self._minimal_refresh_period,
+                    parse_jwt=self._parse_jwt,
+                )
+                self._scoped_containers[scope] = container
+            return container
+
+    def _covering_container(self, scope: str) -> Optional[token.Container]:
+        """Returns container with a usable access token of another scope that
+        includes all of the values of the requested scope if there's any.
+        """
+        with self._scoped_lock:
+            candidates = list(self._scoped_containers.items())
+        # Scope of the default token is known only from the response when no scope
+        # was requested.
+        candidates.append((self._default_scope or "", self._token_container))
+
+        for key, container in candidates:
+            if key == scope or container.refresh_required():
+                continue
+            if covers(container.access_token.scope or key, scope):
+                return container
+        return None
+
+    def _scoped_token(self, scope: str) -> Tuple[token.Container, bool]:
+        """Returns the container of the scope, or of the wider scope which token is
+        reused, and whether its token can be used without the exchange.
+        """
+        container = self._scoped_container(scope)
+        if not container.refresh_required():
+            return container, True
+        covering = self._covering_container(scope)
+        if covering is not None:
+            return covering, True
+        return container, False
+
+    def _scoped_refresh_flow(
+        self, scope: str, container: token.Container
+    ) -> _flow.Flow[None]:
+        """Obtains the access token of the scope. Runs with the lock of the token
+        store held when it's set.
+        """
+        if self._token_store is not None:
+            # Picks up the refresh token rotated by another process.
+            self._restore_stored_token()
+        with self._observed("refresh"):
+            requested_at = time.time()
+            assert self._token_endpoint_url is not None
+            resp = yield _flow.Request(
+                "POST",
+                self._token_endpoint_url,
+                content=self._encode_form(urllib.parse.urlencode({"scope": scope})),
+                headers=self._form_headers,
+            )
+            self._update_scoped_token(resp, container, requested_at)
+        if self._token_store is not None:
+            self._store_token()
+
+    def _update_scoped_token(
+        self, resp, container: token.Container, requested_at: float
+    ):
+        resp_data = self._token_response_data(resp)
+        container.update_token(
+            access_token=resp_data["access_token"],
+            expires_in=resp_data.get("expires_in"),
+            scope=resp_data.get("scope"),
+            requested_at=requested_at,
+            server_date=provider._response_date(resp),
+        )
+        self._token_container.update_refresh_token(
+            refresh_token=resp_data.get("refresh_token"),
+            refresh_expires_in=resp_data.get("refresh_expires_in"),
+            requested_at=requested_at,
+        )
+
+
+class MultiScopeTokenProvider(_BaseMultiScopeTokenProvider, provider.TokenProvider):
+    """Token provider that manages access tokens of many scopes obtained with a
+    single refresh token.
+
+    Exchanges are serialized, so that the rotated refresh token obtained by one of
+    them is used by the next one. Access token of a wider scope is reused for any
+    scope it includes.
+    """
+
+    def __call__(self, scope: Optional[str] = None) -> str:
+        return str(self.token(scope))
+
+    def _do_scoped_refresh(self, scope: str, container: token.Container):
+        self._run(self._scoped_refresh_flow(scope, container))
+
+    def _refresh_scoped(self, scope: str, container: token.Container):
+        # Refresh lock of the default scope serializes all of the exchanges.
+        lock = self._token_container.refresh_lock
+        if not lock.acquire(blocking=False):
+            if container.access_token_valid():
+                return
+            lock.acquire()
+        try:
+            if container.refresh_required():
+                self._do_scoped_refresh(scope, container)
+        finally:
+            lock.release()
+
+    def token(self, scope: Optional[str] = None) -> token.Token:
+        """Returns the access token for the given scope or the default scope of the
+        provider when not specified.
+        """
+        if scope is None or self._is_default_scope(scope):
+            return super().token()
+
+        scope = normalize_scope(scope)
+        self._ensure_token_endpoint_url()
+        container, cached = self._scoped_token(scope)
+        if not cached:
+            self._refresh_scoped(scope, container)
+        return self._token_used(container, cached)
+
+
+class AsyncMultiScopeTokenProvider(
+    _BaseMultiScopeTokenProvider, provider.AsyncTokenProvider
+):
+    """Token provider that manages access tokens of many scopes obtained with a
+    single refresh token.
+
+    Exchanges are serialized, so that the rotated refresh token obtained by one of
+    them is used by the next one. Access token of a wider scope is reused for any
+    scope it includes.
+    """
+
+    def _init_state(self) -> None:
+        super()._init_state()
+        self._exchange_locks: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, asyncio.Lock
+        ] = weakref.WeakKeyDictionary()
+
+    def _after_fork(self) -> None:
+        super()._after_fork()
+        self._exchange_locks = weakref.WeakKeyDictionary()
+
+    async def __call__(self, scope: Optional[str] = None) -> str:
+        return str(await self.token(scope))
+
+    def _scoped_refresh_done(self, container: token.Container, fut: asyncio.Future):
+        if container.pending_refresh is fut:
+            container.pending_refresh = None
+        # Marks the exception as retrieved even when all the waiters are gone.
+        if not fut.cancelled():
+            fut.exception()
+
+    @contextlib.asynccontextmanager
+    async def _exchange_lock(self) -> AsyncIterator[None]:
+        loop = asyncio.get_running_loop()
+        lock = self._exchange_locks.get(loop)
+        if lock is None:
+            lock = self._exchange_locks[loop] = asyncio.Lock()
+        async with lock:
+            yield
+
+    async def _do_refresh(self, force: bool = False):
+        async with self._exchange_lock():
+            await super()._do_refresh(force=force)
+
+    async def _do_scoped_refresh(self, scope: str, container: token.Container):
+        async with self._exchange_lock():
+            if container.refresh_required():
+                await self._run(self._scoped_refresh_flow(scope, container))
+
+    async def _refresh_scoped(self, scope: str, container: token.Container):
+        pending = container.pending_refresh
+        if pending is None or pending.get_loop() is not asyncio.get_running_loop():
+            pending = asyncio.ensure_future(self._do_scoped_refresh(scope, container))
+            pending.add_done_callback(
+                functools.partial(self._scoped_refresh_done, container)
+            )
+            container.pending_refresh = pending
+        await asyncio.shield(pending)
+
+    async def token(self, scope: Optional[str] = None) -> token.Token:
+        """Returns the access token for the given scope or the default scope of the
+        provider when not specified.
+        """
+        if scope is None or self._is_default_scope(scope):
+            return await super().token()
+
+        scope = normalize_scope(scope)
+        await self._ensure_token_endpoint_url()
+        container, cached = self._scoped_token(scope)
+        if not cached:
+            await self._refresh_scoped(scope, container)
+        return self._token_used(container, cached)
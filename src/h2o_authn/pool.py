@@ -0,0 +1,161 @@
+"""Pool of the token providers of many users of the same client."""
+
+import collections
+import datetime
+import threading
+import time
+from typing import Any
+from typing import Generic
+from typing import Hashable
+from typing import Optional
+from typing import Tuple
+from typing import Type
+from typing import TypeVar
+
+from h2o_authn import _fork
+from h2o_authn import provider
+
+DEFAULT_MAX_SIZE = 10_000
+DEFAULT_TTL = datetime.timedelta(hours=1)
+
+# Refresh token of the template the providers are cloned from. The template is never
+# handed out, so the token is never sent.
+_TEMPLATE_REFRESH_TOKEN = "unused-template-refresh-token"
+
+_P = TypeVar("_P", bound=provider._BaseTokenProvider)
+
+
+class ProviderPool(Generic[_P]):
+    """Bounded pool of the providers of the same configuration, one for each user
+    (refresh token or subject).
+
+    Providers in the pool share the configuration, the issuer discovery and (with
+    http_keep_alive) the pool of HTTP connections. Least recently used providers are
+    evicted when the size limit is reached. Providers are also evicted when they
+    were not used for longer than the TTL or when their refresh token expires (if
+    the token endpoint tells when).
+
+    Evicted providers are not closed, as they share the HTTP connections with the
+    rest of the pool. They stay usable while referenced and their background refresh
+    (if enabled) stops once they are garbage collected.
+
+    Example:
+        ```python
+        pool = h2o_authn.pool.ProviderPool(
+            h2o_authn.TokenProvider, client_id="client-id", issuer_url="https://issuer"
+        )
+        token = pool.get(refresh_token, subject=user_id)()
+        ```
+    """
+
+    def __init__(
+        self,
+        provider_type: Type[_P],
+        *,
+        max_size: int = DEFAULT_MAX_SIZE,
+        ttl: Optional[datetime.timedelta] = DEFAULT_TTL,
+        **kwargs: Any,
+    ) -> None:
+        """Returns a new instance of the pool.
+
+        Args:
+            provider_type: Class of the providers, e.g. h2o_authn.TokenProvider or
+                h2o_authn.AsyncTokenProvider.
+            max_size: Maximal number of the providers kept in the pool.
+            ttl: How long an unused provider is kept in the pool. When None, the
+                providers are evicted only when the pool is full or their refresh
+                token expires.
+            kwargs: Arguments of the providers except the refresh_token.
+        """
+        if max_size < 1:
+            raise ValueError("'max_size' must be positive.")
+
+        self._provider_type = provider_type
+        self._max_size = max_size
+        self._ttl = ttl.total_seconds() if ttl is not None else None
+        # Providers are clones of the template, which holds no state of the users.
+        self._template = provider_type(refresh_token=_TEMPLATE_REFRESH_TOKEN, **kwargs)
+        self._lock = threading.Lock()
+        self._entries: collections.OrderedDict[
+            Hashable, Tuple[_P, float]
+        ] = collections.OrderedDict()
+        _fork.register(self)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, refresh_token: str, subject: Optional[Hashable] = None) -> _P:
+        """Returns the provider of the user.
+
+        Users are identified by the subject when given, otherwise by the refresh
+        token. When the subject is given with a different refresh token than before
+        (e.g. the user signed in again), its provider is replaced.
+        """
+        key = refresh_token if subject is None else subject
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if (
+                entry is not None
+                and entry[0]._original_refresh_token == refresh_token
+                and not self._expired(entry, now)
+            ):
+                self._entries[key] = (entry[0], now)
+                self._entries.move_to_end(key)
+                return entry[0]
+
+            token_provider = self._new_provider(refresh_token)
+            self._entries[key] = (token_provider, now)
+            self._entries.move_to_end(key)
+            self._evict(now)
+            return token_provider
+
+    def discard(self, key: Hashable) -> None:
+        """Removes the provider of the user (subject or refresh token) if present."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Removes all the providers from the pool."""
+        with self._lock:
+            self._entries.clear()
+
+    def close(self) -> None:
+        """Removes all the providers and closes the HTTP connections they shared."""
+        self.clear()
+        if self._template._http_clients:
+            self._template._http_clients.close()
+
+    async def aclose(self) -> None:
+        """Removes all the providers and closes the HTTP connections they shared in
+        the running event loop.
+        """
+        self.clear()
+        if self._template._http_clients:
+            await self._template._http_clients.aclose()
+
+    def _new_provider(self, refresh_token: str) -> _P:
+        return self._template._clone(self._provider_type, refresh_token=refresh_token)
+
+    def _expired(self, entry: Tuple[_P, float], now: float) -> bool:
+        token_provider, last_used = entry
+        if self._ttl is not None and last_used + self._ttl <= now:
+            return True
+
+        refresh_token_exp = token_provider._token_container._refresh_token_exp
+        return refresh_token_exp is not None and refresh_token_exp <= now
+
+    def _evict(self, now: float) -> None:
+        # Entries are ordered by the last use, so the idle ones are at the front.
+        # Entries with the expired refresh token are dropped when looked up.
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if not self._expired(entry, now):
+                break
+            del self._entries[key]
+
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    def _after_fork(self) -> None:
+        self._lock = threading.Lock()
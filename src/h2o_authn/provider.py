@@ -1,27 +1,252 @@
+import asyncio
+import base64
+import contextlib
 import datetime
+import functools
 import os
-import ssl
+import threading
+import time
+from typing import Any
+from typing import AsyncIterator
+from typing import Callable
 from typing import Dict
+from typing import Iterator
+from typing import Mapping
 from typing import Optional
+from typing import Tuple
+from typing import TYPE_CHECKING
+from typing import TypeVar
+from typing import Union
+import urllib.parse
+import weakref
 
-import httpx
-
+from h2o_authn import _flow
+from h2o_authn import _fork
+from h2o_authn import _refresher
+from h2o_authn import cache
 from h2o_authn import error
+from h2o_authn import issuer
+from h2o_authn import metrics
+from h2o_authn import store
 from h2o_authn import token
 
+if TYPE_CHECKING:
+    import ssl
+
+    import httpx
+
+    from h2o_authn import grant
+    from h2o_authn import retry
+
 DEFAULT_EXPIRY_THRESHOLD = datetime.timedelta(seconds=5)
 DEFAULT_EXPIRES_IN_FALLBACK = datetime.timedelta(seconds=30)
 
 DEFAULT_HTTP_TIMEOUT = datetime.timedelta(seconds=5)
 
+DEFAULT_BACKGROUND_REFRESH_RATIO = 0.75
+
+# Bounds of the interval in seconds in which the async provider polls the lock of the
+# token store.
+STORE_LOCK_POLL_INTERVAL = 0.005
+MAX_STORE_LOCK_POLL_INTERVAL = 0.1
+
 TOKEN_ENDPOINT_URL_ENV = "H2O_CLOUD_TOKEN_ENDPOINT_URL"
 
 
+_C = TypeVar("_C")
+
+_default_ssl_context: Optional["ssl.SSLContext"] = None
+_default_ssl_context_lock = threading.Lock()
+
+
+def default_ssl_context() -> "ssl.SSLContext":
+    """Returns the SSL context used by the providers created without the explicit
+    one.
+
+    Context is created with the first request made by any of the providers and then
+    shared by all of them, so that the system CA certificates are loaded only once
+    per process.
+    """
+    global _default_ssl_context
+    with _default_ssl_context_lock:
+        if _default_ssl_context is None:
+            import ssl
+
+            _default_ssl_context = ssl.create_default_context()
+        return _default_ssl_context
+
+
+def _reset_default_ssl_context_lock() -> None:
+    global _default_ssl_context_lock
+    _default_ssl_context_lock = threading.Lock()
+
+
+_fork.register_callback(_reset_default_ssl_context_lock)
+
+
+# httpx and the modules depending on it are imported only when the first client is
+# created, so that the providers which obtain the token from the cache or store do
+# not pay for the import.
+
+
+def _new_client(
+    *,
+    timeout: float,
+    ssl_context: Optional["ssl.SSLContext"],
+    retry_policy: Optional["retry.RetryPolicy"],
+    circuit_breaker: Optional["retry.CircuitBreaker"],
+    transport: Union["httpx.BaseTransport", "httpx.AsyncBaseTransport", None] = None,
+    http2: bool = False,
+) -> "httpx.Client":
+    import httpx
+
+    verify = ssl_context or default_ssl_context()
+    if transport is not None:
+        if not isinstance(transport, httpx.BaseTransport):
+            raise TypeError("'http_transport' does not support the sync requests.")
+        from h2o_authn import _transport
+
+        transport = _transport.BorrowedTransport(transport)
+    if retry_policy or circuit_breaker:
+        from h2o_authn import retry
+
+        transport = retry.RetryTransport(
+            transport or httpx.HTTPTransport(verify=verify, http2=http2),
+            policy=retry_policy,
+            breaker=circuit_breaker,
+        )
+    return httpx.Client(
+        timeout=timeout, verify=verify, transport=transport, http2=http2
+    )
+
+
+def _new_async_client(
+    *,
+    timeout: float,
+    ssl_context: Optional["ssl.SSLContext"],
+    retry_policy: Optional["retry.RetryPolicy"],
+    circuit_breaker: Optional["retry.CircuitBreaker"],
+    transport: Union["httpx.BaseTransport", "httpx.AsyncBaseTransport", None] = None,
+    http2: bool = False,
+) -> "httpx.AsyncClient":
+    import httpx
+
+    verify = ssl_context or default_ssl_context()
+    if transport is not None:
+        if not isinstance(transport, httpx.AsyncBaseTransport):
+            raise TypeError("'http_transport' does not support the async requests.")
+        from h2o_authn import _transport
+
+        transport = _transport.AsyncBorrowedTransport(transport)
+    if retry_policy or circuit_breaker:
+        from h2o_authn import retry
+
+        transport = retry.AsyncRetryTransport(
+            transport or httpx.AsyncHTTPTransport(verify=verify, http2=http2),
+            policy=retry_policy,
+            breaker=circuit_breaker,
+        )
+    return httpx.AsyncClient(
+        timeout=timeout, verify=verify, transport=transport, http2=http2
+    )
+
+
+def _response_date(resp: "httpx.Response") -> Optional[float]:
+    """Returns the Date header of the response as POSIX timestamp if it's valid."""
+    value = resp.headers.get("Date")
+    if not value:
+        return None
+
+    import email.utils
+
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=datetime.timezone.utc)
+    return date.timestamp()
+
+
+class _HTTPClients:
+    """Lazily created long-lived HTTP clients shared by the provider and its clones.
+
+    Sync and async clients are kept separately so that the pool can be shared between
+    the sync and async variants of the provider. Async clients are kept per event
+    loop, because their connections can't be used from the other loops.
+    """
+
+    def __init__(
+        self,
+        *,
+        new_client: Callable[[], "httpx.Client"],
+        new_async_client: Callable[[], "httpx.AsyncClient"],
+    ) -> None:
+        self._new_client = new_client
+        self._new_async_client = new_async_client
+        self._lock = threading.Lock()
+        self._sync_client: Optional["httpx.Client"] = None
+        self._async_clients: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, "httpx.AsyncClient"
+        ] = weakref.WeakKeyDictionary()
+
+    def after_fork(self) -> None:
+        """Drops the clients inherited from the parent process.
+
+        Clients are not closed, as their connections are still used by the parent.
+        """
+        self._lock = threading.Lock()
+        self._sync_client = None
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    def sync_client(self) -> "httpx.Client":
+        with self._lock:
+            if self._sync_client is None:
+                self._sync_client = self._new_client()
+            return self._sync_client
+
+    def async_client(self) -> "httpx.AsyncClient":
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                client = self._new_async_client()
+                self._async_clients[loop] = client
+            return client
+
+    def close(self) -> None:
+        with self._lock:
+            client, self._sync_client = self._sync_client, None
+        if client is not None:
+            client.close()
+
+    async def aclose(self) -> None:
+        """Closes the async client of the running loop. Clients of the other loops
+        are dropped and released together with their loops.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.get(loop)
+            self._async_clients.clear()
+        if client is not None:
+            await client.aclose()
+
+
 class _BaseTokenProvider:
+    _background_refresher: Union[
+        _refresher.ThreadRefresher, _refresher.TaskRefresher, None
+    ] = None
+    # Set on the instances only when used. CPython shares the keys of the instance
+    # dictionaries only while they have at most 30 attributes, which keeps the
+    # providers (e.g. of the ProviderPool) small.
+    _http_client: Optional["httpx.Client"] = None
+    _http_async_client: Optional["httpx.AsyncClient"] = None
+    _token_store_key = ""
+
     def __init__(
         self,
         *,
-        refresh_token: str,
+        refresh_token: Optional[str] = None,
         client_id: str,
         issuer_url: Optional[str] = None,
         token_endpoint_url: Optional[str] = None,
@@ -31,12 +256,33 @@ class _BaseTokenProvider:
         expires_in_fallback: datetime.timedelta = DEFAULT_EXPIRES_IN_FALLBACK,
         http_timeout: datetime.timedelta = DEFAULT_HTTP_TIMEOUT,
         minimal_refresh_period: Optional[datetime.timedelta] = None,
-        http_ssl_context: Optional[ssl.SSLContext] = None,
+        http_ssl_context: Optional["ssl.SSLContext"] = None,
+        http_keep_alive: bool = False,
+        http2: bool = False,
+        background_refresh: bool = False,
+        background_refresh_ratio: float = DEFAULT_BACKGROUND_REFRESH_RATIO,
+        stale_while_revalidate: Optional[datetime.timedelta] = None,
+        token_cache: Optional[cache.TokenCache] = None,
+        token_store: Optional[store.TokenStore] = None,
+        issuer_metadata_cache: Optional[issuer.MetadataCache] = None,
+        retry_policy: Optional["retry.RetryPolicy"] = None,
+        circuit_breaker: Optional["retry.CircuitBreaker"] = None,
+        observer: Optional[metrics.Observer] = None,
+        parse_jwt: bool = False,
+        grant: Optional["grant.Grant"] = None,
+        client_assertion: Optional["grant.PrivateKeyJWT"] = None,
+        client_secret_basic: bool = False,
+        http_client: Optional["httpx.Client"] = None,
+        http_async_client: Optional["httpx.AsyncClient"] = None,
+        http_transport: Union[
+            "httpx.BaseTransport", "httpx.AsyncBaseTransport", None
+        ] = None,
     ) -> None:
         """Returns a new instance of the token provider.
 
         Args:
             refresh_token: Refresh token which will used for the access token exchange.
+                Required unless another grant is set.
             client_id: OAuth 2.0 client id that will be used or the access token
                 exchange.
             issuer_url: Base URL of the issuer. This URL will be used for the discovery
@@ -61,7 +307,87 @@ class _BaseTokenProvider:
             http_timeout: The timeout for HTTP requests. Value applies to all of the
                 timeouts (connect, read, write).
             http_ssl_context: The SSL context to use for HTTPS requests.
-                If not specified default SSL context is used.
+                If not specified, the default SSL context shared by the whole process
+                (created on the first request) is used.
+            http_keep_alive: When enabled, the provider keeps a pool of open HTTP
+                connections to the issuer and reuses it for all of the requests
+                instead of opening a new connection for every exchange. The pool is
+                shared with the clones of the provider (async clients are kept per
+                event loop) and should be released by calling close() (or aclose()
+                for the async provider) or by using the provider as a context manager.
+            http2: When enabled, the requests to the issuer use HTTP/2 when the
+                server supports it (negotiated with TLS ALPN), so that the
+                concurrent exchanges of the provider and its clones (e.g. with_scope
+                siblings, providers of the ProviderPool or exchange_many) multiplex
+                over a single connection. Implies http_keep_alive. Requires the
+                h2o-authn[http2] extra.
+            background_refresh: When enabled, the access token is refreshed in the
+                background (daemon thread for the sync provider, asyncio task for the
+                async one) before it expires, so obtaining the token does not wait
+                for the token endpoint. When the background refresh fails, the token
+                is refreshed on the caller's path as usual. Background refresh starts
+                with the first token request and stops when the provider is closed or
+                garbage collected.
+            background_refresh_ratio: Fraction of the access token lifetime after
+                which the background refresh occurs. The moment is randomly shifted
+                by up to 10% of the lifetime to spread the load. (default: 0.75)
+            stale_while_revalidate: Optionally sets the period before the refresh
+                becomes required, during which the current access token is returned
+                right away while at most one refresh runs in the background. Callers
+                wait for the refresh only once it becomes required.
+            token_cache: Optional cache (e.g. h2o_authn.cache.shared_cache()) that
+                allows equivalent providers to share the access token and the refresh
+                in progress instead of each one obtaining its own token. Not used
+                with the grants which tokens can't be shared.
+            token_store: Optional persistent store (e.g. h2o_authn.store.FileStore)
+                that allows equivalent providers in different processes to share the
+                access token and the rotated refresh token. Only one process at a
+                time refreshes the token and the others reuse its result. Not used
+                with the grants which tokens can't be shared.
+            issuer_metadata_cache: Cache of the issuer discovery documents used when
+                issuer_url is set. If not specified, the cache shared by the whole
+                process (h2o_authn.issuer.shared_cache()) is used.
+            retry_policy: Optional h2o_authn.retry.RetryPolicy applied to the
+                requests to the issuer (token exchange and discovery) that fail with
+                transport errors or retryable statuses. By default, the requests are
+                not retried.
+            circuit_breaker: Optional h2o_authn.retry.CircuitBreaker (possibly shared
+                by many providers) that suspends the requests to the issuer after
+                repeated failures. While the circuit is open, the current access
+                token is returned as long as it has not expired. Otherwise the
+                h2o_authn.error.CircuitOpenError is raised.
+            observer: Optional h2o_authn.metrics.Observer that receives the events
+                of the provider (token use, refreshes and discoveries), e.g. the
+                h2o_authn.metrics.PrometheusObserver. Nothing is measured when not
+                set.
+            parse_jwt: When enabled, claims of the JWT access tokens are read
+                (without the signature verification). The token lifetime (exp - iat,
+                at most the time left until exp) is used when the response does not
+                contain expires_in or when it's shorter, and the scope claim when
+                the response has no scope.
+            grant: Optional grant used to obtain the access tokens instead of the
+                refresh token, e.g. h2o_authn.grant.ClientCredentials() or
+                h2o_authn.grant.TokenExchange(). Mutually exclusive with the
+                refresh_token argument.
+            client_assertion: Optional h2o_authn.grant.PrivateKeyJWT the client
+                authenticates with instead of the client_secret.
+            client_secret_basic: When enabled, the client authenticates with the
+                client_id and client_secret sent in the Authorization header (HTTP
+                Basic, client_secret_basic) instead of the request body. Requires
+                the client_secret.
+            http_client: Optional httpx.Client used for the requests of the sync
+                provider instead of creating its own, e.g. the client of the
+                application. The client is owned by the caller and is never closed
+                by the provider. Its configuration (timeout, SSL, proxies) applies
+                instead of the http_* arguments of the provider.
+            http_async_client: Optional httpx.AsyncClient used for the requests of
+                the async provider, the same way as http_client.
+            http_transport: Optional httpx transport (e.g. httpx.MockTransport,
+                httpx.WSGITransport or httpx.ASGITransport) used by the clients the
+                provider creates. The transport is owned by the caller and is never
+                closed by the provider. Retries and the circuit breaker apply on
+                top of it. Mutually exclusive with the http_client and
+                http_async_client arguments.
         """
 
         if token_endpoint_url and issuer_url:
@@ -74,55 +400,281 @@ class _BaseTokenProvider:
         if not self._token_endpoint_url:
             self._token_endpoint_url = os.environ.get(TOKEN_ENDPOINT_URL_ENV)
 
+        if (refresh_token is None) == (grant is None):
+            raise ValueError("set exactly one of 'refresh_token' or 'grant' arguments.")
+
         if not self._token_endpoint_url and not issuer_url:
             raise ValueError(
                 "setting 'token_endpoint_url' or 'issuer_url' argument is required."
             )
 
-        self._token_container = token.Container(
-            refresh_token=refresh_token,
-            expiry_threshold=expiry_threshold,
-            expires_in_fallback=expires_in_fallback,
-            minimal_expires_in=minimal_refresh_period,
-        )
+        if http_transport is not None and (http_client or http_async_client):
+            raise ValueError(
+                "'http_transport' and 'http_client' or 'http_async_client' "
+                "arguments are mutually exclusive. set only one."
+            )
 
+        if (http_client or http_async_client) and (retry_policy or circuit_breaker):
+            raise ValueError(
+                "'retry_policy' and 'circuit_breaker' can't be applied to the "
+                "injected client. use 'http_transport' argument instead."
+            )
+
+        if client_secret_basic and client_assertion is not None:
+            raise ValueError(
+                "'client_secret_basic' and 'client_assertion' arguments are "
+                "mutually exclusive. set only one."
+            )
+
+        if client_secret_basic and not client_secret:
+            raise ValueError("'client_secret_basic' requires 'client_secret' argument.")
+
+        if not 0 < background_refresh_ratio <= 1:
+            raise ValueError("'background_refresh_ratio' must be in (0, 1] range.")
+
+        # Token endpoint or the issuer it's discovered from.
+        self._endpoint_origin = self._token_endpoint_url or issuer_url
         self._original_refresh_token = refresh_token
         self._client_id = client_id
         self._client_secret = client_secret
+        self._grant = grant
+        self._client_assertion = client_assertion
         self._scope = scope
         self._expiry_threshold = expiry_threshold
         self._expires_in_fallback = expires_in_fallback
         self._minimal_refresh_period = minimal_refresh_period
         self._issuer_url = issuer_url
+        self._issuer_metadata_cache = issuer_metadata_cache or issuer.shared_cache()
+        self._issuer_metadata: Optional[issuer.Metadata] = None
+        # Tokens of the grants that can't be identified (e.g. exchange of the subject
+        # token returned by a function) are never shared.
+        shared = grant is None or grant.key() is not None
+        self._token_cache = token_cache if shared else None
+        self._token_store = token_store if shared else None
 
-        self._http_timeout = http_timeout.total_seconds()
-        self._verify = http_ssl_context or ssl.create_default_context()
+        self._observer = observer
+        self._parse_jwt = parse_jwt
 
-    def _create_refresh_request_data(self) -> Dict[str, str]:
-        data = {
-            "grant_type": "refresh_token",
-            "client_id": self._client_id,
-            "refresh_token": self._token_container.refresh_token,
+        # Options of the clients the provider creates, kept together so that the
+        # providers stay small.
+        self._client_options: Dict[str, Any] = {
+            "timeout": http_timeout.total_seconds(),
+            "ssl_context": http_ssl_context,
+            "retry_policy": retry_policy,
+            "circuit_breaker": circuit_breaker,
+            "transport": http_transport,
+            "http2": http2,
         }
+        if http_client is not None:
+            self._http_client = http_client
+        if http_async_client is not None:
+            self._http_async_client = http_async_client
+        self._http_clients: Optional[_HTTPClients] = None
+        if http_keep_alive or http2:
+            self._http_clients = _HTTPClients(
+                new_client=self._client_factory(_new_client),
+                new_async_client=self._client_factory(_new_async_client),
+            )
+
+        self._stale_while_revalidate = stale_while_revalidate
+        self._background_refresh = background_refresh
+        self._background_refresh_ratio = background_refresh_ratio
+
+        # Shared with the clones, which differ only in the scope or refresh token.
+        self._form_static, self._form_headers = self._static_form(client_secret_basic)
+        self._init_state()
+
+    def _init_state(self) -> None:
+        """Initializes the state of the provider derived from its configuration.
+
+        Called by the constructor and for the clones, which share the rest of the
+        attributes with the provider they were created from.
+        """
+        self._token_container = self._container()
+
+        if self._token_store is not None:
+            key_values = [
+                self._endpoint_origin,
+                self._client_id,
+                self._scope,
+                self._original_refresh_token,
+                self._client_secret,
+            ]
+            if self._grant is not None:
+                key_values.append(self._grant.key() or "")
+            self._token_store_key = cache.secret_digest(*key_values)
+
+        self._cached_token_request: Optional[Tuple[str, _flow.Request]] = None
+
+        self._background_refresher_lock = threading.Lock()
+        _fork.register(self)
+
+    def _container(self) -> token.Container:
+        create_container = functools.partial(
+            token.Container,
+            refresh_token=self._original_refresh_token or "",
+            expiry_threshold=self._expiry_threshold,
+            expires_in_fallback=self._expires_in_fallback,
+            minimal_expires_in=self._minimal_refresh_period,
+            stale_while_revalidate=self._stale_while_revalidate,
+            parse_jwt=self._parse_jwt,
+        )
+        if self._token_cache is None:
+            return create_container()
+
+        key = (
+            # Sync and async providers do not share the refresh coordination.
+            type(self),
+            self._endpoint_origin,
+            self._client_id,
+            self._scope,
+            cache.secret_digest(self._original_refresh_token, self._client_secret),
+            self._grant.key() if self._grant is not None else None,
+            self._expiry_threshold,
+            self._expires_in_fallback,
+            self._minimal_refresh_period,
+            self._stale_while_revalidate,
+            self._parse_jwt,
+        )
+        return self._token_cache.container(key, create_container)
+
+    def _after_fork(self) -> None:
+        """Resets the state inherited from the parent process after fork.
+
+        Background refresh (if enabled) starts again with the next token request and
+        new HTTP connections are opened by the child.
+        """
+        self._background_refresher_lock = threading.Lock()
+        self._background_refresher = None
+        self._token_container._after_fork()
+        if self._http_clients:
+            self._http_clients.after_fork()
+
+    def _client_factory(self, new_client: Callable[..., _C]) -> Callable[[], _C]:
+        """Returns function creating the HTTP client configured for the provider.
+
+        Functions are created only when needed rather than kept by every provider,
+        so that the providers stay small.
+        """
+        return functools.partial(new_client, **self._client_options)
+
+    def _static_form(self, client_secret_basic: bool) -> Tuple[str, Mapping[str, str]]:
+        """Returns the encoded parameters of the token request which do not change
+        between the requests and the headers of the request.
+        """
+        grant_type = "refresh_token" if self._grant is None else self._grant.grant_type
+        data = {"grant_type": grant_type}
+        headers = {"Content-Type": "application/x-www-form-urlencoded"}
+        if client_secret_basic:
+            # Credentials are form-encoded before the base64 (RFC 6749, 2.3.1).
+            credentials = ":".join(
+                urllib.parse.quote_plus(value)
+                for value in (self._client_id, self._client_secret or "")
+            )
+            headers["Authorization"] = (
+                "Basic " + base64.b64encode(credentials.encode()).decode()
+            )
+        else:
+            data["client_id"] = self._client_id
+            if self._client_secret and self._client_assertion is None:
+                data["client_secret"] = self._client_secret
+        return urllib.parse.urlencode(data), headers
+
+    def _encode_form(self, scope: str) -> bytes:
+        """Returns body of the token request with the given encoded scope parameter.
+
+        Only the refresh token (or the parameters of the grant) and the client
+        assertion are encoded for each request.
+        """
+        parts = [self._form_static]
+        if self._grant is None:
+            parts.append(
+                urllib.parse.urlencode(
+                    {"refresh_token": self._token_container.refresh_token}
+                )
+            )
+        else:
+            parts.append(urllib.parse.urlencode(self._grant.parameters()))
+        if self._client_assertion is not None:
+            assert self._token_endpoint_url is not None
+            parameters = self._client_assertion.parameters(
+                self._client_id, self._token_endpoint_url
+            )
+            parts.append(urllib.parse.urlencode(parameters))
+        parts.append(scope)
+        return "&".join(part for part in parts if part).encode()
+
+    @property
+    def issuer_metadata(self) -> Optional[issuer.Metadata]:
+        """Discovery document of the issuer. Available once the provider performed
+        the discovery, None when the token endpoint URL was set directly.
+        """
+        return self._issuer_metadata
+
+    def _token_request(self) -> _flow.Request:
+        """Returns the token request, reusing the last one while the refresh token
+        and the token endpoint stay the same.
+        """
+        url = self._token_endpoint_url
+        assert url is not None
+        refresh_token = self._token_container.refresh_token
+        cached = self._cached_token_request
+        if cached is not None and cached[0] == refresh_token and cached[1].url == url:
+            return cached[1]
 
-        if self._client_secret:
-            data["client_secret"] = self._client_secret
+        scope = urllib.parse.urlencode({"scope": self._scope}) if self._scope else ""
+        request = _flow.Request(
+            "POST", url, content=self._encode_form(scope), headers=self._form_headers
+        )
+        # Requests with the grant parameters or the client assertion change every
+        # time.
+        if self._grant is None and self._client_assertion is None:
+            self._cached_token_request = (refresh_token, request)
+        return request
+
+    def _exchange_flow(self) -> _flow.Flow[None]:
+        """Exchanges the refresh token (or the grant) for the access token."""
+        with self._observed("refresh"):
+            requested_at = time.time()
+            resp = yield self._token_request()
+            self._update_token(resp, requested_at)
 
-        if self._scope:
-            data["scope"] = self._scope
+    def _refresh_flow(self, forced_at: Optional[float]) -> _flow.Flow[None]:
+        """Refreshes the token, reusing the one obtained by another process when the
+        token store is set. Runs with the lock of the store held.
+        """
+        if self._token_store is None:
+            yield from self._exchange_flow()
+            return
 
-        return data
+        if self._restore_stored_token(forced_at):
+            return
+        yield from self._exchange_flow()
+        self._store_token()
 
-    def _fetch_discovery(self, client):
-        uri = self._issuer_url.rstrip("/") + "/.well-known/openid-configuration"
-        return client.get(uri)
+    def _new_refresh_flow(self, force: bool) -> _flow.Flow[None]:
+        """Returns the refresh flow. Time of the forced refresh is taken right away,
+        before waiting for the lock of the token store, so that the token stored by
+        another process in the meantime is reused.
+        """
+        return self._refresh_flow(time.time() if force else None)
 
-    def _fetch_token(self, client):
-        return client.post(
-            self._token_endpoint_url, data=self._create_refresh_request_data()
+    def _update_token(self, resp: "httpx.Response", requested_at: float):
+        resp_data = self._token_response_data(resp)
+        self._token_container.update_token(
+            access_token=resp_data["access_token"],
+            refresh_token=resp_data.get("refresh_token"),
+            expires_in=resp_data.get("expires_in"),
+            scope=resp_data.get("scope"),
+            refresh_expires_in=resp_data.get("refresh_expires_in"),
+            requested_at=requested_at,
+            server_date=_response_date(resp),
         )
 
-    def _update_token(self, resp: httpx.Response):
+    def _token_response_data(self, resp: "httpx.Response") -> Dict[str, Any]:
+        """Returns data of the successful token endpoint response or raises."""
+        import httpx
+
         resp_data = resp.json()
 
         try:
@@ -135,62 +687,266 @@ class _BaseTokenProvider:
                 error_description=resp_data.get("error_description"),
                 error_uri=resp_data.get("error_uri"),
             ) from None
+        return resp_data
 
-        self._token_container.update_token(
-            access_token=resp_data["access_token"],
-            refresh_token=resp_data.get("refresh_token"),
-            expires_in=resp_data.get("expires_in"),
-            scope=resp_data.get("scope"),
+    def _restore_stored_token(self, forced_at: Optional[float] = None) -> bool:
+        """Restores the token stored by another process, including the rotated
+        refresh token.
+
+        Returns True when no exchange is needed. That is when the stored token does
+        not require refresh or, for the forced refresh, when the stored token was
+        obtained after the refresh had been requested (timestamp in forced_at).
+        """
+        assert self._token_store is not None
+        state = self._token_store.load(self._token_store_key)
+        if state is None:
+            return False
+
+        container = self._token_container
+        if state.get("access_token") != container.snapshot()["access_token"]:
+            try:
+                container.restore(state)
+            except (KeyError, TypeError, ValueError):
+                # Unusable state is overwritten after the exchange.
+                return False
+
+        if forced_at is not None:
+            updated_at = state.get("access_token_updated_at")
+            return updated_at is not None and updated_at > forced_at
+        return not container.refresh_required()
+
+    def _store_token(self):
+        assert self._token_store is not None
+        self._token_store.save(self._token_store_key, self._token_container.snapshot())
+
+    @contextlib.contextmanager
+    def _observed(self, operation: str) -> Iterator[None]:
+        """Reports duration and outcome of the refresh or discovery to the observer."""
+        observer = self._observer
+        if observer is None:
+            yield
+            return
+
+        report = (
+            observer.refresh_finished
+            if operation == "refresh"
+            else observer.discovery_finished
         )
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            report(duration=time.perf_counter() - start, error=e)
+            raise
+        report(duration=time.perf_counter() - start, error=None)
 
-    def _update_token_endpoint(self, resp: httpx.Response):
-        resp.raise_for_status()
-        self._token_endpoint_url = resp.json()["token_endpoint"]
+    def _token_used(self, container: token.Container, cached: bool) -> token.Token:
+        """Reports use of the token to the observer and returns the token."""
+        if self._observer is not None:
+            self._observer.token_used(cached=cached, expires_in=container.expires_in())
+        return container.access_token
 
-    def _clone(self, constructor, scope: Optional[str] = None):
-        issuer_url = None
-        if not self._token_endpoint_url:
-            issuer_url = self._issuer_url
-
-        return constructor(
-            refresh_token=self._original_refresh_token,
-            client_id=self._client_id,
-            issuer_url=issuer_url,
-            token_endpoint_url=self._token_endpoint_url,
-            client_secret=self._client_secret,
-            scope=scope or self._scope,
-            expiry_threshold=self._expiry_threshold,
-            expires_in_fallback=self._expires_in_fallback,
-            minimal_refresh_period=self._minimal_refresh_period,
+    def _refreshed_since(self, scheduled_at: Optional[float]) -> bool:
+        """Returns whether the token was updated since the scheduled refresh was
+        requested, so that the refresh is no longer needed.
+        """
+        return scheduled_at is not None and self._token_container.updated_since(
+            scheduled_at
         )
 
+    @contextlib.contextmanager
+    def _valid_token_kept(self, force: bool) -> Iterator[None]:
+        """Suppresses the open circuit error of the refresh while the current token
+        is still valid, unless the refresh was forced.
+        """
+        try:
+            yield
+        except error.CircuitOpenError:
+            if force or not self._token_container.access_token_valid():
+                raise
+
+    def _cached_issuer_metadata(self) -> bool:
+        """Uses the cached issuer metadata if available. Returns True when it was."""
+        assert self._issuer_url is not None
+        metadata = self._issuer_metadata_cache.get(self._issuer_url)
+        if metadata is None:
+            return False
+        self._update_issuer_metadata(metadata)
+        return True
+
+    def _update_issuer_metadata(self, metadata: issuer.Metadata):
+        self._issuer_metadata = metadata
+        self._token_endpoint_url = metadata.token_endpoint
+
+    def _clone(
+        self,
+        constructor,
+        scope: Optional[str] = None,
+        refresh_token: Optional[str] = None,
+    ):
+        """Returns provider of the given class with the same configuration, sharing
+        the HTTP connections and the issuer metadata.
+
+        Configuration is shared with the clone rather than passed to its
+        constructor, so that cloning does not need to know about every argument.
+        """
+        clone = constructor.__new__(constructor)
+        clone.__dict__.update(self.__dict__)
+        clone._background_refresher = None
+        if scope:
+            clone._scope = scope
+        if refresh_token:
+            clone._original_refresh_token = refresh_token
+        clone._init_state()
+        return clone
+
 
 class TokenProvider(_BaseTokenProvider):
     """Returns access token when called and makes sure that unexpired access token is
     available."""
 
+    _background_refresher: Optional[_refresher.ThreadRefresher] = None
+
     def __call__(self) -> str:
         return str(self.token())
 
+    def __enter__(self) -> "TokenProvider":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Closes the HTTP connections kept open by the provider.
+
+        Only has an effect when the provider was created with http_keep_alive
+        enabled. The connection pool is shared with the clones of the provider, so
+        closing it affects them as well. New connections are opened when the
+        provider is used again. Stops the background refresh if it's running.
+        Client and transport passed to the provider are left open.
+        """
+        with self._background_refresher_lock:
+            refresher, self._background_refresher = self._background_refresher, None
+        if refresher:
+            refresher.stop()
+        if self._http_clients:
+            self._http_clients.close()
+
     def token(self) -> token.Token:
         self._ensure_token_endpoint_url()
-        if self._token_container.refresh_required():
-            self._do_refresh()
-        return self._token_container.access_token
+        container = self._token_container
+        cached = not container.refresh_required()
+        if not cached:
+            self._refresh()
+        elif container.revalidation_required():
+            self._revalidate()
+        if self._background_refresh and self._background_refresher is None:
+            self._start_background_refresh()
+        return self._token_used(container, cached)
+
+    def _refresh(self, force: bool = False, scheduled_at: Optional[float] = None):
+        """Refreshes the token unless another thread is already doing so.
+
+        While another thread is refreshing, the caller either returns right away
+        when the current access token is still valid or waits for the refresh to
+        finish. Forced refresh occurs even when the token does not require it yet,
+        unless another refresh is in progress, in which case its end is awaited, or
+        the token was updated since scheduled_at. While the circuit breaker is open,
+        the token that is still valid is kept.
+        """
+        container = self._token_container
+        if self._refreshed_since(scheduled_at):
+            return
+        if not container.refresh_lock.acquire(blocking=False):
+            if not force and container.access_token_valid():
+                return
+            container.refresh_lock.acquire()
+            if force:
+                container.refresh_lock.release()
+                return
+
+        try:
+            if self._refreshed_since(scheduled_at):
+                return
+            with self._valid_token_kept(force):
+                if force or container.refresh_required():
+                    self._do_refresh(force=force)
+        finally:
+            container.refresh_lock.release()
+
+    def _revalidate(self):
+        """Starts the refresh in a separate thread unless any refresh is already in
+        progress.
+
+        A new short-lived daemon thread is started for each revalidation. Thanks to
+        the refresh lock and the backoff after the failure, that happens at most
+        once per token lifetime (or backoff period).
+        """
+        container = self._token_container
+        if not container.refresh_lock.acquire(blocking=False):
+            return
+
+        try:
+            threading.Thread(
+                target=self._revalidate_locked, name="h2o-authn-revalidate", daemon=True
+            ).start()
+        except BaseException:
+            container.refresh_lock.release()
+            raise
+
+    def _revalidate_locked(self):
+        container = self._token_container
+        try:
+            if container.revalidation_required():
+                self._do_refresh(force=True)
+        except Exception:
+            # Callers refresh the token themselves once the refresh becomes required.
+            container.revalidation_failed()
+        finally:
+            container.refresh_lock.release()
+
+    def _start_background_refresh(self):
+        with self._background_refresher_lock:
+            if self._background_refresher is None:
+                self._background_refresher = _refresher.ThreadRefresher(self)
+                self._background_refresher.start()
 
     def _ensure_token_endpoint_url(self):
-        if not self._token_endpoint_url:
-            with self._client() as client:
-                resp = self._fetch_discovery(client)
-            self._update_token_endpoint(resp)
+        if self._token_endpoint_url or self._cached_issuer_metadata():
+            return
 
-    def _do_refresh(self):
+        with self._observed("discovery"), self._client() as client:
+            metadata = self._issuer_metadata_cache.fetch(self._issuer_url, client)
+        self._update_issuer_metadata(metadata)
+
+    def _do_refresh(self, force: bool = False):
+        self._run(self._new_refresh_flow(force))
+
+    def _run(self, flow: _flow.Flow[None]):
+        """Runs the flow, holding the lock of the token store if it's set."""
+        if self._token_store is None:
+            _flow.run(flow, self._send)
+            return
+
+        with self._token_store.lock(self._token_store_key):
+            _flow.run(flow, self._send)
+
+    def _send(self, request: _flow.Request) -> "httpx.Response":
         with self._client() as client:
-            resp = self._fetch_token(client)
-        self._update_token(resp)
+            return _flow.send(client, request)
+
+    @contextlib.contextmanager
+    def _client(self) -> Iterator["httpx.Client"]:
+        if self._http_client is not None:
+            yield self._http_client
+            return
 
-    def _client(self) -> httpx.Client:
-        return httpx.Client(timeout=self._http_timeout, verify=self._verify)
+        if self._http_clients:
+            yield self._http_clients.sync_client()
+            return
+
+        with self._client_factory(_new_client)() as client:
+            yield client
 
     def as_async(self) -> "AsyncTokenProvider":
         """Returns new instance of the asynchronous variant of the token provider
@@ -209,28 +965,135 @@ class AsyncTokenProvider(_BaseTokenProvider):
     """Returns access token when called and makes sure that unexpired access token is
     available."""
 
+    _background_refresher: Optional[_refresher.TaskRefresher] = None
+
     async def __call__(self) -> str:
         return str(await self.token())
 
+    async def __aenter__(self) -> "AsyncTokenProvider":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        """Closes the HTTP connections kept open by the provider.
+
+        Only has an effect when the provider was created with http_keep_alive
+        enabled. The connection pool is shared with the clones of the provider, so
+        closing it affects them as well. New connections are opened when the
+        provider is used again. Stops the background refresh if it's running.
+        Client and transport passed to the provider are left open.
+        """
+        refresher, self._background_refresher = self._background_refresher, None
+        if refresher:
+            await refresher.stop()
+        if self._http_clients:
+            await self._http_clients.aclose()
+
     async def token(self) -> token.Token:
         await self._ensure_token_endpoint_url()
-        if self._token_container.refresh_required():
-            await self._do_refresh()
-        return self._token_container.access_token
+        container = self._token_container
+        cached = not container.refresh_required()
+        if not cached:
+            await self._refresh()
+        elif container.revalidation_required():
+            self._pending_refresh(force=True)
+        if self._background_refresh and not (
+            self._background_refresher and self._background_refresher.running()
+        ):
+            self._background_refresher = _refresher.TaskRefresher(self)
+            self._background_refresher.start()
+        return self._token_used(container, cached)
+
+    async def _refresh(self, force: bool = False, scheduled_at: Optional[float] = None):
+        """Refreshes the token or joins the refresh that is already in progress.
+
+        Only one refresh runs at a time and all of the concurrent callers share its
+        outcome, including the exception. Cancellation of a single caller does not
+        cancel the shared refresh. Forced refresh is skipped when the token was
+        updated since scheduled_at. While the circuit breaker is open, the token that
+        is still valid is kept.
+        """
+        if self._refreshed_since(scheduled_at):
+            return
+        with self._valid_token_kept(force):
+            await asyncio.shield(self._pending_refresh(force=force))
+
+    def _pending_refresh(self, force: bool = False) -> asyncio.Future:
+        """Returns the refresh in progress or starts a new one."""
+        container = self._token_container
+        pending = container.pending_refresh
+        if pending is None or pending.get_loop() is not asyncio.get_running_loop():
+            pending = asyncio.ensure_future(self._do_refresh(force=force))
+            pending.add_done_callback(self._refresh_done)
+            container.pending_refresh = pending
+        return pending
+
+    def _refresh_done(self, fut: asyncio.Future):
+        if self._token_container.pending_refresh is fut:
+            self._token_container.pending_refresh = None
+        # Retrieving the exception marks it as retrieved even when all the waiters
+        # are gone.
+        if not fut.cancelled() and fut.exception() is not None:
+            self._token_container.revalidation_failed()
 
     async def _ensure_token_endpoint_url(self):
-        if not self._token_endpoint_url:
+        if self._token_endpoint_url or self._cached_issuer_metadata():
+            return
+
+        with self._observed("discovery"):
             async with self._client() as client:
-                resp = await self._fetch_discovery(client)
-            self._update_token_endpoint(resp)
+                metadata = await self._issuer_metadata_cache.afetch(
+                    self._issuer_url, client
+                )
+        self._update_issuer_metadata(metadata)
+
+    async def _do_refresh(self, force: bool = False):
+        await self._run(self._new_refresh_flow(force))
+
+    async def _run(self, flow: _flow.Flow[None]):
+        """Runs the flow, holding the lock of the token store if it's set."""
+        if self._token_store is None:
+            await _flow.arun(flow, self._asend)
+            return
+
+        lock = await self._acquire_store_lock()
+        try:
+            await _flow.arun(flow, self._asend)
+        finally:
+            lock.release()
 
-    async def _do_refresh(self):
+    async def _acquire_store_lock(self) -> store.StoreLock:
+        """Returns the acquired lock of the token store.
+
+        Lock held by another process is polled, so that waiting for it does not
+        block the event loop.
+        """
+        assert self._token_store is not None
+        lock = self._token_store.lock(self._token_store_key)
+        delay = STORE_LOCK_POLL_INTERVAL
+        while not lock.acquire(blocking=False):
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_STORE_LOCK_POLL_INTERVAL)
+        return lock
+
+    async def _asend(self, request: _flow.Request) -> "httpx.Response":
         async with self._client() as client:
-            resp = await self._fetch_token(client)
-        self._update_token(resp)
+            return await _flow.asend(client, request)
+
+    @contextlib.asynccontextmanager
+    async def _client(self) -> AsyncIterator["httpx.AsyncClient"]:
+        if self._http_async_client is not None:
+            yield self._http_async_client
+            return
+
+        if self._http_clients:
+            yield self._http_clients.async_client()
+            return
 
-    def _client(self) -> httpx.AsyncClient:
-        return httpx.AsyncClient(timeout=self._http_timeout, verify=self._verify)
+        async with self._client_factory(_new_async_client)() as client:
+            yield client
 
     def as_sync(self) -> TokenProvider:
         """Returns new instance of the synchronous variant of the token provider
@@ -0,0 +1,314 @@
+"""Retries of the requests to the issuer and the circuit breaker protecting it.
+
+Both are applied by the transports wrapping the HTTP transport of the providers'
+clients, so they cover the token exchange as well as the issuer discovery.
+"""
+
+import asyncio
+import datetime
+import email.utils
+import random
+import threading
+import time
+from typing import Collection
+from typing import Optional
+from typing import Tuple
+from typing import Type
+
+import httpx
+
+from h2o_authn import _fork
+from h2o_authn import error
+
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_BASE_DELAY = datetime.timedelta(milliseconds=100)
+DEFAULT_MAX_DELAY = datetime.timedelta(seconds=10)
+DEFAULT_RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = datetime.timedelta(seconds=30)
+
+
+class RetryPolicy:
+    """Describes when and how soon the failed requests to the issuer are retried.
+
+    Requests failing with one of the retried exceptions (transport errors by default)
+    or statuses (429 and 5xx by default) are retried until max_attempts is reached.
+    Delays between the attempts follow the decorrelated jitter backoff. Retry-After
+    header of the response is honored instead. When it asks to wait longer than
+    max_delay, the response is returned without further attempts.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        base_delay: datetime.timedelta = DEFAULT_BASE_DELAY,
+        max_delay: datetime.timedelta = DEFAULT_MAX_DELAY,
+        statuses: Collection[int] = DEFAULT_RETRY_STATUSES,
+        exceptions: Tuple[Type[Exception], ...] = (httpx.TransportError,),
+    ) -> None:
+        """Returns a new instance of the retry policy.
+
+        Args:
+            max_attempts: Maximal number of attempts including the first one.
+            base_delay: Minimal delay between the attempts.
+            max_delay: Maximal delay between the attempts.
+            statuses: Response statuses that are retried.
+            exceptions: Exceptions raised by the transport that are retried.
+        """
+        if max_attempts < 1:
+            raise ValueError("'max_attempts' must be positive.")
+
+        self.max_attempts = max_attempts
+        self.statuses = frozenset(statuses)
+        self.exceptions = exceptions
+        self._base_delay = base_delay.total_seconds()
+        self._max_delay = max_delay.total_seconds()
+
+    def next_delay(
+        self, previous: Optional[float], resp: Optional[httpx.Response] = None
+    ) -> Optional[float]:
+        """Returns number of seconds to wait before the next attempt or None when
+        the request should not be retried anymore.
+
+        Args:
+            previous: Delay before the previous attempt. None after the first one.
+            resp: Response of the failed attempt if there was any.
+        """
+        retry_after = _retry_after(resp) if resp is not None else None
+        if retry_after is not None:
+            if retry_after > self._max_delay:
+                return None
+            return retry_after
+
+        upper = max((previous or self._base_delay) * 3, self._base_delay)
+        return min(self._max_delay, random.uniform(self._base_delay, upper))
+
+
+def _retry_after(resp: httpx.Response) -> Optional[float]:
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=datetime.timezone.utc)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return max((date - now).total_seconds(), 0.0)
+
+
+class CircuitBreaker:
+    """Stops sending requests to the issuer after repeated failures.
+
+    Circuit opens after failure_threshold consecutive failed requests (after all of
+    their retries). While it's open, requests fail right away with the
+    h2o_authn.error.CircuitOpenError. After the reset_timeout a single probe request
+    is let through. Circuit closes when the probe succeeds and opens again when it
+    fails. Breaker can be shared by many providers using the same issuer.
+    """
+
+    def __init__(
+        self,
+        *,
+        failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+        reset_timeout: datetime.timedelta = DEFAULT_RESET_TIMEOUT,
+    ) -> None:
+        """Returns a new instance of the circuit breaker.
+
+        Args:
+            failure_threshold: Number of consecutive failures that opens the circuit.
+            reset_timeout: How long the circuit stays open before the probe request.
+        """
+        if failure_threshold < 1:
+            raise ValueError("'failure_threshold' must be positive.")
+
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout.total_seconds()
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        _fork.register(self)
+
+    def _after_fork(self) -> None:
+        self._lock = threading.Lock()
+        # Probe request of the parent is never finished in the child.
+        self._probing = False
+
+    @property
+    def is_open(self) -> bool:
+        """Indicates whether the requests are currently rejected."""
+        with self._lock:
+            return self._opened_at is not None
+
+    def allow(self) -> bool:
+        """Returns True when the request may be sent."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._probing:
+                return False
+            if time.monotonic() - self._opened_at < self._reset_timeout:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def release_probe(self) -> None:
+        """Lets another request probe the issuer when the request finished without
+        the outcome (e.g. it was cancelled).
+        """
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self._failure_threshold:
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+
+class _Retrying:
+    def __init__(
+        self, policy: Optional[RetryPolicy], breaker: Optional[CircuitBreaker]
+    ) -> None:
+        self._policy = policy or RetryPolicy(max_attempts=1)
+        self._breaker = breaker
+
+    def _check_breaker(self):
+        if self._breaker is not None and not self._breaker.allow():
+            raise error.CircuitOpenError()
+
+    def _record(self, failed: bool):
+        if self._breaker is None:
+            return
+        if failed:
+            self._breaker.record_failure()
+        else:
+            self._breaker.record_success()
+
+    def _release(self):
+        # Outcome of the request was already recorded unless it was interrupted
+        # (e.g. cancelled), in which case the probe must not stay in progress.
+        if self._breaker is not None:
+            self._breaker.release_probe()
+
+    def _failed(self, resp: httpx.Response) -> bool:
+        return resp.status_code in self._policy.statuses
+
+
+class RetryTransport(_Retrying, httpx.BaseTransport):
+    """Transport applying the retry policy and circuit breaker to the requests sent
+    by the wrapped transport.
+    """
+
+    def __init__(
+        self,
+        transport: httpx.BaseTransport,
+        *,
+        policy: Optional[RetryPolicy] = None,
+        breaker: Optional[CircuitBreaker] = None,
+    ) -> None:
+        super().__init__(policy, breaker)
+        self._transport = transport
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        self._check_breaker()
+        try:
+            return self._handle_request(request)
+        except BaseException:
+            self._release()
+            raise
+
+    def _handle_request(self, request: httpx.Request) -> httpx.Response:
+        delay: Optional[float] = None
+        for attempt in range(1, self._policy.max_attempts + 1):
+            last = attempt == self._policy.max_attempts
+            try:
+                resp = self._transport.handle_request(request)
+            except Exception as e:
+                retried = isinstance(e, self._policy.exceptions)
+                delay = None if last or not retried else self._policy.next_delay(delay)
+                if delay is None:
+                    self._record(failed=True)
+                    raise
+                time.sleep(delay)
+                continue
+
+            if not self._failed(resp):
+                self._record(failed=False)
+                return resp
+            delay = None if last else self._policy.next_delay(delay, resp)
+            if delay is None:
+                self._record(failed=True)
+                return resp
+            resp.close()
+            time.sleep(delay)
+        raise AssertionError("unreachable")
+
+    def close(self) -> None:
+        self._transport.close()
+
+
+class AsyncRetryTransport(_Retrying, httpx.AsyncBaseTransport):
+    """Async variant of the RetryTransport."""
+
+    def __init__(
+        self,
+        transport: httpx.AsyncBaseTransport,
+        *,
+        policy: Optional[RetryPolicy] = None,
+        breaker: Optional[CircuitBreaker] = None,
+    ) -> None:
+        super().__init__(policy, breaker)
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self._check_breaker()
+        try:
+            return await self._handle_async_request(request)
+        except BaseException:
+            self._release()
+            raise
+
+    async def _handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        delay: Optional[float] = None
+        for attempt in range(1, self._policy.max_attempts + 1):
+            last = attempt == self._policy.max_attempts
+            try:
+                resp = await self._transport.handle_async_request(request)
+            except Exception as e:
+                retried = isinstance(e, self._policy.exceptions)
+                delay = None if last or not retried else self._policy.next_delay(delay)
+                if delay is None:
+                    self._record(failed=True)
+                    raise
+                await asyncio.sleep(delay)
+                continue
+
+            if not self._failed(resp):
+                self._record(failed=False)
+                return resp
+            delay = None if last else self._policy.next_delay(delay, resp)
+            if delay is None:
+                self._record(failed=True)
+                return resp
+            await resp.aclose()
+            await asyncio.sleep(delay)
+        raise AssertionError("unreachable")
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
@@ -0,0 +1,162 @@
+import abc
+import contextlib
+import json
+import os
+import tempfile
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Optional
+
+
+class StoreLock(abc.ABC):
+    """Exclusive lock held across all of the processes using the store.
+
+    Follows the interface of the threading.Lock and is not reentrant.
+    """
+
+    @abc.abstractmethod
+    def acquire(self, blocking: bool = True) -> bool:
+        """Acquires the lock. Returns False when the lock could not be acquired
+        without blocking and blocking is False.
+        """
+
+    @abc.abstractmethod
+    def release(self) -> None:
+        """Releases the lock."""
+
+    def __enter__(self) -> "StoreLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+
+class TokenStore(abc.ABC):
+    """Persistent storage of the token state that can be shared by multiple processes.
+
+    Token providers using the same store take its lock for the duration of the
+    refresh, reuse the token stored by the other processes when it's still fresh and
+    store the token they obtained, including the rotated refresh token.
+    """
+
+    @abc.abstractmethod
+    def lock(self, key: str) -> StoreLock:
+        """Returns new exclusive lock for the given key."""
+
+    @abc.abstractmethod
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        """Returns the state stored under the key or None when there's none or it
+        can't be read.
+        """
+
+    @abc.abstractmethod
+    def save(self, key: str, state: Dict[str, Any]) -> None:
+        """Stores the state under the key."""
+
+
+class FileStore(TokenStore):
+    """Stores the token state in the files within the given directory and uses
+    fcntl file locks to coordinate the processes.
+
+    Directory on a tmpfs file system (e.g. /dev/shm) keeps the state in the memory.
+    Available only on POSIX systems.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        *,
+        encrypt: Optional[Callable[[bytes], bytes]] = None,
+        decrypt: Optional[Callable[[bytes], bytes]] = None,
+    ) -> None:
+        """Returns a new instance of the file store.
+
+        Args:
+            directory: Directory where the files are kept. Created when it does not
+                exist.
+            encrypt: Optional function used to encrypt the state before it's
+                written to the file.
+            decrypt: Optional function used to decrypt the state read from the file.
+                Required when encrypt is set.
+        """
+        if bool(encrypt) != bool(decrypt):
+            raise ValueError("'encrypt' and 'decrypt' must be set together.")
+
+        self._directory = directory
+        self._encrypt = encrypt
+        self._decrypt = decrypt
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+
+    def lock(self, key: str) -> StoreLock:
+        return _FileLock(self._path(key, ".lock"))
+
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(key, ".json"), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+
+        try:
+            if self._decrypt:
+                data = self._decrypt(data)
+            state = json.loads(data)
+        except Exception:
+            # Corrupted state or state encrypted with the rotated key is treated as
+            # missing and overwritten by the next refresh.
+            return None
+
+        return state if isinstance(state, dict) else None
+
+    def save(self, key: str, state: Dict[str, Any]) -> None:
+        data = json.dumps(state).encode()
+        if self._encrypt:
+            data = self._encrypt(data)
+
+        # Written to the temporary file first so that the readers never see
+        # partially written state.
+        fd, tmp_path = tempfile.mkstemp(dir=self._directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key, ".json"))
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(tmp_path)
+            raise
+
+    def _path(self, key: str, suffix: str) -> str:
+        return os.path.join(self._directory, key + suffix)
+
+
+class _FileLock(StoreLock):
+    def __init__(self, path: str) -> None:
+        self._path = path
+        self._fd: Optional[int] = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        import fcntl
+
+        fd = os.open(self._path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(
+                fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+            )
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        except BaseException:
+            os.close(fd)
+            raise
+
+        self._fd = fd
+        return True
+
+    def release(self) -> None:
+        if self._fd is None:
+            raise RuntimeError("release unlocked lock")
+        fd, self._fd = self._fd, None
+        # Closing the file descriptor releases the lock.
+        os.close(fd)
@@ -1,18 +1,53 @@
-import collections
+import asyncio
 import datetime
+import threading
+import time
+from typing import Any
+from typing import Dict
 from typing import Optional
+from typing import Tuple
+
+from h2o_authn import jwt
 
 DEFAULT_EXPIRY_THRESHOLD = datetime.timedelta(seconds=5)
 DEFAULT_EXPIRES_IN_FALLBACK = datetime.timedelta(seconds=30)
 
+# How long after the failed revalidation no other revalidation is attempted.
+REVALIDATION_BACKOFF = datetime.timedelta(seconds=5)
+_REVALIDATION_BACKOFF = REVALIDATION_BACKOFF.total_seconds()
 
-class Token(collections.UserString):
-    def __init__(
-        self, value: str, exp: Optional[datetime.datetime], scope: Optional[str]
-    ) -> None:
-        super().__init__(value)
+
+class Token(str):
+    """Access token usable directly as str, with the additional attributes.
+
+    Being a str subclass, the token needs no conversion to be used as a string.
+    Plain str form of the value is kept as well, so str() of the token does not
+    copy it.
+    """
+
+    _value: str
+    _exp: Optional[datetime.datetime]
+    _scope: Optional[str]
+
+    def __new__(
+        cls, value: str, exp: Optional[datetime.datetime], scope: Optional[str]
+    ) -> "Token":
+        self = super().__new__(cls, value)
+        self._value = str.__str__(value)
         self._exp = exp
         self._scope = scope
+        return self
+
+    def __str__(self) -> str:
+        return self._value
+
+    def __reduce__(self):
+        return (Token, (self._value, self._exp, self._scope))
+
+    @property
+    def data(self) -> str:
+        """Value of the token as plain str."""
+        return self._value
 
     @property
     def exp(self) -> Optional[datetime.datetime]:
@@ -25,7 +60,96 @@ class Token(collections.UserString):
         return self._scope
 
 
+def _timestamp(value: Optional[datetime.datetime]) -> Optional[float]:
+    return value.timestamp() if value is not None else None
+
+
+def _datetime(value: Optional[float]) -> Optional[datetime.datetime]:
+    if value is None:
+        return None
+    return datetime.datetime.fromtimestamp(value, datetime.timezone.utc)
+
+
+def clock_offset(
+    server_date: Optional[float], requested_at: float, received_at: float
+) -> float:
+    """Returns the estimated offset of the issuer's clock from the local one.
+
+    Date header of the response was stamped by the issuer (truncated to whole
+    seconds) at some moment between the request was sent and the response was
+    received. Returns the offset closest to zero that is consistent with that, so
+    zero when the clocks may agree.
+    """
+    if server_date is None:
+        return 0.0
+    lower = server_date - received_at
+    upper = server_date + 1.0 - requested_at
+    if lower > 0:
+        return lower
+    if upper < 0:
+        return upper
+    return 0.0
+
+
+# Lifetime of the JWT access token which had expired when it was received.
+_EXPIRED_LIFETIME = 1e-6
+
+
+def _apply_jwt_claims(
+    access_token: str,
+    expires_in: Optional[float],
+    scope: Optional[str],
+    server_issued_at: float,
+) -> Tuple[Optional[float], Optional[str]]:
+    claims = jwt.claims(access_token)
+    if claims is None:
+        return expires_in, scope
+
+    lifetime = jwt.lifetime(claims)
+    exp = jwt.expires_at(claims)
+    if exp is not None:
+        # The exp compared with the issuer's clock as estimated also bounds the
+        # lifetime of the token issued some time ago (e.g. reused by the issuer).
+        remaining = exp - server_issued_at
+        lifetime = remaining if lifetime is None else min(lifetime, remaining)
+    if lifetime is not None:
+        # Token that has already expired is refreshed with the next request.
+        lifetime = max(lifetime, _EXPIRED_LIFETIME)
+        expires_in = min(expires_in, lifetime) if expires_in else lifetime
+    return expires_in, scope or jwt.scope(claims)
+
+
 class Container:
+    """Holds the tokens and decides when the access token should be refreshed.
+
+    Moments are kept as POSIX timestamps (floats) and the deadlines are precomputed
+    when the token is updated, so that the checks made on every token request only
+    compare them with time.time().
+    """
+
+    # Providers pooled by the thousands each hold a container, so it has no __dict__.
+    __slots__ = (
+        "_original_refresh_token",
+        "_refresh_token",
+        "_refresh_token_exp",
+        "_expiry_threshold",
+        "_expires_in_fallback",
+        "_minimal_expires_in",
+        "_stale_while_revalidate",
+        "_revalidation_failed_at",
+        "_parse_jwt",
+        "_clock_offset",
+        "_access_token",
+        "_access_token_exp",
+        "_access_token_iat",
+        "_refresh_at",
+        "_revalidate_at",
+        "_valid_until",
+        "refresh_lock",
+        "pending_refresh",
+        "__weakref__",
+    )
+
     def __init__(
         self,
         refresh_token: str,
@@ -33,26 +157,68 @@ class Container:
         expiry_threshold: datetime.timedelta = DEFAULT_EXPIRY_THRESHOLD,
         expires_in_fallback: datetime.timedelta = DEFAULT_EXPIRES_IN_FALLBACK,
         minimal_expires_in: Optional[datetime.timedelta] = None,
+        stale_while_revalidate: Optional[datetime.timedelta] = None,
+        parse_jwt: bool = False,
     ) -> None:
         self._original_refresh_token = refresh_token
         self._refresh_token = refresh_token
-        self._expiry_threshold = expiry_threshold
-        self._expires_in_fallback = expires_in_fallback
-        self._minimal_expires_in = minimal_expires_in
+        self._refresh_token_exp: Optional[float] = None
+        self._expiry_threshold = expiry_threshold.total_seconds()
+        self._expires_in_fallback = expires_in_fallback.total_seconds()
+        self._minimal_expires_in = (
+            minimal_expires_in.total_seconds() if minimal_expires_in else None
+        )
+        self._stale_while_revalidate = (
+            stale_while_revalidate.total_seconds() if stale_while_revalidate else None
+        )
+        self._revalidation_failed_at: Optional[float] = None
+        self._parse_jwt = parse_jwt
+        self._clock_offset = 0.0
 
         self._access_token: Optional[Token] = None
-        self._access_token_exp: Optional[datetime.datetime] = None
+        # Moment the token is considered to expire (possibly shortened by the
+        # minimal_expires_in) and the moment it was obtained.
+        self._access_token_exp: Optional[float] = None
+        self._access_token_iat: Optional[float] = None
+        # Precomputed deadlines derived from the above.
+        self._refresh_at: Optional[float] = None
+        self._revalidate_at: Optional[float] = None
+        self._valid_until: Optional[float] = None
+
+        # Held by the thread performing the refresh.
+        self.refresh_lock = threading.Lock()
+        # Refresh in progress shared by the async callers waiting for its outcome.
+        self.pending_refresh: Optional[asyncio.Future] = None
+
+    def _after_fork(self) -> None:
+        """Resets the refresh coordination inherited from the parent process. Called
+        by the owners of the container.
+        """
+        self.refresh_lock = threading.Lock()
+        self.pending_refresh = None
 
     @property
     def refresh_token(self) -> str:
         """Current refresh token."""
         return self._refresh_token
 
+    @property
+    def refresh_token_exp(self) -> Optional[datetime.datetime]:
+        """Indicates the moment when the current refresh token expires if known."""
+        return _datetime(self._refresh_token_exp)
+
     @property
     def original_refresh_token(self) -> str:
         """Original refresh token passed during the initialization."""
         return self._original_refresh_token
 
+    @property
+    def clock_offset(self) -> float:
+        """Offset in seconds of the issuer's clock from the local one as estimated
+        from the Date header of the last token response. Zero when unknown.
+        """
+        return self._clock_offset
+
     @property
     def access_token(self) -> Token:
         """Current access token."""
@@ -64,36 +230,169 @@ class Container:
         """Returns True when there's no access token set or the current one requires
         refresh.
         """
-        if self._access_token is None or self._access_token_exp is None:
-            return True
+        refresh_at = self._refresh_at
+        return refresh_at is None or refresh_at <= time.time()
+
+    def revalidation_required(self) -> bool:
+        """Returns True when the current access token should be refreshed in the
+        background while it's still being used.
+
+        That is when the token is within the stale_while_revalidate period before the
+        refresh becomes required and no revalidation failed within the last
+        REVALIDATION_BACKOFF. Always False when stale_while_revalidate is not set.
+        """
+        revalidate_at = self._revalidate_at
+        if revalidate_at is None:
+            return False
+
+        now = time.time()
+        failed_at = self._revalidation_failed_at
+        if failed_at is not None and now < failed_at + _REVALIDATION_BACKOFF:
+            return False
+        return revalidate_at <= now
+
+    def revalidation_failed(self) -> None:
+        """Records the failed revalidation, so that the next one is postponed."""
+        self._revalidation_failed_at = time.time()
+
+    def access_token_valid(self) -> bool:
+        """Returns True when there's an access token set and it has not expired yet.
+
+        Unlike refresh_required() this ignores the expiry threshold, so the token
+        may still be used while it's being refreshed.
+        """
+        valid_until = self._valid_until
+        return valid_until is not None and time.time() < valid_until
+
+    def expires_in(self) -> Optional[float]:
+        """Returns number of seconds until the current access token expires or None
+        when there's no access token set.
+        """
+        valid_until = self._valid_until
+        return valid_until - time.time() if valid_until is not None else None
+
+    def updated_since(self, moment: float) -> bool:
+        """Returns True when the access token was requested after the given moment
+        (POSIX timestamp), e.g. by another provider sharing the container.
+        """
+        return self._access_token_iat is not None and self._access_token_iat > moment
+
+    def refresh_after(self, ratio: float) -> datetime.timedelta:
+        """Returns how long from now it takes until the given fraction of the current
+        access token lifetime elapses.
+
+        Lifetime spans from the moment of the update until the moment the refresh
+        becomes required. Returns zero when there's no access token set.
+        """
+        if self._refresh_at is None or self._access_token_iat is None:
+            return datetime.timedelta(0)
 
-        now = datetime.datetime.now(datetime.timezone.utc)
-        return self._access_token_exp <= (now + self._expiry_threshold)
+        lifetime = max(self._refresh_at - self._access_token_iat, 0.0)
+        due = self._access_token_iat + lifetime * ratio
+        return datetime.timedelta(seconds=max(due - time.time(), 0.0))
 
     def update_token(
         self,
         access_token: str,
-        expires_in: Optional[int] = None,
+        expires_in: Optional[float] = None,
         refresh_token: Optional[str] = None,
         scope: Optional[str] = None,
+        refresh_expires_in: Optional[int] = None,
+        requested_at: Optional[float] = None,
+        server_date: Optional[float] = None,
     ):
         """Updates the token managed by the container from the fields expected in the
         token endpoint response.
+
+        Lifetimes are counted from requested_at (the moment the request was sent)
+        when given, so the time the request took is not added to them. server_date
+        (the Date header of the response) is used to estimate the clock offset of
+        the issuer.
+
+        When parse_jwt is enabled and the access token is a JWT, lifetime (exp - iat,
+        at most the time left until exp) and scope claims of the token are used when
+        the response does not contain them. Lifetime shorter than expires_in is
+        preferred as well.
         """
-        exp_delta = self._expires_in_fallback
-        now = datetime.datetime.now(datetime.timezone.utc)
+        received_at = time.time()
+        now = received_at if requested_at is None else min(requested_at, received_at)
+        self._clock_offset = clock_offset(server_date, now, received_at)
+        if self._parse_jwt:
+            expires_in, scope = _apply_jwt_claims(
+                access_token, expires_in, scope, now + self._clock_offset
+            )
 
-        token_exp: Optional[datetime.datetime] = None
+        token_exp: Optional[float] = None
+        exp = now + self._expires_in_fallback
         if expires_in:
-            exp_delta = datetime.timedelta(seconds=expires_in)
-            token_exp = now + exp_delta
+            token_exp = exp = now + expires_in
+        if self._minimal_expires_in:
+            exp = min(exp, now + self._minimal_expires_in)
 
-        exp = now + exp_delta
+        self.update_refresh_token(refresh_token, refresh_expires_in, requested_at)
+        self._revalidation_failed_at = None
+        self._set_access_token(
+            Token(access_token, exp=_datetime(token_exp), scope=scope), iat=now, exp=exp
+        )
 
+    def update_refresh_token(
+        self,
+        refresh_token: Optional[str] = None,
+        refresh_expires_in: Optional[int] = None,
+        requested_at: Optional[float] = None,
+    ):
+        """Updates the refresh token when the token endpoint response rotated it."""
         if refresh_token:
             self._refresh_token = refresh_token
+        if refresh_expires_in:
+            now = time.time()
+            if requested_at is not None:
+                now = min(requested_at, now)
+            self._refresh_token_exp = now + refresh_expires_in
 
-        self._access_token = Token(access_token, exp=token_exp, scope=scope)
+    def _set_access_token(self, access_token: Token, iat: float, exp: float):
+        # Token is published before its deadlines, so that the lock-free readers
+        # never see the new deadlines with the old token, only the other way round,
+        # which at worst makes them refresh needlessly.
+        self._access_token = access_token
+        self._access_token_iat = iat
         self._access_token_exp = exp
-        if self._minimal_expires_in:
-            self._access_token_exp = min(exp, now + self._minimal_expires_in)
+        self._refresh_at = exp - self._expiry_threshold
+        self._revalidate_at = None
+        if self._stale_while_revalidate:
+            self._revalidate_at = self._refresh_at - self._stale_while_revalidate
+        self._valid_until = exp
+        if access_token.exp is not None:
+            self._valid_until = access_token.exp.timestamp()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Returns JSON serializable state of the tokens managed by the container."""
+        access_token = self._access_token
+        return {
+            "refresh_token": self._refresh_token,
+            "refresh_token_exp": self._refresh_token_exp,
+            "access_token": access_token.data if access_token is not None else None,
+            "access_token_exp": _timestamp(access_token.exp if access_token else None),
+            "access_token_refresh_at": self._access_token_exp,
+            "access_token_updated_at": self._access_token_iat,
+            "scope": access_token.scope if access_token is not None else None,
+        }
+
+    def restore(self, state: Dict[str, Any]) -> None:
+        """Replaces the tokens managed by the container with the state returned by
+        the snapshot().
+        """
+        self._refresh_token = state["refresh_token"]
+        self._refresh_token_exp = state["refresh_token_exp"]
+        if state["access_token"] is None:
+            return
+
+        self._set_access_token(
+            Token(
+                state["access_token"],
+                exp=_datetime(state["access_token_exp"]),
+                scope=state["scope"],
+            ),
+            iat=float(state["access_token_updated_at"]),
+            exp=float(state["access_token_refresh_at"]),
+        )
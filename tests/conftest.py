@@ -0,0 +1,11 @@
+import pytest
+
+from h2o_authn import cache
+from h2o_authn import issuer
+
+
+@pytest.fixture(autouse=True)
+def clear_shared_caches():
+    yield
+    cache.shared_cache().clear()
+    issuer.shared_cache().clear()
@@ -0,0 +1,116 @@
+import asyncio
+
+import httpx
+import pytest
+import respx
+
+import h2o_authn
+from h2o_authn import auth
+
+TEST_CLIENT_ID = "test-client-id"
+TOKEN_ENDPOINT_URL = "http://example.com/token"
+API_URL = "http://api.example.com/resource"
+
+
+def token_responses(count: int):
+    return [
+        httpx.Response(200, json={"access_token": f"access_token_{n}"})
+        for n in range(count)
+    ]
+
+
+def create_provider(provider_cls=h2o_authn.TokenProvider):
+    return provider_cls(
+        refresh_token="input_refresh_token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+    )
+
+
+def authorized_only(token: str):
+    def side_effect(request):
+        if request.headers["Authorization"] != f"Bearer {token}":
+            return httpx.Response(401)
+        return httpx.Response(200)
+
+    return side_effect
+
+
+@respx.mock
+def test_sync_auth_sets_bearer_token():
+    # Given
+    token_route = respx.post(TOKEN_ENDPOINT_URL).mock(side_effect=token_responses(1))
+    api_route = respx.get(API_URL).respond(200)
+    client = httpx.Client(auth=auth.TokenAuth(create_provider()))
+
+    # When
+    for _ in range(3):
+        client.get(API_URL)
+
+    # Then
+    assert token_route.call_count == 1
+    assert api_route.call_count == 3
+    for call in api_route.calls:
+        assert call.request.headers["Authorization"] == "Bearer access_token_0"
+
+
+@respx.mock
+def test_sync_auth_refreshes_once_on_401():
+    # Given
+    token_route = respx.post(TOKEN_ENDPOINT_URL).mock(side_effect=token_responses(2))
+    api_route = respx.get(API_URL).mock(side_effect=authorized_only("access_token_1"))
+    provider = create_provider()
+    client = httpx.Client(auth=auth.TokenAuth(provider))
+
+    # When
+    first = client.get(API_URL)
+    second = client.get(API_URL)
+
+    # Then
+    assert (first.status_code, second.status_code) == (200, 200)
+    assert token_route.call_count == 2
+    assert api_route.call_count == 3
+
+
+@respx.mock
+def test_sync_auth_retries_only_once():
+    # Given
+    token_route = respx.post(TOKEN_ENDPOINT_URL).mock(side_effect=token_responses(2))
+    api_route = respx.get(API_URL).respond(401)
+    client = httpx.Client(auth=auth.TokenAuth(create_provider()))
+
+    # When
+    resp = client.get(API_URL)
+
+    # Then
+    assert resp.status_code == 401
+    assert token_route.call_count == 2
+    assert api_route.call_count == 2
+
+
+@respx.mock
+@pytest.mark.asyncio
+async def test_async_auth_concurrent_401_single_refresh():
+    # Given
+    token_route = respx.post(TOKEN_ENDPOINT_URL).mock(side_effect=token_responses(2))
+    provider = create_provider(h2o_authn.AsyncTokenProvider)
+    _ = await provider()
+    api_route = respx.get(API_URL).mock(side_effect=authorized_only("access_token_1"))
+    client = httpx.AsyncClient(auth=auth.AsyncTokenAuth(provider))
+
+    # When
+    responses = await asyncio.gather(*(client.get(API_URL) for _ in range(16)))
+
+    # Then
+    assert [r.status_code for r in responses] == [200] * 16
+    assert token_route.call_count == 2
+    assert api_route.call_count == 32
+
+
+def test_sync_auth_rejects_async_client():
+    # Given
+    client = httpx.AsyncClient(auth=auth.TokenAuth(create_provider()))
+
+    # When
+    with pytest.raises(RuntimeError):
+        asyncio.run(client.get(API_URL))
@@ -0,0 +1,125 @@
+import asyncio
+import urllib.parse
+
+import httpx
+import pytest
+import respx
+
+from h2o_authn import bulk
+from h2o_authn import error
+from h2o_authn import issuer
+
+TEST_CLIENT_ID = "test-client-id"
+ISSUER_URL = "http://example.com/"
+ISSUER_DISCOVERY_URL = "http://example.com/.well-known/openid-configuration"
+TOKEN_ENDPOINT_URL = "http://example.com/token"
+
+
+def refresh_token_of(request: httpx.Request) -> str:
+    return urllib.parse.parse_qs(request.content.decode())["refresh_token"][0]
+
+
+def token_response(request: httpx.Request) -> httpx.Response:
+    refresh_token = refresh_token_of(request)
+    if refresh_token == "revoked":
+        return httpx.Response(400, json={"error": "invalid_grant"})
+    return httpx.Response(
+        200,
+        json={
+            "access_token": f"access-{refresh_token}",
+            "refresh_token": f"rotated-{refresh_token}",
+            "expires_in": 3600,
+        },
+    )
+
+
+async def collect(*args, **kwargs):
+    return [result async for result in bulk.exchange_many(*args, **kwargs)]
+
+
+@respx.mock
+@pytest.mark.asyncio
+async def test_exchange_many():
+    # Given
+    discovery = respx.get(ISSUER_DISCOVERY_URL).respond(
+        json={"token_endpoint": TOKEN_ENDPOINT_URL}
+    )
+    respx.post(TOKEN_ENDPOINT_URL).mock(side_effect=token_response)
+
+    # When
+    results = await collect(
+        ["rt-0", "revoked", "rt-2"],
+        client_id=TEST_CLIENT_ID,
+        issuer_url=ISSUER_URL,
+        issuer_metadata_cache=issuer.MetadataCache(),
+    )
+
+    # Then
+    assert discovery.call_count == 1
+    by_position = {result.position: result for result in results}
+    assert set(by_position) == {0, 1, 2}
+    assert by_position[0].refresh_token == "rt-0"
+    assert by_position[0].access_token == "access-rt-0"
+    assert by_position[0].next_refresh_token == "rotated-rt-0"
+    assert by_position[0].error is None
+    assert by_position[1].access_token is None
+    assert isinstance(by_position[1].error, error.TokenEndpointError)
+    assert by_position[1].error.error == "invalid_grant"
+    assert by_position[2].access_token == "access-rt-2"
+
+
+@respx.mock
+@pytest.mark.asyncio
+async def test_exchange_many_concurrency_bounded():
+    # Given
+    in_progress, max_in_progress = 0, 0
+
+    async def slow_token_response(request):
+        nonlocal in_progress, max_in_progress
+        in_progress += 1
+        max_in_progress = max(max_in_progress, in_progress)
+        await asyncio.sleep(0.01)
+        in_progress -= 1
+        return token_response(request)
+
+    respx.post(TOKEN_ENDPOINT_URL).mock(side_effect=slow_token_response)
+
+    # When
+    results = await collect(
+        (f"rt-{i}" for i in range(20)),
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+        concurrency=4,
+    )
+
+    # Then
+    assert len(results) == 20
+    assert all(result.error is None for result in results)
+    assert max_in_progress == 4
+
+
+@respx.mock
+@pytest.mark.asyncio
+async def test_exchange_many_discovery_failure_raised():
+    # Given
+    respx.get(ISSUER_DISCOVERY_URL).respond(500)
+
+    # When
+    with pytest.raises(httpx.HTTPStatusError):
+        await collect(
+            ["rt-0"],
+            client_id=TEST_CLIENT_ID,
+            issuer_url=ISSUER_URL,
+            issuer_metadata_cache=issuer.MetadataCache(),
+        )
+
+
+@pytest.mark.asyncio
+async def test_exchange_many_empty():
+    # When
+    results = await collect(
+        [], client_id=TEST_CLIENT_ID, token_endpoint_url=TOKEN_ENDPOINT_URL
+    )
+
+    # Then
+    assert results == []
@@ -0,0 +1,188 @@
+import datetime
+
+import pytest
+import respx
+import time_machine
+
+import h2o_authn
+from h2o_authn import cache
+from h2o_authn import issuer
+from h2o_authn import token
+
+TEST_CLIENT_ID = "test-client-id"
+TOKEN_ENDPOINT_URL = "http://example.com/token"
+
+
+def test_container_reused():
+    # Given
+    token_cache = cache.TokenCache()
+    first = token_cache.container("key", lambda: token.Container("refresh-token"))
+
+    # When
+    second = token_cache.container("key", lambda: token.Container("refresh-token"))
+
+    # Then
+    assert first is second
+
+
+def test_least_recently_used_container_evicted():
+    # Given
+    token_cache = cache.TokenCache(max_size=2)
+    first = token_cache.container("first", lambda: token.Container("first"))
+    _ = token_cache.container("second", lambda: token.Container("second"))
+    _ = token_cache.container("first", lambda: token.Container("first"))
+
+    # When
+    _ = token_cache.container("third", lambda: token.Container("third"))
+
+    # Then
+    assert len(token_cache) == 2
+    assert token_cache.container("first", lambda: token.Container("first")) is first
+
+
+def test_idle_container_evicted():
+    # Given
+    token_cache = cache.TokenCache(ttl=datetime.timedelta(minutes=10))
+
+    with time_machine.travel(0, tick=False) as traveler:
+        first = token_cache.container("key", lambda: token.Container("refresh-token"))
+        traveler.shift(datetime.timedelta(minutes=10))
+
+        # When
+        second = token_cache.container("key", lambda: token.Container("refresh-token"))
+
+    # Then
+    assert first is not second
+
+
+def test_container_with_expired_refresh_token_evicted():
+    # Given
+    token_cache = cache.TokenCache(ttl=None)
+
+    with time_machine.travel(0, tick=False) as traveler:
+        first = token_cache.container("key", lambda: token.Container("refresh-token"))
+        first.update_token("access-token", refresh_expires_in=60)
+        traveler.shift(datetime.timedelta(seconds=60))
+
+        # When
+        second = token_cache.container("key", lambda: token.Container("refresh-token"))
+
+    # Then
+    assert first is not second
+
+
+def test_max_size_validated():
+    # When
+    with pytest.raises(ValueError):
+        _ = cache.TokenCache(max_size=0)
+
+
+@respx.mock
+def test_equivalent_providers_share_token():
+    # Given
+    route = respx.post(TOKEN_ENDPOINT_URL).respond(
+        json={"access_token": "new_access_token", "expires_in": 3600}
+    )
+    token_cache = cache.TokenCache()
+    _ = h2o_authn.TokenProvider(
+        refresh_token="input_refresh_token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+        token_cache=token_cache,
+    )()
+
+    # When
+    result = h2o_authn.TokenProvider(
+        refresh_token="input_refresh_token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+        token_cache=token_cache,
+    )()
+
+    # Then
+    assert route.call_count == 1
+    assert result == "new_access_token"
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        pytest.param({"refresh_token": "other_refresh_token"}, id="refresh token"),
+        pytest.param({"client_id": "other-client-id"}, id="client id"),
+        pytest.param({"client_secret": "other-client-secret"}, id="client secret"),
+        pytest.param({"scope": "other scope"}, id="scope"),
+        pytest.param({"token_endpoint_url": "http://other.com/token"}, id="endpoint"),
+    ],
+)
+def test_different_providers_do_not_share_container(kwargs):
+    # Given
+    token_cache = cache.TokenCache()
+    provider_kwargs = {
+        "refresh_token": "input_refresh_token",
+        "client_id": TEST_CLIENT_ID,
+        "token_endpoint_url": TOKEN_ENDPOINT_URL,
+        "token_cache": token_cache,
+    }
+    first = h2o_authn.TokenProvider(**provider_kwargs)
+
+    # When
+    second = h2o_authn.TokenProvider(**{**provider_kwargs, **kwargs})
+
+    # Then
+    assert first._token_container is not second._token_container
+
+
+def test_shared_cache_is_singleton():
+    # Then
+    assert cache.shared_cache() is cache.shared_cache()
+
+
+@respx.mock
+def test_equivalent_providers_share_discovered_issuer_metadata():
+    # Given
+    discovery_route = respx.get(
+        "http://example.com/.well-known/openid-configuration"
+    ).respond(json={"token_endpoint": TOKEN_ENDPOINT_URL})
+    token_route = respx.post(TOKEN_ENDPOINT_URL).respond(
+        json={"access_token": "new_access_token", "expires_in": 3600}
+    )
+    token_cache = cache.TokenCache()
+    metadata_cache = issuer.MetadataCache()
+    providers = [
+        h2o_authn.TokenProvider(
+            refresh_token="input_refresh_token",
+            client_id=TEST_CLIENT_ID,
+            issuer_url="http://example.com",
+            token_cache=token_cache,
+            issuer_metadata_cache=metadata_cache,
+        )
+        for _ in range(5)
+    ]
+
+    # When
+    tokens = [provider() for provider in providers]
+
+    # Then
+    assert discovery_route.call_count == 1
+    assert token_route.call_count == 1
+    assert tokens == ["new_access_token"] * 5
+    for provider in providers:
+        assert provider.issuer_metadata is not None
+        assert provider.issuer_metadata.token_endpoint == TOKEN_ENDPOINT_URL
+
+
+def test_sync_and_async_providers_do_not_share_container():
+    # Given
+    provider = h2o_authn.TokenProvider(
+        refresh_token="input_refresh_token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+        token_cache=cache.TokenCache(),
+    )
+
+    # When
+    async_provider = provider.as_async()
+
+    # Then
+    assert async_provider._token_container is not provider._token_container
+    assert async_provider.as_sync()._token_container is provider._token_container
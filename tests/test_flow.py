@@ -0,0 +1,78 @@
+import httpx
+import pytest
+
+import h2o_authn
+from h2o_authn import _flow
+
+TEST_CLIENT_ID = "test-client-id"
+TOKEN_ENDPOINT_URL = "http://example.com/token"
+
+
+def new_provider() -> h2o_authn.TokenProvider:
+    return h2o_authn.TokenProvider(
+        refresh_token="refresh-token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+    )
+
+
+def test_refresh_flow_without_io():
+    # Given
+    provider = new_provider()
+    flow = provider._refresh_flow(forced_at=None)
+
+    # When
+    request = next(flow)
+    with pytest.raises(StopIteration):
+        flow.send(
+            httpx.Response(
+                200,
+                json={"access_token": "new-access-token", "refresh_token": "rotated"},
+                request=httpx.Request(request.method, request.url),
+            )
+        )
+
+    # Then
+    assert request == _flow.Request(
+        "POST",
+        TOKEN_ENDPOINT_URL,
+        content=(
+            b"grant_type=refresh_token&client_id=test-client-id"
+            b"&refresh_token=refresh-token"
+        ),
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+    )
+    assert provider._token_container.access_token == "new-access-token"
+    assert provider._token_container.refresh_token == "rotated"
+
+
+def test_run_throws_send_error_into_flow():
+    # Given
+    provider = new_provider()
+
+    def send(request: _flow.Request) -> httpx.Response:
+        raise httpx.ConnectError("failed", request=httpx.Request("POST", request.url))
+
+    # When
+    with pytest.raises(httpx.ConnectError):
+        _flow.run(provider._refresh_flow(forced_at=None), send)
+
+    # Then
+    assert provider._token_container.refresh_required()
+
+
+@pytest.mark.asyncio
+async def test_arun_returns_flow_value():
+    # Given
+    def flow():
+        resp = yield _flow.Request("GET", "http://example.com")
+        return resp.status_code
+
+    async def send(request: _flow.Request) -> httpx.Response:
+        return httpx.Response(204)
+
+    # When
+    result = await _flow.arun(flow(), send)
+
+    # Then
+    assert result == 204
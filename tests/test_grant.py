@@ -0,0 +1,257 @@
+import datetime
+import urllib.parse
+
+from cryptography.hazmat.primitives.asymmetric import ec
+import httpx
+import jwt
+import pytest
+import respx
+import time_machine
+
+import h2o_authn
+from h2o_authn import cache
+from h2o_authn import grant
+
+TEST_CLIENT_ID = "test-client-id"
+TEST_CLIENT_SECRET = "test-client-secret"
+TOKEN_ENDPOINT_URL = "http://example.com/token"
+
+
+def form(request: httpx.Request) -> dict:
+    return dict(urllib.parse.parse_qsl(request.content.decode()))
+
+
+@respx.mock
+def test_client_credentials():
+    # Given
+    route = respx.post(
+        TOKEN_ENDPOINT_URL,
+        data={
+            "grant_type": "client_credentials",
+            "client_id": TEST_CLIENT_ID,
+            "client_secret": TEST_CLIENT_SECRET,
+            "scope": "input scope",
+        },
+    ).respond(json={"access_token": "new_access_token", "expires_in": 3600})
+    provider = h2o_authn.TokenProvider(
+        client_id=TEST_CLIENT_ID,
+        client_secret=TEST_CLIENT_SECRET,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+        scope="input scope",
+        grant=grant.ClientCredentials(),
+    )
+
+    # When
+    first = provider()
+    second = provider()
+
+    # Then
+    assert first == second == "new_access_token"
+    assert route.call_count == 1
+
+
+@respx.mock
+@pytest.mark.asyncio
+async def test_client_credentials_async():
+    # Given
+    route = respx.post(TOKEN_ENDPOINT_URL).respond(
+        json={"access_token": "new_access_token", "expires_in": 3600}
+    )
+    provider = h2o_authn.AsyncTokenProvider(
+        client_id=TEST_CLIENT_ID,
+        client_secret=TEST_CLIENT_SECRET,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+        grant=grant.ClientCredentials(),
+    )
+
+    # When
+    result = await provider()
+
+    # Then
+    assert result == "new_access_token"
+    assert form(route.calls.last.request)["grant_type"] == "client_credentials"
+
+
+@respx.mock
+def test_token_exchange_uses_current_subject_token():
+    # Given
+    route = respx.post(TOKEN_ENDPOINT_URL).respond(
+        json={"access_token": "exchanged_access_token", "expires_in": 60}
+    )
+    subject_tokens = iter(["subject-token-1", "subject-token-2"])
+    provider = h2o_authn.TokenProvider(
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+        grant=grant.TokenExchange(
+            lambda: next(subject_tokens), audience="other-service"
+        ),
+    )
+
+    # When
+    with time_machine.travel(0, tick=False) as traveler:
+        provider()
+        traveler.shift(datetime.timedelta(seconds=60))
+        provider()
+
+    # Then
+    first, second = (form(call.request) for call in route.calls)
+    assert first == {
+        "grant_type": grant.TOKEN_EXCHANGE_GRANT_TYPE,
+        "client_id": TEST_CLIENT_ID,
+        "subject_token": "subject-token-1",
+        "subject_token_type": grant.ACCESS_TOKEN_TYPE,
+        "audience": "other-service",
+    }
+    assert second["subject_token"] == "subject-token-2"
+
+
+def test_token_exchange_actor_token_type_required():
+    with pytest.raises(ValueError):
+        grant.TokenExchange("subject-token", actor_token="actor-token")
+
+
+def test_refresh_token_or_grant_required():
+    with pytest.raises(ValueError):
+        h2o_authn.TokenProvider(
+            client_id=TEST_CLIENT_ID, token_endpoint_url=TOKEN_ENDPOINT_URL
+        )
+    with pytest.raises(ValueError):
+        h2o_authn.TokenProvider(
+            refresh_token="refresh-token",
+            client_id=TEST_CLIENT_ID,
+            token_endpoint_url=TOKEN_ENDPOINT_URL,
+            grant=grant.ClientCredentials(),
+        )
+
+
+@respx.mock
+def test_grant_tokens_not_shared_with_refresh_token_tokens():
+    # Given
+    route = respx.post(TOKEN_ENDPOINT_URL).respond(
+        json={"access_token": "new_access_token", "expires_in": 3600}
+    )
+    token_cache = cache.TokenCache()
+    client_credentials = h2o_authn.TokenProvider(
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+        grant=grant.ClientCredentials(),
+        token_cache=token_cache,
+    )
+    same = h2o_authn.TokenProvider(
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+        grant=grant.ClientCredentials(),
+        token_cache=token_cache,
+    )
+    refresh = h2o_authn.TokenProvider(
+        refresh_token="refresh-token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+        token_cache=token_cache,
+    )
+
+    # When
+    client_credentials()
+    same()
+    refresh()
+
+    # Then
+    assert route.call_count == 2
+
+
+@respx.mock
+def test_private_key_jwt():
+    # Given
+    route = respx.post(TOKEN_ENDPOINT_URL).respond(
+        json={"access_token": "new_access_token", "expires_in": 3600}
+    )
+    private_key = ec.generate_private_key(ec.SECP256R1())
+    provider = h2o_authn.TokenProvider(
+        client_id=TEST_CLIENT_ID,
+        client_secret=TEST_CLIENT_SECRET,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+        grant=grant.ClientCredentials(),
+        client_assertion=grant.PrivateKeyJWT(
+            private_key, algorithm="ES256", key_id="key-1"
+        ),
+    )
+
+    # When
+    provider()
+
+    # Then
+    data = form(route.calls.last.request)
+    assert "client_secret" not in data
+    assert data["client_assertion_type"] == grant.JWT_BEARER_ASSERTION_TYPE
+    assertion = data["client_assertion"]
+    assert jwt.get_unverified_header(assertion)["kid"] == "key-1"
+    claims = jwt.decode(
+        assertion,
+        private_key.public_key(),
+        algorithms=["ES256"],
+        audience=TOKEN_ENDPOINT_URL,
+    )
+    assert claims["iss"] == claims["sub"] == TEST_CLIENT_ID
+    assert claims["exp"] - claims["iat"] == 60
+    assert claims["jti"]
+
+
+def test_private_key_jwt_and_client_secret_basic_exclusive():
+    with pytest.raises(ValueError):
+        h2o_authn.TokenProvider(
+            client_id=TEST_CLIENT_ID,
+            token_endpoint_url=TOKEN_ENDPOINT_URL,
+            client_secret="client-secret",
+            grant=grant.ClientCredentials(),
+            client_assertion=grant.PrivateKeyJWT("key"),
+            client_secret_basic=True,
+        )
+
+
+@respx.mock
+def test_token_exchange_with_subject_function_not_shared():
+    # Given
+    respx.post(TOKEN_ENDPOINT_URL).mock(
+        side_effect=lambda request: httpx.Response(
+            200,
+            json={
+                "access_token": "exchanged-for-" + form(request)["subject_token"],
+                "expires_in": 3600,
+            },
+        )
+    )
+    token_cache = cache.TokenCache()
+
+    def new_provider(user_token: str) -> h2o_authn.TokenProvider:
+        return h2o_authn.TokenProvider(
+            client_id=TEST_CLIENT_ID,
+            token_endpoint_url=TOKEN_ENDPOINT_URL,
+            grant=grant.TokenExchange(lambda: user_token),
+            token_cache=token_cache,
+        )
+
+    # When
+    alice = new_provider("alice-token")()
+    bob = new_provider("bob-token")()
+
+    # Then
+    assert alice == "exchanged-for-alice-token"
+    assert bob == "exchanged-for-bob-token"
+
+
+def test_token_exchange_async_subject_rejected():
+    # Given
+    async_provider = h2o_authn.AsyncTokenProvider(
+        refresh_token="refresh-token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+    )
+
+    async def subject_token() -> str:
+        return "subject-token"
+
+    # When / Then
+    with pytest.raises(TypeError):
+        grant.TokenExchange(async_provider)
+    with pytest.raises(TypeError):
+        grant.TokenExchange(subject_token)
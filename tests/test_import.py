@@ -0,0 +1,65 @@
+import subprocess
+import sys
+import textwrap
+
+import h2o_authn
+
+
+def run_isolated(code: str) -> str:
+    result = subprocess.run(
+        [sys.executable, "-c", textwrap.dedent(code)],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return result.stdout.strip()
+
+
+def test_import_does_not_import_httpx():
+    # When
+    modules = run_isolated(
+        """
+        import sys
+        import h2o_authn
+        print(",".join(m for m in ("httpx", "asyncio") if m in sys.modules))
+        """
+    )
+
+    # Then
+    assert modules == ""
+
+
+def test_provider_creation_does_not_import_httpx():
+    # When
+    modules = run_isolated(
+        """
+        import sys
+        import h2o_authn
+        h2o_authn.TokenProvider(
+            refresh_token="refresh-token",
+            client_id="client-id",
+            token_endpoint_url="http://example.com/token",
+        )
+        print(",".join(m for m in ("httpx", "httpcore") if m in sys.modules))
+        """
+    )
+
+    # Then
+    assert modules == ""
+
+
+def test_lazy_attributes():
+    # Then
+    assert h2o_authn.TokenProvider is h2o_authn.provider.TokenProvider
+    assert h2o_authn.AsyncTokenProvider is h2o_authn.provider.AsyncTokenProvider
+    assert h2o_authn.cache.shared_cache() is not None
+    assert "TokenProvider" in dir(h2o_authn)
+
+
+def test_default_ssl_context_shared():
+    # When
+    first = h2o_authn.provider.default_ssl_context()
+    second = h2o_authn.provider.default_ssl_context()
+
+    # Then
+    assert first is second
@@ -0,0 +1,206 @@
+import asyncio
+import datetime
+
+import httpx
+import pytest
+import respx
+import time_machine
+
+import h2o_authn
+from h2o_authn import issuer
+
+TEST_CLIENT_ID = "test-client-id"
+ISSUER_URL = "http://example.com/"
+ISSUER_DISCOVERY_URL = "http://example.com/.well-known/openid-configuration"
+TOKEN_ENDPOINT_URL = "http://example.com/token"
+
+DOCUMENT = {
+    "issuer": "http://example.com",
+    "token_endpoint": TOKEN_ENDPOINT_URL,
+    "revocation_endpoint": "http://example.com/revoke",
+    "introspection_endpoint": "http://example.com/introspect",
+    "jwks_uri": "http://example.com/certs",
+}
+
+
+def fetch(metadata_cache: issuer.MetadataCache) -> issuer.Metadata:
+    with httpx.Client() as client:
+        return metadata_cache.fetch(ISSUER_URL, client)
+
+
+@respx.mock
+def test_metadata_parsed():
+    # Given
+    respx.get(ISSUER_DISCOVERY_URL).respond(json=DOCUMENT)
+
+    # When
+    metadata = fetch(issuer.MetadataCache())
+
+    # Then
+    assert metadata.issuer == "http://example.com"
+    assert metadata.token_endpoint == TOKEN_ENDPOINT_URL
+    assert metadata.revocation_endpoint == "http://example.com/revoke"
+    assert metadata.introspection_endpoint == "http://example.com/introspect"
+    assert metadata.jwks_uri == "http://example.com/certs"
+    assert dict(metadata) == DOCUMENT
+
+
+@respx.mock
+def test_metadata_cached_for_max_age():
+    # Given
+    route = respx.get(ISSUER_DISCOVERY_URL).respond(
+        json=DOCUMENT, headers={"Cache-Control": "public, max-age=60"}
+    )
+    metadata_cache = issuer.MetadataCache()
+
+    with time_machine.travel(0, tick=False) as traveler:
+        # When
+        _ = fetch(metadata_cache)
+        traveler.shift(datetime.timedelta(seconds=59))
+        _ = fetch(metadata_cache)
+        calls_within_max_age = route.call_count
+        traveler.shift(datetime.timedelta(seconds=1))
+        _ = fetch(metadata_cache)
+
+    # Then
+    assert calls_within_max_age == 1
+    assert route.call_count == 2
+
+
+@respx.mock
+def test_metadata_cached_for_default_ttl():
+    # Given
+    route = respx.get(ISSUER_DISCOVERY_URL).respond(json=DOCUMENT)
+    metadata_cache = issuer.MetadataCache(default_ttl=datetime.timedelta(minutes=1))
+
+    with time_machine.travel(0, tick=False) as traveler:
+        # When
+        _ = fetch(metadata_cache)
+        _ = fetch(metadata_cache)
+        calls_within_ttl = route.call_count
+        traveler.shift(datetime.timedelta(minutes=1))
+        _ = fetch(metadata_cache)
+
+    # Then
+    assert calls_within_ttl == 1
+    assert route.call_count == 2
+
+
+@respx.mock
+def test_metadata_not_cached_with_no_store():
+    # Given
+    route = respx.get(ISSUER_DISCOVERY_URL).respond(
+        json=DOCUMENT, headers={"Cache-Control": "no-store"}
+    )
+    metadata_cache = issuer.MetadataCache()
+
+    # When
+    _ = fetch(metadata_cache)
+    _ = fetch(metadata_cache)
+
+    # Then
+    assert route.call_count == 2
+    assert metadata_cache.get(ISSUER_URL) is None
+
+
+@respx.mock
+def test_metadata_revalidated_with_etag():
+    # Given
+    route = respx.get(ISSUER_DISCOVERY_URL)
+    route.side_effect = [
+        httpx.Response(
+            200, json=DOCUMENT, headers={"Cache-Control": "no-cache", "ETag": '"v1"'}
+        ),
+        httpx.Response(304, headers={"Cache-Control": "max-age=60"}),
+    ]
+    metadata_cache = issuer.MetadataCache()
+    first = fetch(metadata_cache)
+
+    # When
+    second = fetch(metadata_cache)
+
+    # Then
+    assert route.call_count == 2
+    assert route.calls.last.request.headers["If-None-Match"] == '"v1"'
+    assert second is first
+    assert metadata_cache.get(ISSUER_URL) is first
+
+
+@respx.mock
+@pytest.mark.asyncio
+async def test_concurrent_async_lookups_deduplicated():
+    # Given
+    async def side_effect(request):
+        await asyncio.sleep(0.01)
+        return httpx.Response(200, json=DOCUMENT)
+
+    route = respx.get(ISSUER_DISCOVERY_URL).mock(side_effect=side_effect)
+    metadata_cache = issuer.MetadataCache()
+
+    # When
+    async with httpx.AsyncClient() as client:
+        results = await asyncio.gather(
+            *(metadata_cache.afetch(ISSUER_URL, client) for _ in range(32))
+        )
+
+    # Then
+    assert route.call_count == 1
+    assert all(r is results[0] for r in results)
+
+
+@respx.mock
+def test_providers_share_discovery():
+    # Given
+    discovery_route = respx.get(ISSUER_DISCOVERY_URL).respond(json=DOCUMENT)
+    respx.post(TOKEN_ENDPOINT_URL).respond(json={"access_token": "new_access_token"})
+    providers = [
+        h2o_authn.TokenProvider(
+            refresh_token="input_refresh_token",
+            client_id=TEST_CLIENT_ID,
+            issuer_url=ISSUER_URL,
+        )
+        for _ in range(3)
+    ]
+
+    # When
+    for p in providers:
+        _ = p()
+    scoped = providers[0].with_scope("new scope")
+    _ = scoped()
+
+    # Then
+    assert discovery_route.call_count == 1
+    assert providers[0].issuer_metadata.jwks_uri == "http://example.com/certs"
+    assert scoped.issuer_metadata is providers[0].issuer_metadata
+
+
+@respx.mock
+def test_clone_before_discovery_uses_cache():
+    # Given
+    discovery_route = respx.get(ISSUER_DISCOVERY_URL).respond(json=DOCUMENT)
+    respx.post(TOKEN_ENDPOINT_URL).respond(json={"access_token": "new_access_token"})
+    provider = h2o_authn.TokenProvider(
+        refresh_token="input_refresh_token",
+        client_id=TEST_CLIENT_ID,
+        issuer_url=ISSUER_URL,
+    )
+    scoped = provider.with_scope("new scope")
+
+    # When
+    _ = provider()
+    _ = scoped()
+
+    # Then
+    assert discovery_route.call_count == 1
+
+
+def test_issuer_metadata_not_available_with_token_endpoint_url():
+    # Given
+    provider = h2o_authn.TokenProvider(
+        refresh_token="input_refresh_token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+    )
+
+    # Then
+    assert provider.issuer_metadata is None
@@ -0,0 +1,87 @@
+import base64
+import json
+
+import pytest
+
+from h2o_authn import jwt
+
+
+def _jwt(claims) -> str:
+    payload = base64.urlsafe_b64encode(json.dumps(claims).encode()).rstrip(b"=")
+    return "eyJhbGciOiJSUzI1NiJ9." + payload.decode() + ".signature"
+
+
+def test_claims():
+    # Given
+    value = _jwt({"exp": 1700003600, "iat": 1700000000, "scope": "openid"})
+
+    # When
+    result = jwt.claims(value)
+
+    # Then
+    assert result == {"exp": 1700003600, "iat": 1700000000, "scope": "openid"}
+
+
+def test_claims_memoized():
+    # Given
+    value = _jwt({"exp": 1700003600})
+
+    # When
+    first = jwt.claims(value)
+    second = jwt.claims(value)
+
+    # Then
+    assert first is second
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        "opaque-token",
+        "a.b",
+        "a.!!!.c",
+        "a." + base64.urlsafe_b64encode(b"not json").decode() + ".c",
+        "a." + base64.urlsafe_b64encode(b"[1]").decode() + ".c",
+    ],
+)
+def test_claims_not_jwt(value):
+    # When
+    result = jwt.claims(value)
+
+    # Then
+    assert result is None
+
+
+@pytest.mark.parametrize(
+    "claims,expected",
+    [
+        ({"exp": 1700003600, "iat": 1700000000}, 3600.0),
+        ({"exp": 1700003600}, None),
+        ({"exp": "1700003600", "iat": 1700000000}, None),
+        ({"exp": True, "iat": False}, None),
+    ],
+)
+def test_lifetime(claims, expected):
+    # When
+    result = jwt.lifetime(claims)
+
+    # Then
+    assert result == expected
+
+
+@pytest.mark.parametrize(
+    "claims,expected",
+    [
+        ({"scope": "openid offline_access"}, "openid offline_access"),
+        ({"scp": ["openid", "offline_access"]}, "openid offline_access"),
+        ({"scp": "openid"}, "openid"),
+        ({"scope": 1}, None),
+        ({}, None),
+    ],
+)
+def test_scope(claims, expected):
+    # When
+    result = jwt.scope(claims)
+
+    # Then
+    assert result == expected
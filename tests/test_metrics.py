@@ -0,0 +1,191 @@
+import httpx
+import pytest
+import respx
+
+import h2o_authn
+from h2o_authn import metrics
+import h2o_authn.error
+
+TEST_CLIENT_ID = "test-client-id"
+TOKEN_ENDPOINT_URL = "http://example.com/token"
+ISSUER_URL = "http://example.com/"
+ISSUER_DISCOVERY_URL = "http://example.com/.well-known/openid-configuration"
+
+
+class RecordingObserver(metrics.Observer):
+    def __init__(self):
+        self.events = []
+
+    def token_used(self, *, cached, expires_in):
+        self.events.append(("token", cached, expires_in))
+
+    def refresh_finished(self, *, duration, error):
+        self.events.append(("refresh", duration, error))
+
+    def discovery_finished(self, *, duration, error):
+        self.events.append(("discovery", duration, error))
+
+
+def create_provider(provider_cls=h2o_authn.TokenProvider, **kwargs):
+    kwargs.setdefault("token_endpoint_url", TOKEN_ENDPOINT_URL)
+    return provider_cls(
+        refresh_token="input_refresh_token", client_id=TEST_CLIENT_ID, **kwargs
+    )
+
+
+@respx.mock
+def test_sync_provider_reports_events():
+    # Given
+    respx.get(ISSUER_DISCOVERY_URL).respond(json={"token_endpoint": TOKEN_ENDPOINT_URL})
+    respx.post(TOKEN_ENDPOINT_URL).respond(
+        json={"access_token": "access_token", "expires_in": 3600}
+    )
+    observer = RecordingObserver()
+    provider = create_provider(
+        token_endpoint_url=None, issuer_url=ISSUER_URL, observer=observer
+    )
+
+    # When
+    _ = provider()
+    _ = provider()
+
+    # Then
+    names = [e[0] for e in observer.events]
+    assert names == ["discovery", "refresh", "token", "token"]
+    discovery, refresh, miss, hit = observer.events
+    assert discovery[1] >= 0 and discovery[2] is None
+    assert refresh[1] >= 0 and refresh[2] is None
+    assert miss[1] is False and 3590 < miss[2] <= 3600
+    assert hit[1] is True and 3590 < hit[2] <= 3600
+
+
+@respx.mock
+def test_refresh_error_reported():
+    # Given
+    respx.post(TOKEN_ENDPOINT_URL).respond(
+        status_code=400, json={"error": "invalid_grant"}
+    )
+    observer = RecordingObserver()
+    provider = create_provider(observer=observer)
+
+    # When
+    with pytest.raises(h2o_authn.error.TokenEndpointError):
+        provider()
+
+    # Then
+    [(name, _, error)] = observer.events
+    assert name == "refresh"
+    assert metrics.error_label(error) == "invalid_grant"
+
+
+@respx.mock
+@pytest.mark.asyncio
+async def test_async_provider_reports_events():
+    # Given
+    respx.post(TOKEN_ENDPOINT_URL).respond(json={"access_token": "access_token"})
+    observer = RecordingObserver()
+    provider = create_provider(h2o_authn.AsyncTokenProvider, observer=observer)
+
+    # When
+    _ = await provider()
+    _ = await provider()
+
+    # Then
+    assert [e[0] for e in observer.events] == ["refresh", "token", "token"]
+    assert [e[1] for e in observer.events[1:]] == [False, True]
+
+
+@respx.mock
+def test_multi_scope_provider_reports_events():
+    # Given
+    respx.post(TOKEN_ENDPOINT_URL).respond(json={"access_token": "access_token"})
+    observer = RecordingObserver()
+    provider = create_provider(h2o_authn.MultiScopeTokenProvider, observer=observer)
+
+    # When
+    _ = provider("scope_a scope_b")
+    _ = provider("scope_a")
+
+    # Then
+    assert [e[0] for e in observer.events] == ["refresh", "token", "token"]
+    assert [e[1] for e in observer.events[1:]] == [False, True]
+
+
+def test_error_label():
+    # Then
+    assert metrics.error_label(None) == ""
+    assert metrics.error_label(httpx.ConnectError("refused")) == "ConnectError"
+    assert (
+        metrics.error_label(h2o_authn.error.TokenEndpointError(error="invalid_grant"))
+        == "invalid_grant"
+    )
+
+
+@respx.mock
+def test_prometheus_observer():
+    # Given
+    prometheus_client = pytest.importorskip("prometheus_client")
+    registry = prometheus_client.CollectorRegistry()
+    respx.post(TOKEN_ENDPOINT_URL).respond(
+        json={"access_token": "access_token", "expires_in": 3600}
+    )
+    provider = create_provider(observer=metrics.PrometheusObserver(registry=registry))
+
+    # When
+    _ = provider()
+    _ = provider()
+
+    # Then
+    def sample(name, **labels):
+        return registry.get_sample_value(f"h2o_authn_{name}", labels)
+
+    assert sample("token_requests_total", cached="true") == 1
+    assert sample("token_requests_total", cached="false") == 1
+    assert sample("token_expires_in_seconds_count") == 2
+    assert sample("refreshes_total", error="") == 1
+    assert sample("refresh_duration_seconds_count") == 1
+
+
+@respx.mock
+def test_opentelemetry_observer():
+    # Given
+    pytest.importorskip("opentelemetry.sdk")
+    from opentelemetry.sdk.metrics import MeterProvider
+    from opentelemetry.sdk.metrics.export import InMemoryMetricReader
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import (
+        InMemorySpanExporter,
+    )
+
+    reader = InMemoryMetricReader()
+    exporter = InMemorySpanExporter()
+    tracer_provider = TracerProvider()
+    tracer_provider.add_span_processor(SimpleSpanProcessor(exporter))
+    observer = metrics.OpenTelemetryObserver(
+        meter=MeterProvider(metric_readers=[reader]).get_meter("test"),
+        tracer=tracer_provider.get_tracer("test"),
+    )
+    respx.post(TOKEN_ENDPOINT_URL).respond(
+        status_code=400, json={"error": "invalid_grant"}
+    )
+    provider = create_provider(observer=observer)
+
+    # When
+    with pytest.raises(h2o_authn.error.TokenEndpointError):
+        provider()
+
+    # Then
+    data = reader.get_metrics_data()
+    points = {
+        m.name: m.data.data_points
+        for rm in data.resource_metrics
+        for sm in rm.scope_metrics
+        for m in sm.metrics
+    }
+    [refreshes] = points["h2o_authn.refreshes"]
+    assert refreshes.value == 1
+    assert refreshes.attributes == {"error": "invalid_grant"}
+    [span] = exporter.get_finished_spans()
+    assert span.name == "h2o_authn.refresh"
+    assert not span.status.is_ok
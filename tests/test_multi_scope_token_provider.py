@@ -0,0 +1,191 @@
+import asyncio
+
+import httpx
+import pytest
+import respx
+
+import h2o_authn
+
+TEST_CLIENT_ID = "test-client-id"
+TOKEN_ENDPOINT_URL = "http://example.com/token"
+
+
+def rotating_token_endpoint():
+    """Returns side effect that issues a new refresh token with every access token
+    and records the refresh token and scope of each exchange.
+    """
+    exchanges = []
+
+    async def side_effect(request):
+        # Gives the other callers chance to run while the request is in flight.
+        await asyncio.sleep(0.01)
+        return respond(request)
+
+    def respond(request):
+        data = dict(httpx.QueryParams(request.content.decode()))
+        n = len(exchanges)
+        exchanges.append((data["refresh_token"], data.get("scope")))
+        return httpx.Response(
+            200,
+            json={
+                "access_token": f"access_token_{n}",
+                "refresh_token": f"refresh_token_{n}",
+                "expires_in": 3600,
+            },
+        )
+
+    return exchanges, respond, side_effect
+
+
+@respx.mock
+def test_scopes_share_rotated_refresh_token():
+    # Given
+    exchanges, respond, _ = rotating_token_endpoint()
+    respx.post(TOKEN_ENDPOINT_URL).mock(side_effect=respond)
+    provider = h2o_authn.MultiScopeTokenProvider(
+        refresh_token="input_refresh_token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+    )
+
+    # When
+    first = provider("scope_a")
+    second = provider("scope_b")
+    default = provider()
+
+    # Then
+    assert (first, second, default) == (
+        "access_token_0",
+        "access_token_1",
+        "access_token_2",
+    )
+    assert exchanges == [
+        ("input_refresh_token", "scope_a"),
+        ("refresh_token_0", "scope_b"),
+        ("refresh_token_1", None),
+    ]
+
+
+@respx.mock
+def test_scoped_tokens_cached():
+    # Given
+    exchanges, respond, _ = rotating_token_endpoint()
+    respx.post(TOKEN_ENDPOINT_URL).mock(side_effect=respond)
+    provider = h2o_authn.MultiScopeTokenProvider(
+        refresh_token="input_refresh_token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+        scope="default",
+    )
+
+    # When
+    tokens = [provider(s) for s in ["scope_a", "default", "scope_a", None]]
+
+    # Then
+    assert tokens == [
+        "access_token_0",
+        "access_token_1",
+        "access_token_0",
+        "access_token_1",
+    ]
+    assert len(exchanges) == 2
+
+
+@respx.mock
+def test_wider_scope_token_reused():
+    # Given
+    exchanges, respond, _ = rotating_token_endpoint()
+    respx.post(TOKEN_ENDPOINT_URL).mock(side_effect=respond)
+    provider = h2o_authn.MultiScopeTokenProvider(
+        refresh_token="input_refresh_token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+    )
+
+    # When
+    wide = provider.token("scope_a scope_b")
+    narrow = provider.token("scope_b")
+    reordered = provider.token("scope_b  scope_a")
+    other = provider.token("scope_c")
+
+    # Then
+    assert narrow is wide
+    assert reordered is wide
+    assert other == "access_token_1"
+    assert exchanges == [
+        ("input_refresh_token", "scope_a scope_b"),
+        ("refresh_token_0", "scope_c"),
+    ]
+
+
+@respx.mock
+def test_granted_scope_of_default_token_reused():
+    # Given
+    respx.post(TOKEN_ENDPOINT_URL).respond(
+        json={"access_token": "access_token", "scope": "openid offline_access"}
+    )
+    provider = h2o_authn.MultiScopeTokenProvider(
+        refresh_token="input_refresh_token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+    )
+
+    # When
+    default = provider.token()
+    scoped = provider.token("openid")
+
+    # Then
+    assert scoped is default
+
+
+@respx.mock
+@pytest.mark.asyncio
+async def test_async_exchanges_serialized():
+    # Given
+    exchanges, _, side_effect = rotating_token_endpoint()
+    respx.post(TOKEN_ENDPOINT_URL).mock(side_effect=side_effect)
+    provider = h2o_authn.AsyncMultiScopeTokenProvider(
+        refresh_token="input_refresh_token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+    )
+    scopes = ["scope_a", "scope_b", None] * 16
+
+    # When
+    tokens = await asyncio.gather(*(provider(s) for s in scopes))
+
+    # Then
+    assert len(exchanges) == 3
+    assert [rt for rt, _ in exchanges] == [
+        "input_refresh_token",
+        "refresh_token_0",
+        "refresh_token_1",
+    ]
+    by_scope = dict(zip(scopes, tokens))
+    assert sorted(by_scope.values()) == [
+        "access_token_0",
+        "access_token_1",
+        "access_token_2",
+    ]
+    assert all(by_scope[s] == t for s, t in zip(scopes, tokens))
+
+
+@respx.mock
+@pytest.mark.asyncio
+async def test_async_wider_scope_token_reused():
+    # Given
+    exchanges, _, side_effect = rotating_token_endpoint()
+    respx.post(TOKEN_ENDPOINT_URL).mock(side_effect=side_effect)
+    provider = h2o_authn.AsyncMultiScopeTokenProvider(
+        refresh_token="input_refresh_token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+    )
+
+    # When
+    wide = await provider.token("scope_a scope_b")
+    narrow = await provider.token("scope_a")
+
+    # Then
+    assert narrow is wide
+    assert len(exchanges) == 1
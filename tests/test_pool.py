@@ -0,0 +1,181 @@
+import datetime
+
+import pytest
+import respx
+import time_machine
+
+import h2o_authn
+from h2o_authn import pool
+
+TEST_CLIENT_ID = "test-client-id"
+TOKEN_ENDPOINT_URL = "http://example.com/token"
+
+
+def new_pool(**kwargs) -> pool.ProviderPool:
+    return pool.ProviderPool(
+        h2o_authn.TokenProvider,
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+        **kwargs,
+    )
+
+
+def test_provider_reused():
+    # Given
+    provider_pool = new_pool()
+
+    # When
+    first = provider_pool.get("refresh-token-1")
+    second = provider_pool.get("refresh-token-1")
+    other = provider_pool.get("refresh-token-2")
+
+    # Then
+    assert first is second
+    assert other is not first
+    assert other._original_refresh_token == "refresh-token-2"
+    assert len(provider_pool) == 2
+
+
+def test_providers_share_connections():
+    # Given
+    provider_pool = new_pool(http_keep_alive=True)
+
+    # When
+    first = provider_pool.get("refresh-token-1")
+    second = provider_pool.get("refresh-token-2")
+
+    # Then
+    assert first._http_clients is not None
+    assert first._http_clients is second._http_clients
+    provider_pool.close()
+
+
+@respx.mock
+def test_provider_obtains_own_token():
+    # Given
+    respx.post(TOKEN_ENDPOINT_URL).mock(
+        side_effect=[
+            respx.MockResponse(json={"access_token": "access-token-1"}),
+            respx.MockResponse(json={"access_token": "access-token-2"}),
+        ]
+    )
+    provider_pool = new_pool()
+
+    # When
+    first = provider_pool.get("refresh-token-1")()
+    second = provider_pool.get("refresh-token-2")()
+
+    # Then
+    assert first == "access-token-1"
+    assert second == "access-token-2"
+
+
+def test_subject_provider_replaced_with_new_refresh_token():
+    # Given
+    provider_pool = new_pool()
+    first = provider_pool.get("refresh-token-1", subject="user")
+
+    # When
+    second = provider_pool.get("refresh-token-2", subject="user")
+
+    # Then
+    assert second is not first
+    assert second._original_refresh_token == "refresh-token-2"
+    assert len(provider_pool) == 1
+
+
+def test_least_recently_used_evicted():
+    # Given
+    provider_pool = new_pool(max_size=2)
+    first = provider_pool.get("refresh-token-1")
+    provider_pool.get("refresh-token-2")
+    provider_pool.get("refresh-token-1")
+
+    # When
+    provider_pool.get("refresh-token-3")
+
+    # Then
+    assert len(provider_pool) == 2
+    assert provider_pool.get("refresh-token-1") is first
+    assert len(provider_pool) == 2
+
+
+def test_idle_evicted():
+    # Given
+    provider_pool = new_pool(ttl=datetime.timedelta(minutes=1))
+
+    with time_machine.travel(0, tick=False) as traveler:
+        first = provider_pool.get("refresh-token-1")
+        traveler.shift(datetime.timedelta(minutes=2))
+
+        # When
+        second = provider_pool.get("refresh-token-1")
+
+    # Then
+    assert second is not first
+
+
+@respx.mock
+def test_expired_refresh_token_evicted():
+    # Given
+    respx.post(TOKEN_ENDPOINT_URL).respond(
+        json={"access_token": "access-token", "refresh_expires_in": 60}
+    )
+    provider_pool = new_pool(ttl=None)
+
+    with time_machine.travel(0, tick=False) as traveler:
+        first = provider_pool.get("refresh-token-1")
+        first()
+        traveler.shift(datetime.timedelta(seconds=61))
+
+        # When
+        second = provider_pool.get("refresh-token-1")
+
+    # Then
+    assert second is not first
+
+
+def test_discard():
+    # Given
+    provider_pool = new_pool()
+    provider_pool.get("refresh-token-1", subject="user")
+
+    # When
+    provider_pool.discard("user")
+
+    # Then
+    assert len(provider_pool) == 0
+
+
+@respx.mock
+def test_discarded_provider_token_not_kept():
+    # Given
+    token_route = respx.post(TOKEN_ENDPOINT_URL).mock(
+        side_effect=[
+            respx.MockResponse(json={"access_token": "access-token-1"}),
+            respx.MockResponse(json={"access_token": "access-token-2"}),
+        ]
+    )
+    provider_pool = new_pool()
+    first = provider_pool.get("refresh-token-1", subject="user")
+    first()
+
+    # When
+    provider_pool.discard("user")
+    second = provider_pool.get("refresh-token-1", subject="user")
+
+    # Then
+    assert second is not first
+    assert second() == "access-token-2"
+    assert token_route.call_count == 2
+    assert provider_pool._template._token_container._access_token is None
+
+
+def test_invalid_arguments_rejected_on_creation():
+    with pytest.raises(ValueError):
+        pool.ProviderPool(h2o_authn.TokenProvider, client_id=TEST_CLIENT_ID)
+
+
+def test_invalid_max_size():
+    with pytest.raises(ValueError):
+        new_pool(max_size=0)
@@ -0,0 +1,309 @@
+import asyncio
+import datetime
+import time
+
+import httpx
+import pytest
+import respx
+
+import h2o_authn
+from h2o_authn import retry
+import h2o_authn.error
+
+TEST_CLIENT_ID = "test-client-id"
+TOKEN_ENDPOINT_URL = "http://example.com/token"
+ISSUER_URL = "http://example.com/"
+ISSUER_DISCOVERY_URL = "http://example.com/.well-known/openid-configuration"
+
+FAST_RETRY = retry.RetryPolicy(
+    base_delay=datetime.timedelta(milliseconds=1),
+    max_delay=datetime.timedelta(milliseconds=10),
+)
+
+
+def create_provider(provider_cls=h2o_authn.TokenProvider, **kwargs):
+    kwargs.setdefault("token_endpoint_url", TOKEN_ENDPOINT_URL)
+    return provider_cls(
+        refresh_token="input_refresh_token", client_id=TEST_CLIENT_ID, **kwargs
+    )
+
+
+def test_next_delay_decorrelated_jitter():
+    # Given
+    policy = retry.RetryPolicy(
+        base_delay=datetime.timedelta(seconds=1),
+        max_delay=datetime.timedelta(seconds=10),
+    )
+
+    # When
+    first = policy.next_delay(None)
+    second = policy.next_delay(2.0)
+    capped = policy.next_delay(100.0)
+
+    # Then
+    assert 1.0 <= first <= 3.0
+    assert 1.0 <= second <= 6.0
+    assert 1.0 <= capped <= 10.0
+
+
+@pytest.mark.parametrize(
+    "retry_after,expected",
+    [
+        pytest.param("2", 2.0, id="seconds"),
+        pytest.param("0", 0.0, id="zero"),
+        pytest.param("60", None, id="longer than max delay"),
+    ],
+)
+def test_next_delay_honors_retry_after(retry_after, expected):
+    # Given
+    policy = retry.RetryPolicy(max_delay=datetime.timedelta(seconds=10))
+    resp = httpx.Response(503, headers={"Retry-After": retry_after})
+
+    # When
+    delay = policy.next_delay(None, resp)
+
+    # Then
+    assert delay == expected
+
+
+@respx.mock
+def test_retries_retryable_status():
+    # Given
+    route = respx.post(TOKEN_ENDPOINT_URL)
+    route.side_effect = [
+        httpx.Response(503, json={}),
+        httpx.Response(429, headers={"Retry-After": "0"}),
+        httpx.Response(200, json={"access_token": "new_access_token"}),
+    ]
+    provider = create_provider(retry_policy=FAST_RETRY)
+
+    # When
+    access_token = provider()
+
+    # Then
+    assert access_token == "new_access_token"
+    assert route.call_count == 3
+
+
+@respx.mock
+def test_retries_transport_error():
+    # Given
+    route = respx.post(TOKEN_ENDPOINT_URL)
+    route.side_effect = [
+        httpx.ConnectError("refused"),
+        httpx.Response(200, json={"access_token": "new_access_token"}),
+    ]
+    provider = create_provider(retry_policy=FAST_RETRY)
+
+    # When
+    access_token = provider()
+
+    # Then
+    assert access_token == "new_access_token"
+    assert route.call_count == 2
+
+
+@respx.mock
+def test_gives_up_after_max_attempts():
+    # Given
+    route = respx.post(TOKEN_ENDPOINT_URL).respond(status_code=502, json={})
+    provider = create_provider(retry_policy=FAST_RETRY)
+
+    # When
+    with pytest.raises(httpx.HTTPStatusError):
+        provider()
+
+    # Then
+    assert route.call_count == 3
+
+
+@respx.mock
+def test_token_endpoint_error_not_retried():
+    # Given
+    route = respx.post(TOKEN_ENDPOINT_URL).respond(
+        status_code=400, json={"error": "invalid_grant"}
+    )
+    provider = create_provider(retry_policy=FAST_RETRY)
+
+    # When
+    with pytest.raises(h2o_authn.error.TokenEndpointError):
+        provider()
+
+    # Then
+    assert route.call_count == 1
+
+
+@respx.mock
+def test_no_retries_by_default():
+    # Given
+    route = respx.post(TOKEN_ENDPOINT_URL).respond(status_code=503, json={})
+    provider = create_provider()
+
+    # When
+    with pytest.raises(httpx.HTTPStatusError):
+        provider()
+
+    # Then
+    assert route.call_count == 1
+
+
+@respx.mock
+def test_retries_discovery():
+    # Given
+    discovery_route = respx.get(ISSUER_DISCOVERY_URL)
+    discovery_route.side_effect = [
+        httpx.Response(500),
+        httpx.Response(200, json={"token_endpoint": TOKEN_ENDPOINT_URL}),
+    ]
+    respx.post(TOKEN_ENDPOINT_URL).respond(json={"access_token": "new_access_token"})
+    provider = create_provider(
+        token_endpoint_url=None, issuer_url=ISSUER_URL, retry_policy=FAST_RETRY
+    )
+
+    # When
+    access_token = provider()
+
+    # Then
+    assert access_token == "new_access_token"
+    assert discovery_route.call_count == 2
+
+
+@respx.mock
+@pytest.mark.asyncio
+async def test_async_retries_retryable_status():
+    # Given
+    route = respx.post(TOKEN_ENDPOINT_URL)
+    route.side_effect = [
+        httpx.ConnectError("refused"),
+        httpx.Response(504),
+        httpx.Response(200, json={"access_token": "new_access_token"}),
+    ]
+    provider = create_provider(h2o_authn.AsyncTokenProvider, retry_policy=FAST_RETRY)
+
+    # When
+    access_token = await provider()
+
+    # Then
+    assert access_token == "new_access_token"
+    assert route.call_count == 3
+
+
+@respx.mock
+def test_circuit_breaker_fails_fast():
+    # Given
+    route = respx.post(TOKEN_ENDPOINT_URL).respond(status_code=503, json={})
+    breaker = retry.CircuitBreaker(failure_threshold=2)
+    provider = create_provider(circuit_breaker=breaker)
+    for _ in range(2):
+        with pytest.raises(httpx.HTTPStatusError):
+            provider()
+
+    # When
+    with pytest.raises(h2o_authn.error.CircuitOpenError):
+        provider()
+
+    # Then
+    assert breaker.is_open
+    assert route.call_count == 2
+
+
+@respx.mock
+def test_circuit_breaker_probe_closes_circuit():
+    # Given
+    route = respx.post(TOKEN_ENDPOINT_URL)
+    route.side_effect = [
+        httpx.Response(503, json={}),
+        httpx.Response(200, json={"access_token": "new_access_token"}),
+    ]
+    breaker = retry.CircuitBreaker(
+        failure_threshold=1, reset_timeout=datetime.timedelta(milliseconds=10)
+    )
+    provider = create_provider(circuit_breaker=breaker)
+    with pytest.raises(httpx.HTTPStatusError):
+        provider()
+    time.sleep(0.02)
+
+    # When
+    access_token = provider()
+
+    # Then
+    assert access_token == "new_access_token"
+    assert not breaker.is_open
+
+
+@respx.mock
+def test_circuit_breaker_serves_valid_token():
+    # Given
+    route = respx.post(TOKEN_ENDPOINT_URL)
+    route.side_effect = [
+        httpx.Response(
+            200, json={"access_token": "old_access_token", "expires_in": 60}
+        ),
+        httpx.Response(503, json={}),
+    ]
+    breaker = retry.CircuitBreaker(failure_threshold=1)
+    # Token requires refresh right away, but stays valid for a minute.
+    provider = create_provider(
+        circuit_breaker=breaker, expiry_threshold=datetime.timedelta(minutes=5)
+    )
+    _ = provider()
+    with pytest.raises(httpx.HTTPStatusError):
+        provider()
+
+    # When
+    access_token = provider()
+
+    # Then
+    assert access_token == "old_access_token"
+    assert route.call_count == 2
+
+
+@respx.mock
+@pytest.mark.asyncio
+async def test_async_circuit_breaker_serves_valid_token():
+    # Given
+    route = respx.post(TOKEN_ENDPOINT_URL)
+    route.side_effect = [
+        httpx.Response(
+            200, json={"access_token": "old_access_token", "expires_in": 60}
+        ),
+        httpx.Response(503, json={}),
+    ]
+    breaker = retry.CircuitBreaker(failure_threshold=1)
+    provider = create_provider(
+        h2o_authn.AsyncTokenProvider,
+        circuit_breaker=breaker,
+        expiry_threshold=datetime.timedelta(minutes=5),
+    )
+    _ = await provider()
+    with pytest.raises(httpx.HTTPStatusError):
+        await provider()
+
+    # When
+    access_token = await provider()
+
+    # Then
+    assert access_token == "old_access_token"
+    assert route.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_cancelled_probe_released():
+    # Given
+    async def hang(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(10)
+        raise AssertionError("unreachable")
+
+    breaker = retry.CircuitBreaker(
+        failure_threshold=1, reset_timeout=datetime.timedelta(0)
+    )
+    breaker.record_failure()
+    transport = retry.AsyncRetryTransport(httpx.MockTransport(hang), breaker=breaker)
+    request = httpx.Request("POST", TOKEN_ENDPOINT_URL)
+
+    # When
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(transport.handle_async_request(request), 0.01)
+
+    # Then
+    assert breaker.allow()
@@ -0,0 +1,196 @@
+import asyncio
+import json
+import os
+
+import httpx
+import pytest
+import respx
+
+import h2o_authn
+from h2o_authn import store
+
+TEST_CLIENT_ID = "test-client-id"
+TOKEN_ENDPOINT_URL = "http://example.com/token"
+
+PROCESSES = 8
+
+
+def test_file_store_load_missing(tmp_path):
+    # Given
+    file_store = store.FileStore(str(tmp_path))
+
+    # When
+    result = file_store.load("key")
+
+    # Then
+    assert result is None
+
+
+def test_file_store_save_and_load(tmp_path):
+    # Given
+    file_store = store.FileStore(str(tmp_path))
+    file_store.save("key", {"refresh_token": "test-refresh-token"})
+
+    # When
+    result = file_store.load("key")
+
+    # Then
+    assert result == {"refresh_token": "test-refresh-token"}
+    assert os.stat(tmp_path / "key.json").st_mode & 0o077 == 0
+
+
+def test_file_store_encryption_hooks_used(tmp_path):
+    # Given
+    file_store = store.FileStore(
+        str(tmp_path), encrypt=lambda b: b[::-1], decrypt=lambda b: b[::-1]
+    )
+    file_store.save("key", {"refresh_token": "test-refresh-token"})
+
+    # When
+    result = file_store.load("key")
+
+    # Then
+    assert result == {"refresh_token": "test-refresh-token"}
+    with pytest.raises(json.JSONDecodeError):
+        json.loads((tmp_path / "key.json").read_bytes())
+
+
+def test_file_store_encryption_hooks_required_together(tmp_path):
+    # When
+    with pytest.raises(ValueError):
+        _ = store.FileStore(str(tmp_path), encrypt=lambda b: b)
+
+
+@respx.mock
+def test_sync_providers_share_token_through_store(tmp_path):
+    # Given
+    route = respx.post(TOKEN_ENDPOINT_URL).respond(
+        json={"access_token": "new_access_token", "expires_in": 3600}
+    )
+    file_store = store.FileStore(str(tmp_path))
+    # Each provider has its own container as if they were in separate processes.
+    providers = [
+        h2o_authn.TokenProvider(
+            refresh_token="input_refresh_token",
+            client_id=TEST_CLIENT_ID,
+            token_endpoint_url=TOKEN_ENDPOINT_URL,
+            token_store=file_store,
+        )
+        for _ in range(PROCESSES)
+    ]
+
+    # When
+    tokens = [p() for p in providers]
+
+    # Then
+    assert route.call_count == 1
+    assert tokens == ["new_access_token"] * PROCESSES
+
+
+@respx.mock
+@pytest.mark.asyncio
+async def test_async_providers_share_token_through_store(tmp_path):
+    # Given
+    route = respx.post(TOKEN_ENDPOINT_URL).respond(
+        json={"access_token": "new_access_token", "expires_in": 3600}
+    )
+    file_store = store.FileStore(str(tmp_path))
+    providers = [
+        h2o_authn.AsyncTokenProvider(
+            refresh_token="input_refresh_token",
+            client_id=TEST_CLIENT_ID,
+            token_endpoint_url=TOKEN_ENDPOINT_URL,
+            token_store=file_store,
+        )
+        for _ in range(PROCESSES)
+    ]
+
+    # When
+    tokens = await asyncio.gather(*(p() for p in providers))
+
+    # Then
+    assert route.call_count == 1
+    assert tokens == ["new_access_token"] * PROCESSES
+
+
+@respx.mock
+def test_rotated_refresh_token_shared_through_store(tmp_path):
+    # Given
+    route = respx.post(TOKEN_ENDPOINT_URL)
+    route.side_effect = [
+        httpx.Response(
+            200, json={"access_token": "first_access_token", "refresh_token": "rotated"}
+        ),
+        httpx.Response(200, json={"access_token": "second_access_token"}),
+    ]
+    file_store = store.FileStore(str(tmp_path))
+    first, second = (
+        h2o_authn.TokenProvider(
+            refresh_token="input_refresh_token",
+            client_id=TEST_CLIENT_ID,
+            token_endpoint_url=TOKEN_ENDPOINT_URL,
+            token_store=file_store,
+        )
+        for _ in range(2)
+    )
+    _ = first()
+
+    # When
+    second._refresh(force=True)
+
+    # Then
+    assert route.call_count == 2
+    assert b"refresh_token=rotated" in route.calls.last.request.content
+    assert second() == "second_access_token"
+
+
+def test_file_store_corrupted_state_treated_as_missing(tmp_path):
+    # Given
+    file_store = store.FileStore(str(tmp_path))
+    (tmp_path / "key.json").write_bytes(b"not json")
+
+    # When
+    result = file_store.load("key")
+
+    # Then
+    assert result is None
+
+
+def test_file_store_failed_decryption_treated_as_missing(tmp_path):
+    # Given
+    store.FileStore(str(tmp_path)).save("key", {"refresh_token": "test"})
+
+    def decrypt(data: bytes) -> bytes:
+        raise ValueError("invalid key")
+
+    file_store = store.FileStore(str(tmp_path), encrypt=lambda b: b, decrypt=decrypt)
+
+    # When
+    result = file_store.load("key")
+
+    # Then
+    assert result is None
+
+
+@respx.mock
+def test_unreadable_stored_state_overwritten(tmp_path):
+    # Given
+    route = respx.post(TOKEN_ENDPOINT_URL).respond(
+        json={"access_token": "new_access_token", "expires_in": 3600}
+    )
+    file_store = store.FileStore(str(tmp_path))
+    provider = h2o_authn.TokenProvider(
+        refresh_token="input_refresh_token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+        token_store=file_store,
+    )
+    (tmp_path / f"{provider._token_store_key}.json").write_bytes(b"\x00corrupted")
+
+    # When
+    result = provider()
+
+    # Then
+    assert route.call_count == 1
+    assert result == "new_access_token"
+    assert file_store.load(provider._token_store_key)["access_token"] == result
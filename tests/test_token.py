@@ -1,4 +1,5 @@
 import datetime
+import pickle
 
 from h2o_authn import token
 
@@ -16,3 +17,33 @@ def test_token():
     assert t == value
     assert t.exp == exp
     assert t.scope == scope
+
+
+def test_token_is_str():
+    # Given
+    t = token.Token("test-token", exp=None, scope=None)
+
+    # When
+    value = str(t)
+
+    # Then
+    assert isinstance(t, str)
+    assert not isinstance(value, token.Token)
+    assert value == "test-token"
+    assert value is str(t)
+    assert t.data == "test-token"
+    assert "Bearer " + t == "Bearer test-token"
+
+
+def test_token_pickle():
+    # Given
+    exp = datetime.datetime.now(datetime.timezone.utc)
+    t = token.Token("test-token", exp=exp, scope="test-scope")
+
+    # When
+    restored = pickle.loads(pickle.dumps(t))
+
+    # Then
+    assert restored == "test-token"
+    assert restored.exp == exp
+    assert restored.scope == "test-scope"
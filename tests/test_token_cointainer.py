@@ -1,4 +1,6 @@
+import base64
 import datetime
+import json
 
 import pytest
 import time_machine
@@ -168,3 +170,335 @@ def test_update_token_refresh_token_used():
 
     # Then
     assert refresh_token == "new-refresh-token"
+
+
+def test_access_token_valid_within_expiry_threshold():
+    # Given
+    container = token.Container(
+        refresh_token="test-refresh-token",
+        expiry_threshold=datetime.timedelta(seconds=2000),
+    )
+
+    # When
+    with time_machine.travel(0) as traveler:
+        container.update_token("test-access_token", expires_in=3600)
+        traveler.shift(datetime.timedelta(seconds=1800))
+        result = container.access_token_valid()
+
+    # Then
+    assert result is True
+
+
+def test_access_token_not_valid_after_expiry():
+    # Given
+    container = token.Container(refresh_token="test-refresh-token")
+
+    # When
+    with time_machine.travel(0) as traveler:
+        container.update_token("test-access_token", expires_in=3600)
+        traveler.shift(datetime.timedelta(seconds=3600))
+        result = container.access_token_valid()
+
+    # Then
+    assert result is False
+
+
+def test_access_token_not_valid_after_init():
+    # Given
+    container = token.Container(refresh_token="test-refresh-token")
+
+    # When
+    result = container.access_token_valid()
+
+    # Then
+    assert result is False
+
+
+def test_refresh_after_ratio_of_lifetime():
+    # Given
+    container = token.Container(
+        refresh_token="test-refresh-token",
+        expiry_threshold=datetime.timedelta(seconds=400),
+    )
+
+    # When
+    with time_machine.travel(0, tick=False) as traveler:
+        container.update_token("test-access_token", expires_in=3600)
+        traveler.shift(datetime.timedelta(seconds=1000))
+        result = container.refresh_after(0.5)
+
+    # Then
+    assert result == datetime.timedelta(seconds=600)
+
+
+def test_refresh_after_without_access_token():
+    # Given
+    container = token.Container(refresh_token="test-refresh-token")
+
+    # When
+    result = container.refresh_after(0.5)
+
+    # Then
+    assert result == datetime.timedelta(0)
+
+
+def test_revalidation_not_required_without_stale_while_revalidate():
+    # Given
+    container = token.Container(
+        refresh_token="test-refresh-token",
+        expiry_threshold=datetime.timedelta(seconds=0),
+    )
+
+    # When
+    with time_machine.travel(0) as traveler:
+        container.update_token("test-access_token", expires_in=3600)
+        traveler.shift(datetime.timedelta(seconds=3500))
+        result = container.revalidation_required()
+
+    # Then
+    assert result is False
+
+
+def test_revalidation_required_within_stale_while_revalidate():
+    # Given
+    container = token.Container(
+        refresh_token="test-refresh-token",
+        expiry_threshold=datetime.timedelta(seconds=100),
+        stale_while_revalidate=datetime.timedelta(seconds=600),
+    )
+
+    # When
+    with time_machine.travel(0) as traveler:
+        container.update_token("test-access_token", expires_in=3600)
+        traveler.shift(datetime.timedelta(seconds=2900))
+        result = container.revalidation_required()
+        refresh_required = container.refresh_required()
+
+    # Then
+    assert result is True
+    assert refresh_required is False
+
+
+def test_revalidation_not_required_before_stale_while_revalidate():
+    # Given
+    container = token.Container(
+        refresh_token="test-refresh-token",
+        expiry_threshold=datetime.timedelta(seconds=100),
+        stale_while_revalidate=datetime.timedelta(seconds=600),
+    )
+
+    # When
+    with time_machine.travel(0) as traveler:
+        container.update_token("test-access_token", expires_in=3600)
+        traveler.shift(datetime.timedelta(seconds=2800))
+        result = container.revalidation_required()
+
+    # Then
+    assert result is False
+
+
+def test_restore_from_snapshot():
+    # Given
+    container = token.Container(refresh_token="old-refresh-token")
+    with time_machine.travel(0, tick=False):
+        container.update_token(
+            "test-access-token",
+            expires_in=3600,
+            refresh_token="new-refresh-token",
+            scope="test-scope",
+            refresh_expires_in=7200,
+        )
+    restored = token.Container(refresh_token="old-refresh-token")
+
+    # When
+    with time_machine.travel(1800, tick=False):
+        restored.restore(container.snapshot())
+        refresh_required = restored.refresh_required()
+
+    # Then
+    assert refresh_required is False
+    assert restored.refresh_token == "new-refresh-token"
+    assert restored.refresh_token_exp.timestamp() == 7200
+    assert restored.access_token == "test-access-token"
+    assert restored.access_token.exp.timestamp() == 3600
+    assert restored.access_token.scope == "test-scope"
+
+
+def test_restore_from_snapshot_without_access_token():
+    # Given
+    container = token.Container(refresh_token="test-refresh-token")
+    restored = token.Container(refresh_token="other-refresh-token")
+
+    # When
+    restored.restore(container.snapshot())
+
+    # Then
+    assert restored.refresh_token == "test-refresh-token"
+    assert restored.refresh_required() is True
+
+
+def test_revalidation_not_required_after_failure():
+    # Given
+    container = token.Container(
+        refresh_token="test-refresh-token",
+        expiry_threshold=datetime.timedelta(seconds=100),
+        stale_while_revalidate=datetime.timedelta(seconds=600),
+    )
+
+    with time_machine.travel(0, tick=False) as traveler:
+        container.update_token("test-access_token", expires_in=3600)
+        traveler.shift(datetime.timedelta(seconds=2900))
+
+        # When
+        container.revalidation_failed()
+        within_backoff = container.revalidation_required()
+        traveler.shift(token.REVALIDATION_BACKOFF)
+        after_backoff = container.revalidation_required()
+
+    # Then
+    assert within_backoff is False
+    assert after_backoff is True
+
+
+def _jwt(claims) -> str:
+    payload = base64.urlsafe_b64encode(json.dumps(claims).encode()).rstrip(b"=")
+    return "eyJhbGciOiJSUzI1NiJ9." + payload.decode() + ".signature"
+
+
+def test_jwt_lifetime_used_without_expires_in():
+    # Given
+    container = token.Container(refresh_token="test-refresh-token", parse_jwt=True)
+    access_token = _jwt({"exp": 1700007200, "iat": 1700000000, "scope": "openid"})
+
+    # When
+    with time_machine.travel(0, tick=False):
+        container.update_token(access_token)
+        expires_in = container.expires_in()
+
+    # Then
+    assert expires_in == 7200
+    assert container.access_token.scope == "openid"
+
+
+def test_jwt_lifetime_shorter_than_expires_in():
+    # Given
+    container = token.Container(refresh_token="test-refresh-token", parse_jwt=True)
+    access_token = _jwt({"exp": 1700000300, "iat": 1700000000})
+
+    # When
+    with time_machine.travel(0, tick=False):
+        container.update_token(access_token, expires_in=3600, scope="input")
+        expires_in = container.expires_in()
+
+    # Then
+    assert expires_in == 300
+    assert container.access_token.scope == "input"
+
+
+def test_jwt_exp_without_iat():
+    # Given
+    container = token.Container(refresh_token="test-refresh-token", parse_jwt=True)
+
+    # When
+    with time_machine.travel(1700000000, tick=False):
+        container.update_token(_jwt({"exp": 1700000600}))
+
+        # Then
+        assert container.expires_in() == 600
+
+
+def test_jwt_not_parsed_by_default():
+    # Given
+    container = token.Container(refresh_token="test-refresh-token")
+    access_token = _jwt({"exp": 1700000300, "iat": 1700000000})
+
+    # When
+    with time_machine.travel(0, tick=False):
+        container.update_token(access_token, expires_in=3600)
+        expires_in = container.expires_in()
+
+    # Then
+    assert expires_in == 3600
+
+
+def test_lifetime_counted_from_request():
+    # Given
+    container = token.Container(refresh_token="test-refresh-token")
+
+    # When
+    with time_machine.travel(1000, tick=False):
+        container.update_token(
+            "test-access-token",
+            expires_in=60,
+            refresh_expires_in=600,
+            requested_at=998.0,
+        )
+        expires_in = container.expires_in()
+
+    # Then
+    assert expires_in == 58
+    assert container.refresh_token_exp == datetime.datetime.fromtimestamp(
+        1598, datetime.timezone.utc
+    )
+
+
+@pytest.mark.parametrize(
+    "server_date,expected",
+    [(None, 0.0), (999.0, 0.0), (1000.0, 0.0), (1030.0, 30.0), (960.0, -38.0)],
+)
+def test_clock_offset(server_date, expected):
+    # Given
+    container = token.Container(refresh_token="test-refresh-token")
+
+    # When
+    with time_machine.travel(1000, tick=False):
+        container.update_token(
+            "test-access-token", requested_at=999.0, server_date=server_date
+        )
+
+    # Then
+    assert container.clock_offset == expected
+
+
+def test_jwt_exp_compared_with_issuer_clock():
+    # Given
+    container = token.Container(refresh_token="test-refresh-token", parse_jwt=True)
+
+    # When
+    with time_machine.travel(1700000000, tick=False):
+        # Issuer's clock is 100s ahead.
+        container.update_token(
+            _jwt({"exp": 1700000700}), requested_at=1700000000, server_date=1700000100
+        )
+        expires_in = container.expires_in()
+
+    # Then
+    assert expires_in == 600
+
+
+def test_jwt_lifetime_bounded_by_exp():
+    # Given
+    container = token.Container(refresh_token="test-refresh-token", parse_jwt=True)
+    # Issued 50 minutes ago.
+    access_token = _jwt({"exp": 1700000600, "iat": 1699997000})
+
+    # When
+    with time_machine.travel(1700000000, tick=False):
+        container.update_token(access_token)
+        expires_in = container.expires_in()
+
+    # Then
+    assert expires_in == 600
+
+
+def test_expired_jwt_refreshed():
+    # Given
+    container = token.Container(refresh_token="test-refresh-token", parse_jwt=True)
+
+    # When
+    with time_machine.travel(1700000000, tick=False):
+        container.update_token(_jwt({"exp": 1699999000, "iat": 1699995400}))
+        refresh_required = container.refresh_required()
+
+    # Then
+    assert refresh_required
@@ -1,5 +1,9 @@
+import asyncio
+import datetime
+
 import pytest
 import respx
+import time_machine
 
 import h2o_authn
 import h2o_authn.error
@@ -231,3 +235,234 @@ async def test_async_token_provider_error_wrapped():
     assert exc_info.value.error == "test-error"
     assert exc_info.value.error_description == "test error description"
     assert exc_info.value.error_uri == "test error URI"
+
+
+@respx.mock
+def test_sync_token_provider_keep_alive_client_reused():
+    # Given
+    route = respx.post(TOKEN_ENDPOINT_URL).respond(
+        json={"access_token": "new_access_token"}
+    )
+    provider = h2o_authn.TokenProvider(
+        refresh_token="input_refresh_token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+        expiry_threshold=datetime.timedelta(seconds=60),
+        http_keep_alive=True,
+    )
+
+    # When
+    with provider._client() as first_client:
+        _ = provider()
+    with provider._client() as second_client:
+        _ = provider()
+
+    # Then
+    assert route.call_count == 2
+    assert first_client is second_client
+    assert not first_client.is_closed
+
+
+@respx.mock
+@pytest.mark.asyncio
+async def test_async_token_provider_keep_alive_client_reused():
+    # Given
+    route = respx.post(TOKEN_ENDPOINT_URL).respond(
+        json={"access_token": "new_access_token"}
+    )
+    provider = h2o_authn.AsyncTokenProvider(
+        refresh_token="input_refresh_token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+        expiry_threshold=datetime.timedelta(seconds=60),
+        http_keep_alive=True,
+    )
+
+    # When
+    async with provider._client() as first_client:
+        _ = await provider()
+    async with provider._client() as second_client:
+        _ = await provider()
+
+    # Then
+    assert route.call_count == 2
+    assert first_client is second_client
+    assert not first_client.is_closed
+
+
+def test_sync_token_provider_keep_alive_client_shared_with_clones():
+    # Given
+    provider = h2o_authn.TokenProvider(
+        refresh_token="input_refresh_token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+        http_keep_alive=True,
+    )
+
+    # When
+    new_provider = provider.with_scope("new scope")
+
+    # Then
+    with provider._client() as client, new_provider._client() as new_client:
+        assert client is new_client
+
+
+def test_sync_token_provider_keep_alive_client_closed_on_exit():
+    # Given
+    provider = h2o_authn.TokenProvider(
+        refresh_token="input_refresh_token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+        http_keep_alive=True,
+    )
+
+    # When
+    with provider:
+        with provider._client() as client:
+            pass
+
+    # Then
+    assert client.is_closed
+
+
+@pytest.mark.asyncio
+async def test_async_token_provider_keep_alive_client_closed_on_exit():
+    # Given
+    provider = h2o_authn.AsyncTokenProvider(
+        refresh_token="input_refresh_token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+        http_keep_alive=True,
+    )
+
+    # When
+    async with provider:
+        async with provider._client() as client:
+            pass
+
+    # Then
+    assert client.is_closed
+
+
+def test_async_token_provider_keep_alive_client_per_event_loop():
+    # Given
+    provider = h2o_authn.AsyncTokenProvider(
+        refresh_token="input_refresh_token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+        http_keep_alive=True,
+    )
+    clone = provider.with_scope("new scope")
+
+    async def get_clients():
+        async with provider._client() as client, clone._client() as clone_client:
+            return client, clone_client
+
+    # When
+    first_loop_clients = asyncio.run(get_clients())
+    second_loop_clients = asyncio.run(get_clients())
+
+    # Then
+    assert first_loop_clients[0] is first_loop_clients[1]
+    assert first_loop_clients[0] is not second_loop_clients[0]
+
+
+@respx.mock
+def test_token_provider_clock_offset_from_date_header():
+    # Given
+    respx.post(TOKEN_ENDPOINT_URL).respond(
+        json={"access_token": "new_access_token", "expires_in": 3600},
+        headers={"Date": "Tue, 14 Nov 2023 22:15:00 GMT"},
+    )
+    provider = h2o_authn.TokenProvider(
+        refresh_token="input_refresh_token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+    )
+
+    # When
+    with time_machine.travel(1700000000, tick=False):
+        _ = provider()
+
+    # Then
+    assert provider._token_container.clock_offset == 100
+
+
+@respx.mock
+def test_token_provider_client_secret_basic():
+    # Given
+    route = respx.post(TOKEN_ENDPOINT_URL).respond(
+        json={"access_token": "new_access_token"}
+    )
+    provider = h2o_authn.TokenProvider(
+        refresh_token="refresh-token",
+        client_id="client:id",
+        client_secret="secret/+",
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+        client_secret_basic=True,
+    )
+
+    # When
+    provider()
+
+    # Then
+    request = route.calls.last.request
+    # Credentials are form-encoded before the base64.
+    assert request.headers["Authorization"] == "Basic Y2xpZW50JTNBaWQ6c2VjcmV0JTJGJTJC"
+    assert request.content == b"grant_type=refresh_token&refresh_token=refresh-token"
+
+
+def test_token_provider_client_secret_basic_requires_secret():
+    with pytest.raises(ValueError):
+        h2o_authn.TokenProvider(
+            refresh_token="refresh-token",
+            client_id=TEST_CLIENT_ID,
+            token_endpoint_url=TOKEN_ENDPOINT_URL,
+            client_secret_basic=True,
+        )
+
+
+def test_token_provider_token_request_cached_per_refresh_token():
+    # Given
+    provider = h2o_authn.TokenProvider(
+        refresh_token="refresh-token",
+        client_id=TEST_CLIENT_ID,
+        client_secret=TEST_CLIENT_SECRET,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+        scope="openid",
+    )
+    first = provider._token_request()
+
+    # When
+    second = provider._token_request()
+    provider._token_container.update_token(
+        access_token="access-token", refresh_token="rotated-refresh-token"
+    )
+    rotated = provider._token_request()
+
+    # Then
+    assert second is first
+    assert rotated is not first
+    assert rotated.content == (
+        b"grant_type=refresh_token&client_id=test-client-id"
+        b"&client_secret=test-client-secret&refresh_token=rotated-refresh-token"
+        b"&scope=openid"
+    )
+
+
+def test_token_provider_with_scope_shares_static_form():
+    # Given
+    provider = h2o_authn.TokenProvider(
+        refresh_token="refresh-token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+        scope="openid",
+    )
+    provider._token_request()
+
+    # When
+    scoped = provider.with_scope("other scope")
+
+    # Then
+    assert scoped._form_static is provider._form_static
+    assert scoped._token_request().content.endswith(b"&scope=other+scope")
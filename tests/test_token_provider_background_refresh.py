@@ -0,0 +1,256 @@
+import asyncio
+import gc
+import time
+
+import httpx
+import pytest
+import respx
+
+import h2o_authn
+from h2o_authn import _refresher
+from h2o_authn import cache
+
+TEST_CLIENT_ID = "test-client-id"
+TOKEN_ENDPOINT_URL = "http://example.com/token"
+
+
+@pytest.fixture
+def fast_refresh(monkeypatch):
+    monkeypatch.setattr(_refresher, "next_delay", lambda provider, failures: 0.01)
+
+
+def wait_for(condition, timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        time.sleep(0.01)
+
+
+async def async_wait_for(condition, timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        await asyncio.sleep(0.01)
+
+
+@respx.mock
+def test_sync_token_provider_refreshed_in_background(fast_refresh):
+    # Given
+    route = respx.post(TOKEN_ENDPOINT_URL).respond(
+        json={"access_token": "new_access_token", "expires_in": 3600}
+    )
+    provider = h2o_authn.TokenProvider(
+        refresh_token="input_refresh_token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+        background_refresh=True,
+    )
+
+    # When
+    _ = provider()
+    wait_for(lambda: route.call_count >= 3)
+    provider.close()
+
+    # Then
+    calls = route.call_count
+    time.sleep(0.05)
+    assert route.call_count == calls
+
+
+@respx.mock
+def test_sync_token_provider_background_refresh_stops_when_collected(fast_refresh):
+    # Given
+    respx.post(TOKEN_ENDPOINT_URL).respond(
+        json={"access_token": "new_access_token", "expires_in": 3600}
+    )
+    provider = h2o_authn.TokenProvider(
+        refresh_token="input_refresh_token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+        background_refresh=True,
+    )
+    _ = provider()
+    thread = provider._background_refresher._thread
+
+    # When
+    del provider
+    gc.collect()
+
+    # Then
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    assert thread.daemon
+
+
+@respx.mock
+def test_sync_token_provider_background_refresh_survives_failures(fast_refresh):
+    # Given
+    route = respx.post(TOKEN_ENDPOINT_URL)
+    route.side_effect = [
+        httpx.Response(200, json={"access_token": "new_access_token"}),
+        *[httpx.Response(500)] * 100,
+    ]
+    provider = h2o_authn.TokenProvider(
+        refresh_token="input_refresh_token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+        background_refresh=True,
+    )
+    _ = provider()
+
+    # When
+    wait_for(lambda: route.call_count >= 3)
+    provider.close()
+
+    # Then
+    assert provider() == "new_access_token"
+    provider.close()
+
+
+@respx.mock
+@pytest.mark.asyncio
+async def test_async_token_provider_refreshed_in_background(fast_refresh):
+    # Given
+    route = respx.post(TOKEN_ENDPOINT_URL).respond(
+        json={"access_token": "new_access_token", "expires_in": 3600}
+    )
+    provider = h2o_authn.AsyncTokenProvider(
+        refresh_token="input_refresh_token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+        background_refresh=True,
+    )
+
+    # When
+    _ = await provider()
+    await async_wait_for(lambda: route.call_count >= 3)
+    await provider.aclose()
+
+    # Then
+    calls = route.call_count
+    await asyncio.sleep(0.05)
+    assert route.call_count == calls
+
+
+@pytest.mark.parametrize(
+    "constructor", [h2o_authn.TokenProvider, h2o_authn.AsyncTokenProvider]
+)
+@pytest.mark.parametrize("ratio", [0, 1.5])
+def test_token_provider_background_refresh_ratio_validated(constructor, ratio):
+    # When
+    with pytest.raises(ValueError) as exc_info:
+        _ = constructor(
+            refresh_token="",
+            client_id="",
+            token_endpoint_url=TOKEN_ENDPOINT_URL,
+            background_refresh_ratio=ratio,
+        )
+
+    # Then
+    assert "background_refresh_ratio" in str(exc_info.value)
+
+
+@respx.mock
+def test_sync_token_provider_short_lived_token_not_refreshed_in_loop():
+    # Given
+    route = respx.post(TOKEN_ENDPOINT_URL).respond(
+        json={"access_token": "new_access_token", "expires_in": 5}
+    )
+    provider = h2o_authn.TokenProvider(
+        refresh_token="input_refresh_token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+        background_refresh=True,
+    )
+
+    # When
+    _ = provider()
+    time.sleep(0.5)
+    provider.close()
+
+    # Then
+    assert route.call_count == 1
+
+
+@respx.mock
+def test_sync_token_provider_background_refresh_waits_for_refresh_in_progress(
+    fast_refresh,
+):
+    # Given
+    route = respx.post(TOKEN_ENDPOINT_URL).respond(
+        json={"access_token": "new_access_token", "expires_in": 3600}
+    )
+    provider = h2o_authn.TokenProvider(
+        refresh_token="input_refresh_token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+        background_refresh=True,
+    )
+
+    # When
+    _ = provider()
+    with provider._token_container.refresh_lock:
+        # Simulates the refresh in progress on the caller's path.
+        time.sleep(0.2)
+        calls = route.call_count
+    provider.close()
+
+    # Then
+    assert calls == 1
+
+
+@respx.mock
+def test_background_refresh_skipped_when_shared_token_refreshed():
+    # Given
+    route = respx.post(TOKEN_ENDPOINT_URL).respond(
+        json={"access_token": "new_access_token", "expires_in": 3600}
+    )
+    token_cache = cache.TokenCache()
+    first, second = (
+        h2o_authn.TokenProvider(
+            refresh_token="input_refresh_token",
+            client_id=TEST_CLIENT_ID,
+            token_endpoint_url=TOKEN_ENDPOINT_URL,
+            token_cache=token_cache,
+        )
+        for _ in range(2)
+    )
+    _ = first()
+    scheduled_at = time.time()
+    time.sleep(0.01)
+    first._refresh(force=True, scheduled_at=scheduled_at)
+
+    # When
+    second._refresh(force=True, scheduled_at=scheduled_at)
+
+    # Then
+    assert route.call_count == 2
+
+
+@respx.mock
+@pytest.mark.asyncio
+async def test_async_background_refresh_skipped_when_shared_token_refreshed():
+    # Given
+    route = respx.post(TOKEN_ENDPOINT_URL).respond(
+        json={"access_token": "new_access_token", "expires_in": 3600}
+    )
+    token_cache = cache.TokenCache()
+    first, second = (
+        h2o_authn.AsyncTokenProvider(
+            refresh_token="input_refresh_token",
+            client_id=TEST_CLIENT_ID,
+            token_endpoint_url=TOKEN_ENDPOINT_URL,
+            token_cache=token_cache,
+        )
+        for _ in range(2)
+    )
+    _ = await first()
+    scheduled_at = time.time()
+    await asyncio.sleep(0.01)
+    await first._refresh(force=True, scheduled_at=scheduled_at)
+
+    # When
+    await second._refresh(force=True, scheduled_at=scheduled_at)
+
+    # Then
+    assert route.call_count == 2
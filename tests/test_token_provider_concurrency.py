@@ -0,0 +1,204 @@
+import asyncio
+import concurrent.futures
+import datetime
+import threading
+import time
+
+import httpx
+import pytest
+import respx
+
+import h2o_authn
+import h2o_authn.error
+
+TEST_CLIENT_ID = "test-client-id"
+TOKEN_ENDPOINT_URL = "http://example.com/token"
+
+CONCURRENT_CALLERS = 256
+CONCURRENT_THREADS = 64
+
+
+def slow_response(response: httpx.Response):
+    async def side_effect(request):
+        # Gives the other callers chance to run while the request is in flight.
+        await asyncio.sleep(0.01)
+        return response
+
+    return side_effect
+
+
+def slow_sync_response(response: httpx.Response):
+    def side_effect(request):
+        # Gives the other threads chance to run while the request is in flight.
+        time.sleep(0.05)
+        return response
+
+    return side_effect
+
+
+def call_from_threads(func, count: int):
+    barrier = threading.Barrier(count)
+
+    def call():
+        barrier.wait()
+        return func()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=count) as executor:
+        futures = [executor.submit(call) for _ in range(count)]
+    return [f.result() for f in futures]
+
+
+@respx.mock
+def test_sync_token_provider_concurrent_threads_single_request():
+    # Given
+    route = respx.post(TOKEN_ENDPOINT_URL).mock(
+        side_effect=slow_sync_response(
+            httpx.Response(
+                200, json={"access_token": "new_access_token", "expires_in": 3600}
+            )
+        )
+    )
+    provider = h2o_authn.TokenProvider(
+        refresh_token="input_refresh_token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+    )
+
+    # When
+    tokens = call_from_threads(provider, CONCURRENT_THREADS)
+
+    # Then
+    assert route.call_count == 1
+    assert tokens == ["new_access_token"] * CONCURRENT_THREADS
+
+
+@respx.mock
+def test_sync_token_provider_concurrent_threads_keep_valid_token():
+    # Given
+    route = respx.post(TOKEN_ENDPOINT_URL).mock(
+        side_effect=[
+            httpx.Response(
+                200, json={"access_token": "old_access_token", "expires_in": 30}
+            ),
+            slow_sync_response(
+                httpx.Response(
+                    200, json={"access_token": "new_access_token", "expires_in": 3600}
+                )
+            ),
+        ]
+    )
+    provider = h2o_authn.TokenProvider(
+        refresh_token="input_refresh_token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+        expiry_threshold=datetime.timedelta(seconds=60),
+    )
+    _ = provider()
+
+    # When
+    tokens = call_from_threads(provider, CONCURRENT_THREADS)
+
+    # Then
+    assert route.call_count == 2
+    assert set(tokens) == {"old_access_token", "new_access_token"}
+
+
+@respx.mock
+@pytest.mark.asyncio
+async def test_async_token_provider_concurrent_callers_single_request():
+    # Given
+    route = respx.post(TOKEN_ENDPOINT_URL).mock(
+        side_effect=slow_response(
+            httpx.Response(
+                200, json={"access_token": "new_access_token", "expires_in": 3600}
+            )
+        )
+    )
+    provider = h2o_authn.AsyncTokenProvider(
+        refresh_token="input_refresh_token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+    )
+
+    # When
+    tokens = await asyncio.gather(*(provider() for _ in range(CONCURRENT_CALLERS)))
+
+    # Then
+    assert route.call_count == 1
+    assert tokens == ["new_access_token"] * CONCURRENT_CALLERS
+
+
+@respx.mock
+@pytest.mark.asyncio
+async def test_async_token_provider_concurrent_callers_share_error():
+    # Given
+    route = respx.post(TOKEN_ENDPOINT_URL).mock(
+        side_effect=slow_response(httpx.Response(400, json={"error": "invalid_grant"}))
+    )
+    provider = h2o_authn.AsyncTokenProvider(
+        refresh_token="input_refresh_token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+    )
+
+    # When
+    results = await asyncio.gather(
+        *(provider() for _ in range(CONCURRENT_CALLERS)), return_exceptions=True
+    )
+
+    # Then
+    assert route.call_count == 1
+    assert all(isinstance(r, h2o_authn.error.TokenEndpointError) for r in results)
+
+
+@respx.mock
+@pytest.mark.asyncio
+async def test_async_token_provider_refresh_retried_after_error():
+    # Given
+    route = respx.post(TOKEN_ENDPOINT_URL)
+    route.side_effect = [
+        httpx.Response(400, json={"error": "temporarily_unavailable"}),
+        httpx.Response(200, json={"access_token": "new_access_token"}),
+    ]
+    provider = h2o_authn.AsyncTokenProvider(
+        refresh_token="input_refresh_token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+    )
+    with pytest.raises(h2o_authn.error.TokenEndpointError):
+        _ = await provider()
+
+    # When
+    result = await provider()
+
+    # Then
+    assert route.call_count == 2
+    assert result == "new_access_token"
+
+
+@respx.mock
+@pytest.mark.asyncio
+async def test_async_token_provider_cancelled_caller_does_not_cancel_refresh():
+    # Given
+    route = respx.post(TOKEN_ENDPOINT_URL).mock(
+        side_effect=slow_response(
+            httpx.Response(
+                200, json={"access_token": "new_access_token", "expires_in": 3600}
+            )
+        )
+    )
+    provider = h2o_authn.AsyncTokenProvider(
+        refresh_token="input_refresh_token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+    )
+    cancelled = asyncio.ensure_future(provider())
+    await asyncio.sleep(0)
+
+    # When
+    cancelled.cancel()
+    result = await provider()
+
+    # Then
+    assert route.call_count == 1
+    assert result == "new_access_token"
@@ -0,0 +1,130 @@
+import os
+import threading
+
+import pytest
+import respx
+
+import h2o_authn
+from h2o_authn import token
+
+TEST_CLIENT_ID = "test-client-id"
+TOKEN_ENDPOINT_URL = "http://example.com/token"
+
+pytestmark = pytest.mark.skipif(
+    not hasattr(os, "register_at_fork"), reason="fork is not supported"
+)
+
+
+def run_in_child(check) -> bool:
+    """Returns whether the check passed in the forked child process."""
+    pid = os.fork()
+    if pid == 0:
+        try:
+            passed = check()
+        except BaseException:
+            passed = False
+        os._exit(0 if passed else 1)
+    _, status = os.waitpid(pid, 0)
+    return os.waitstatus_to_exitcode(status) == 0
+
+
+def hold_lock(lock: threading.Lock) -> threading.Event:
+    """Holds the lock from another thread until the returned event is set."""
+    acquired, release = threading.Event(), threading.Event()
+
+    def hold():
+        with lock:
+            acquired.set()
+            release.wait()
+
+    threading.Thread(target=hold, daemon=True).start()
+    acquired.wait()
+    return release
+
+
+@respx.mock
+def test_token_provider_lock_released_in_child():
+    # Given
+    respx.post(TOKEN_ENDPOINT_URL).respond(
+        json={"access_token": "new_access_token", "expires_in": 3600}
+    )
+    provider = h2o_authn.TokenProvider(
+        refresh_token="input_refresh_token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+    )
+    release = hold_lock(provider._token_container.refresh_lock)
+
+    # When
+    def check():
+        lock = provider._token_container.refresh_lock
+        return lock.acquire(blocking=False)
+
+    passed = run_in_child(check)
+    release.set()
+
+    # Then
+    assert passed
+
+
+@respx.mock
+def test_token_provider_keeps_token_and_drops_connections_in_child():
+    # Given
+    route = respx.post(TOKEN_ENDPOINT_URL).respond(
+        json={"access_token": "new_access_token", "expires_in": 3600}
+    )
+    provider = h2o_authn.TokenProvider(
+        refresh_token="input_refresh_token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+        http_keep_alive=True,
+    )
+    parent_client = provider._http_clients.sync_client()
+    provider()
+
+    # When
+    def check():
+        token = provider()
+        client = provider._http_clients.sync_client()
+        return token == "new_access_token" and client is not parent_client
+
+    passed = run_in_child(check)
+
+    # Then
+    assert passed
+    assert route.call_count == 1
+    assert provider._http_clients.sync_client() is parent_client
+    provider.close()
+
+
+def test_token_provider_background_refresher_reset_in_child():
+    # Given
+    provider = h2o_authn.TokenProvider(
+        refresh_token="input_refresh_token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+        background_refresh=True,
+    )
+    provider._background_refresher = object()
+
+    # When
+    provider._after_fork()
+
+    # Then
+    assert provider._background_refresher is None
+
+
+def test_token_cache_lock_released_in_child():
+    # Given
+    cache = h2o_authn.cache.TokenCache()
+    release = hold_lock(cache._lock)
+
+    # When
+    passed = run_in_child(
+        lambda: cache.container("key", lambda: token.Container("refresh-token"))
+        is not None
+    )
+    release.set()
+
+    # Then
+    assert passed
@@ -0,0 +1,162 @@
+import asyncio
+import datetime
+import threading
+
+import httpx
+import pytest
+import respx
+import time_machine
+
+import h2o_authn
+
+TEST_CLIENT_ID = "test-client-id"
+TOKEN_ENDPOINT_URL = "http://example.com/token"
+
+
+def token_responses(release: threading.Event):
+    responses = iter(["old_access_token", "new_access_token"])
+
+    def side_effect(request):
+        access_token = next(responses)
+        if access_token == "new_access_token":
+            release.wait(timeout=5)
+        return httpx.Response(
+            200, json={"access_token": access_token, "expires_in": 3600}
+        )
+
+    return side_effect
+
+
+@respx.mock
+def test_sync_token_provider_stale_token_returned_while_revalidated():
+    # Given
+    release = threading.Event()
+    route = respx.post(TOKEN_ENDPOINT_URL).mock(side_effect=token_responses(release))
+    provider = h2o_authn.TokenProvider(
+        refresh_token="input_refresh_token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+        stale_while_revalidate=datetime.timedelta(seconds=600),
+    )
+
+    with time_machine.travel(0) as traveler:
+        _ = provider()
+        traveler.shift(datetime.timedelta(seconds=3100))
+
+        # When
+        stale = [provider() for _ in range(10)]
+        release.set()
+        provider._token_container.refresh_lock.acquire(timeout=5)
+        provider._token_container.refresh_lock.release()
+        fresh = provider()
+
+    # Then
+    assert route.call_count == 2
+    assert stale == ["old_access_token"] * 10
+    assert fresh == "new_access_token"
+
+
+@respx.mock
+@pytest.mark.asyncio
+async def test_async_token_provider_stale_token_returned_while_revalidated():
+    # Given
+    route = respx.post(TOKEN_ENDPOINT_URL).mock(
+        side_effect=[
+            httpx.Response(
+                200, json={"access_token": "old_access_token", "expires_in": 3600}
+            ),
+            httpx.Response(
+                200, json={"access_token": "new_access_token", "expires_in": 3600}
+            ),
+        ]
+    )
+    provider = h2o_authn.AsyncTokenProvider(
+        refresh_token="input_refresh_token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+        stale_while_revalidate=datetime.timedelta(seconds=600),
+    )
+
+    with time_machine.travel(0) as traveler:
+        _ = await provider()
+        traveler.shift(datetime.timedelta(seconds=3100))
+
+        # When
+        stale = [await provider() for _ in range(10)]
+        while provider._token_container.pending_refresh:
+            await asyncio.sleep(0)
+        fresh = await provider()
+
+    # Then
+    assert route.call_count == 2
+    assert stale == ["old_access_token"] * 10
+    assert fresh == "new_access_token"
+
+
+@respx.mock
+def test_sync_token_provider_failed_revalidation_backed_off():
+    # Given
+    route = respx.post(TOKEN_ENDPOINT_URL).mock(
+        side_effect=[
+            httpx.Response(
+                200, json={"access_token": "old_access_token", "expires_in": 3600}
+            ),
+            *[httpx.Response(503)] * 100,
+        ]
+    )
+    provider = h2o_authn.TokenProvider(
+        refresh_token="input_refresh_token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+        stale_while_revalidate=datetime.timedelta(seconds=600),
+    )
+
+    with time_machine.travel(0, tick=False) as traveler:
+        _ = provider()
+        traveler.shift(datetime.timedelta(seconds=3100))
+
+        # When
+        tokens = []
+        for _ in range(50):
+            tokens.append(provider())
+            provider._token_container.refresh_lock.acquire(timeout=5)
+            provider._token_container.refresh_lock.release()
+
+    # Then
+    assert route.call_count == 2
+    assert tokens == ["old_access_token"] * 50
+
+
+@respx.mock
+@pytest.mark.asyncio
+async def test_async_token_provider_failed_revalidation_backed_off():
+    # Given
+    route = respx.post(TOKEN_ENDPOINT_URL).mock(
+        side_effect=[
+            httpx.Response(
+                200, json={"access_token": "old_access_token", "expires_in": 3600}
+            ),
+            *[httpx.Response(503)] * 100,
+        ]
+    )
+    provider = h2o_authn.AsyncTokenProvider(
+        refresh_token="input_refresh_token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+        stale_while_revalidate=datetime.timedelta(seconds=600),
+    )
+
+    with time_machine.travel(0, tick=False) as traveler:
+        _ = await provider()
+        traveler.shift(datetime.timedelta(seconds=3100))
+
+        # When
+        tokens = []
+        for _ in range(50):
+            tokens.append(await provider())
+            while provider._token_container.pending_refresh:
+                await asyncio.sleep(0)
+
+    # Then
+    assert route.call_count == 2
+    assert tokens == ["old_access_token"] * 50
@@ -0,0 +1,182 @@
+import datetime
+import json
+
+import httpx
+import pytest
+
+import h2o_authn
+from h2o_authn import retry
+
+TEST_CLIENT_ID = "test-client-id"
+TOKEN_ENDPOINT_URL = "http://issuer/token"
+
+
+def token_response(request: httpx.Request) -> httpx.Response:
+    return httpx.Response(200, json={"access_token": "new-access-token"})
+
+
+def wsgi_issuer(environ, start_response):
+    start_response("200 OK", [("Content-Type", "application/json")])
+    return [json.dumps({"access_token": "wsgi-access-token"}).encode()]
+
+
+async def asgi_issuer(scope, receive, send):
+    await receive()
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"application/json")],
+        }
+    )
+    body = json.dumps({"access_token": "asgi-access-token"}).encode()
+    await send({"type": "http.response.body", "body": body})
+
+
+def test_injected_client_used_and_left_open():
+    # Given
+    client = httpx.Client(transport=httpx.MockTransport(token_response))
+    provider = h2o_authn.TokenProvider(
+        refresh_token="refresh-token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+        http_client=client,
+    )
+
+    # When
+    with provider:
+        result = provider()
+
+    # Then
+    assert result == "new-access-token"
+    assert not client.is_closed
+
+
+@pytest.mark.asyncio
+async def test_injected_async_client_used_and_left_open():
+    # Given
+    client = httpx.AsyncClient(transport=httpx.MockTransport(token_response))
+    provider = h2o_authn.AsyncTokenProvider(
+        refresh_token="refresh-token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+        http_async_client=client,
+    )
+
+    # When
+    async with provider:
+        result = await provider()
+
+    # Then
+    assert result == "new-access-token"
+    assert not client.is_closed
+    await client.aclose()
+
+
+def test_wsgi_transport():
+    # Given
+    provider = h2o_authn.TokenProvider(
+        refresh_token="refresh-token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+        http_transport=httpx.WSGITransport(app=wsgi_issuer),
+    )
+
+    # When
+    result = provider()
+
+    # Then
+    assert result == "wsgi-access-token"
+
+
+@pytest.mark.asyncio
+async def test_asgi_transport():
+    # Given
+    provider = h2o_authn.AsyncTokenProvider(
+        refresh_token="refresh-token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+        http_transport=httpx.ASGITransport(app=asgi_issuer),
+    )
+
+    # When
+    result = await provider()
+
+    # Then
+    assert result == "asgi-access-token"
+
+
+def test_transport_retried():
+    # Given
+    responses = iter(
+        [httpx.Response(503), httpx.Response(200, json={"access_token": "retried"})]
+    )
+    provider = h2o_authn.TokenProvider(
+        refresh_token="refresh-token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+        http_transport=httpx.MockTransport(lambda _: next(responses)),
+        retry_policy=retry.RetryPolicy(base_delay=datetime.timedelta(0)),
+    )
+
+    # When
+    result = provider()
+
+    # Then
+    assert result == "retried"
+
+
+@pytest.mark.asyncio
+async def test_sync_transport_rejected_by_async_provider():
+    # Given
+    provider = h2o_authn.AsyncTokenProvider(
+        refresh_token="refresh-token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+        http_transport=httpx.WSGITransport(app=wsgi_issuer),
+    )
+
+    # When
+    with pytest.raises(TypeError):
+        await provider()
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {
+            "http_client": httpx.Client(),
+            "http_transport": httpx.MockTransport(token_response),
+        },
+        {"http_async_client": httpx.AsyncClient(), "retry_policy": retry.RetryPolicy()},
+    ],
+)
+def test_invalid_http_arguments(kwargs):
+    with pytest.raises(ValueError):
+        h2o_authn.TokenProvider(
+            refresh_token="refresh-token",
+            client_id=TEST_CLIENT_ID,
+            token_endpoint_url=TOKEN_ENDPOINT_URL,
+            **kwargs,
+        )
+
+
+def test_http2_client_shared_with_clones():
+    # Given
+    pytest.importorskip("h2")
+    provider = h2o_authn.TokenProvider(
+        refresh_token="refresh-token",
+        client_id=TEST_CLIENT_ID,
+        token_endpoint_url=TOKEN_ENDPOINT_URL,
+        http2=True,
+    )
+    clone = provider.with_scope("other scope")
+
+    # When
+    with provider._client() as client, clone._client() as clone_client:
+        pass
+
+    # Then
+    assert client is clone_client
+    assert client._transport._pool._http2
+    provider.close()